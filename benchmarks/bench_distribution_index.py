@@ -0,0 +1,78 @@
+"""
+Benchmark looking up installed distributions' versions.
+
+Compares `importlib.metadata.version()`, which searches every `sys.path`
+entry for a matching metadata directory on each call, with
+`davos.core.core.distribution_index`, which scans each directory once
+and caches the results until it's modified. A temporary directory
+containing a large number of (fake) installed distributions is added
+to `sys.path` to simulate a large environment.
+
+`davos` must be imported into an IPython session, so run this with:
+
+    ipython benchmarks/bench_distribution_index.py
+"""
+
+
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+if sys.version_info < (3, 8):
+    import importlib_metadata as metadata
+else:
+    from importlib import metadata
+
+from davos.core.core import distribution_index
+
+
+N_DISTS = 1_000
+N_ITERATIONS = 200
+
+
+def make_fake_dists(site_dir, n_dists):
+    """Create minimal metadata for `n_dists` fake distributions"""
+    for i in range(n_dists):
+        dist_info_dir = site_dir.joinpath(f'fake_dist_{i}-1.0.{i}.dist-info')
+        dist_info_dir.mkdir()
+        dist_info_dir.joinpath('METADATA').write_text(
+            f'Metadata-Version: 2.1\nName: fake-dist-{i}\nVersion: 1.0.{i}\n'
+        )
+
+
+def time_per_call(func, name):
+    """Return the mean time (in microseconds) per lookup of `name`"""
+    def lookup():
+        try:
+            func(name)
+        except metadata.PackageNotFoundError:
+            pass
+
+    total = timeit.timeit(lookup, number=N_ITERATIONS)
+    return total / N_ITERATIONS * 1e6
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        site_dir = Path(tmpdir)
+        make_fake_dists(site_dir, N_DISTS)
+        sys.path.append(str(site_dir))
+        try:
+            # build the index upfront, as the first smuggle would
+            distribution_index.version('fake-dist-0')
+            print(f"mean time per lookup with {N_DISTS:,} extra "
+                  f"distributions ({N_ITERATIONS:,} iterations)\n")
+            header = f"{'distribution':<24}{'importlib.metadata':>20}{'index':>12}"
+            print(header)
+            print('-' * len(header))
+            for name in ('packaging', f'fake-dist-{N_DISTS - 1}', 'not-installed'):
+                metadata_us = time_per_call(metadata.version, name)
+                index_us = time_per_call(distribution_index.version, name)
+                print(f"{name:<24}{metadata_us:>18.1f}us{index_us:>10.1f}us")
+        finally:
+            sys.path.remove(str(site_dir))
+
+
+if __name__ == '__main__':
+    main()
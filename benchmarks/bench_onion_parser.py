@@ -0,0 +1,58 @@
+"""
+Benchmark the cost of parsing onion comments.
+
+Compares the fast path for onion comments that consist of only a
+requirement specifier (`davos.core.parsers.parse_pip_spec_only`) with
+the full `argparse`-based `pip_parser`, and times `Onion.parse_onion`
+(which selects between the two) on a range of typical onion comments.
+
+`davos` must be imported into an IPython session, so run this with:
+
+    ipython benchmarks/bench_onion_parser.py
+"""
+
+
+import timeit
+
+from davos.core.core import Onion
+from davos.core.parsers import parse_pip_spec_only, pip_parser
+
+
+N_ITERATIONS = 20_000
+ONION_COMMENTS = (
+    '# pip: numpy==1.24.3',
+    '# pip: pandas>=2',
+    '# pip: scikit-learn~=1.2.0',
+    '# pip: requests>=2.28,<3',
+    '# pip: foo==1.2.3 --no-deps',
+    '# pip: git+https://github.com/foo/bar.git@v1.0 -I --no-cache-dir'
+)
+
+
+def time_per_call(func, *args):
+    """Return the mean time (in microseconds) per call of `func`"""
+    total = timeit.timeit(lambda: func(*args), number=N_ITERATIONS)
+    return total / N_ITERATIONS * 1e6
+
+
+def full_parser(args):
+    """Parse onion comment arguments with the full argparse parser"""
+    return vars(pip_parser.parse_args(args))
+
+
+def main():
+    print(f"mean time per onion comment ({N_ITERATIONS:,} iterations)\n")
+    header = f"{'onion comment':<66}{'argparse':>10}{'parse_onion':>13}"
+    print(header)
+    print('-' * len(header))
+    for onion_text in ONION_COMMENTS:
+        args = onion_text.split(':', maxsplit=1)[1].split()
+        if parse_pip_spec_only(args) is not None:
+            assert parse_pip_spec_only(args) == full_parser(args)
+        argparse_us = time_per_call(full_parser, args)
+        parse_onion_us = time_per_call(Onion.parse_onion, onion_text)
+        print(f"{onion_text:<66}{argparse_us:>8.2f}us{parse_onion_us:>11.2f}us")
+
+
+if __name__ == '__main__':
+    main()
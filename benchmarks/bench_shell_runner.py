@@ -0,0 +1,102 @@
+"""
+Benchmark running shell commands that generate a lot of output.
+
+Compares `davos.core.shell.stream_command` with the runners `davos`
+previously used: reading a merged stdout/stderr pipe line-by-line in
+text mode (the old pure Python implementation), and `IPython`'s
+`pexpect`-based `IPython.utils.process.system` (the old `IPython`
+implementation). The command is a fake "chatty" installer that writes
+lines resembling verbose `pip` output to both stdout and stderr. As in
+`davos.core.core.run_shell_command` (with `davos.suppress_stdout`
+disabled), output is both captured in memory and displayed (here, by
+writing it to `os.devnull`), and the display is flushed after every
+write.
+
+`davos` must be imported into an IPython session, so run this with:
+
+    ipython benchmarks/bench_shell_runner.py
+"""
+
+
+import locale
+import os
+import shlex
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from subprocess import PIPE, Popen, STDOUT
+
+from IPython.utils.process import system as ipython_system
+
+from davos.core.core import capture_stdout
+from davos.core.shell import stream_command
+
+
+N_REPEATS = 3
+OUTPUT_SIZES_MB = (1, 10, 50)
+CHATTY_SCRIPT = """
+import sys
+line = '  Found link https://files.example.org/pkg-1.0.tar.gz, version: 1.0\\n'
+n_lines = int({size_mb} * 2**20 / len(line))
+for i in range(n_lines):
+    # most output on stdout, with some interleaved on stderr
+    (sys.stderr if i % 10 == 0 else sys.stdout).write(line)
+"""
+
+
+def chatty_command(size_mb):
+    """Return a shell command that writes ~`size_mb` MB of output"""
+    script = CHATTY_SCRIPT.format(size_mb=size_mb)
+    return f'{shlex.quote(sys.executable)} -c {shlex.quote(script)}'
+
+
+def readline_runner(command):
+    """The pure Python runner `davos` previously used"""
+    process = Popen(command, shell=True, stdout=PIPE, stderr=STDOUT,
+                    encoding=locale.getpreferredencoding())
+    for output in process.stdout:
+        sys.stdout.write(output)
+    return process.wait()
+
+
+def time_runner(runner, command):
+    """
+    Return the best time (in seconds) taken to run `command` and the
+    amount of output (in MB) captured
+    """
+    best = float('inf')
+    with open(os.devnull, 'w') as display:
+        for _ in range(N_REPEATS):
+            with redirect_stdout(display), \
+                    capture_stdout(StringIO(), closing=False) as stdout:
+                start = time.perf_counter()
+                runner(command)
+                best = min(best, time.perf_counter() - start)
+    return best, len(stdout.getvalue()) / 2**20
+
+
+def main():
+    runners = {
+        'readline': readline_runner,
+        'IPython system': ipython_system,
+        'stream_command': stream_command,
+    }
+    header = f"{'output':<10}" + ''.join(f'{name:>18}' for name in runners)
+    print(f"best of {N_REPEATS} runs\n")
+    print(header)
+    print('-' * len(header))
+    for size_mb in OUTPUT_SIZES_MB:
+        command = chatty_command(size_mb)
+        row = f"{f'{size_mb} MB':<10}"
+        for runner in runners.values():
+            elapsed, captured_mb = time_runner(runner, command)
+            # IPython's runner translates the "\r\n" line endings its
+            # pseudo-terminal produces, so sizes may differ slightly
+            assert captured_mb > size_mb * 0.95, captured_mb
+            row += f'{elapsed:>17.2f}s'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark `smuggle` statement matching on adversarial input.
+
+Compares `davos.core.regexps.smuggle_statement_regex` with the
+linear-time `smuggle_statement_scanner` on families of inputs that cause
+the regex to backtrack extensively -- chiefly, parenthesized multiline
+`from ... smuggle (...)` statements missing their closing parenthesis,
+as can occur in a cell with a syntax error. For each family, input size
+is increased until the regex exceeds a time limit, after which only the
+scanner is timed on much larger inputs.
+
+`davos` must be imported into an IPython session, so run this with:
+
+    ipython benchmarks/bench_smuggle_scanner.py
+"""
+
+
+import time
+
+from davos.core.regexps import (
+    smuggle_statement_regex,
+    smuggle_statement_scanner
+)
+
+
+REGEX_TIME_LIMIT = 0.1    # seconds
+# on the adversarial inputs, the regex's time grows ~10-30x with each
+# additional repetition, so increase size slowly while it's running
+SMALL_SIZES = tuple(range(1, 17))
+LARGE_SIZES = (100, 1_000, 10_000, 100_000)
+INPUT_FAMILIES = {
+    'unclosed parens, names on one line':
+        lambda n: 'from foo smuggle (\n' + 'bar, ' * n,
+    'unclosed parens, one name per line':
+        lambda n: 'from foo smuggle (\n' + '    bar,\n' * n,
+    'unclosed parens, space-separated names':
+        lambda n: 'from foo smuggle (\n bar' + ' bar' * n,
+    'long onion comment':
+        lambda n: 'smuggle foo    # pip: foo ' + '--no-deps ' * n,
+    'long import list':
+        lambda n: 'smuggle foo' + ', bar as baz' * n,
+}
+
+
+def time_match(pattern, string):
+    """Return the time (in milliseconds) taken to match `string`"""
+    start = time.perf_counter()
+    match = pattern.match(string)
+    elapsed = (time.perf_counter() - start) * 1e3
+    return elapsed, match
+
+
+def main():
+    header = f"{'input':<42}{'length':>9}{'regex':>14}{'scanner':>12}"
+    print(header)
+    print('-' * len(header))
+    for family_name, make_input in INPUT_FAMILIES.items():
+        run_regex = True
+        for size in SMALL_SIZES + LARGE_SIZES:
+            if not run_regex and size in SMALL_SIZES:
+                continue
+            string = make_input(size)
+            scanner_ms, scanner_match = time_match(smuggle_statement_scanner,
+                                                   string)
+            if run_regex:
+                regex_ms, regex_match = time_match(smuggle_statement_regex,
+                                                   string)
+                if regex_match is None:
+                    assert scanner_match is None
+                else:
+                    assert scanner_match.groupdict() == regex_match.groupdict()
+                regex_col = f'{regex_ms:>12.3f}ms'
+                run_regex = (regex_ms < REGEX_TIME_LIMIT * 1e3 and
+                             size != SMALL_SIZES[-1])
+            else:
+                regex_col = f"{'(skipped)':>14}"
+            print(f"{family_name:<42}{len(string):>9}{regex_col}"
+                  f"{scanner_ms:>10.3f}ms")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,11 +14,13 @@ docstring for more info.
 
 
 __all__ = [
+    'asmuggle',
     'DAVOS_CONFIG_DIR',
     'DAVOS_PROJECT_DIR',
     'config',
     'configure',
     'get_project',
+    'prefetch',
     'Project',
     'prune_projects',
     'require_pip',
@@ -48,7 +50,7 @@ config = DavosConfig()
 
 
 import davos.implementations
-from davos.core.core import smuggle
+from davos.core.core import asmuggle, prefetch, smuggle
 from davos.core.exceptions import DavosConfigError, DavosError
 from davos.core.project import (
     DAVOS_CONFIG_DIR,
@@ -126,11 +128,21 @@ def configure(
         *,
         active=...,
         auto_rerun=...,
+        background_install=...,
+        batch_install=...,
         confirm_install=...,
+        installer_backend=...,
+        max_output_size=...,
         noninteractive=...,
+        offline=...,
+        package_store=...,
+        parse_cache_size=...,
         pip_executable=...,
+        pip_worker=...,
+        plan_installs=...,
         project=...,
-        suppress_stdout=...
+        suppress_stdout=...,
+        wheelhouse=...
 ):
     """
     Set multiple `davos.config` fields at once.
@@ -142,18 +154,41 @@ def configure(
     auto_rerun : bool, optional
         Value to assign to "`auto_rerun`" field. Must be `False`
         (default) in Colaboratory notebooks.
+    background_install : bool, optional
+        Value to assign to "`background_install`" field.
+    batch_install : bool, optional
+        Value to assign to "`batch_install`" field. Must be `False`
+        (default) in IPython<7.0 environments.
     confirm_install : bool, optional
         Value to assign to "`confirm_install`" field.
+    installer_backend : {'pip', 'uv'}, optional
+        Value to assign to "`installer_backend`" field.
+    max_output_size : int, optional
+        Value to assign to "`max_output_size`" field. Must be a
+        non-negative integer.
     noninteractive : bool, optional
         Value to assign to "`noninteractive`" field. Must be `False`
         (default) in Colaboratory notebooks.
+    offline : bool, optional
+        Value to assign to "`offline`" field.
+    package_store : bool, optional
+        Value to assign to "`package_store`" field.
+    parse_cache_size : int, optional
+        Value to assign to "`parse_cache_size`" field. Must be a
+        non-negative integer.
     pip_executable : str or pathlib.Path, optional
         Value to assign to "`pip_executable`" field. Must be a path to a
         real file.
+    pip_worker : bool, optional
+        Value to assign to "`pip_worker`" field.
+    plan_installs : bool, optional
+        Value to assign to "`plan_installs`" field.
     project : str, pathlib.Path, None, or davos.Project, optional
         Value to assign to "`project`" field.
     suppress_stdout : bool, optional
         Value to assign to "`suppress_stdout`" field.
+    wheelhouse : bool, optional
+        Value to assign to "`wheelhouse`" field.
 
     Raises
     -------
@@ -0,0 +1,50 @@
+"""
+Run a Python script that contains `smuggle` statements.
+
+Usage: `python -m davos <script.py> [args ...]`
+
+Importing `davos` in a script enables `smuggle` statements only in
+modules imported *after* `davos`, since the script itself has already
+been compiled by the time it runs. This entry point imports `davos`,
+then runs the given script (with the remaining command line arguments
+as `sys.argv[1:]`) as the `__main__` module, transforming its `smuggle`
+statements the same way as those in imported modules.
+"""
+
+
+__all__ = ['main']
+
+
+import sys
+from os.path import abspath, dirname
+from importlib.util import module_from_spec, spec_from_file_location
+
+import davos
+from davos.implementations import full_parser
+
+
+def main():
+    """Run the script given on the command line."""
+    if davos.config.environment != 'Python':
+        raise RuntimeError("`python -m davos` must be run from a plain "
+                           "(i.e., non-IPython) Python interpreter")
+    if len(sys.argv) < 2:
+        sys.exit('usage: python -m davos <script.py> [args ...]')
+
+    # imported here so that this module can be imported (e.g., for
+    # documentation) in IPython environments
+    from davos.implementations.python import SmuggleLoader
+
+    script_path = abspath(sys.argv[1])
+    # emulate running `python <script.py> [args ...]`
+    sys.argv = sys.argv[1:]
+    sys.path[0] = dirname(script_path)
+    loader = SmuggleLoader('__main__', script_path, davos.smuggle, full_parser)
+    spec = spec_from_file_location('__main__', script_path, loader=loader)
+    module = module_from_spec(spec)
+    sys.modules['__main__'] = module
+    loader.exec_module(module)
+
+
+if __name__ == '__main__':
+    main()
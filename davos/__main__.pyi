@@ -0,0 +1,5 @@
+from typing import Literal
+
+__all__ = list[Literal['main']]
+
+def main() -> None: ...
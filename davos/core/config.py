@@ -18,6 +18,7 @@ via attributes of the top-level `davos` module.
 __all__ = ['DavosConfig']
 
 
+import json
 import os
 import pprint
 import shutil
@@ -26,6 +27,7 @@ import sys
 import sysconfig
 import traceback
 import warnings
+from collections import OrderedDict
 from io import StringIO
 from os.path import expandvars
 from pathlib import Path
@@ -35,6 +37,36 @@ from davos.core.exceptions import (
     DavosError,
     ProjectNotebookNotFoundError
 )
+from davos.core.fileutils import write_atomic
+
+
+def _bool_option(name):
+    """
+    Create a property for a `DavosConfig` option field.
+
+    Option fields toggle optional features and are stored together in
+    the config object's `_options` dict, keyed by field name. The
+    property's setter accepts only `True` or `False`.
+
+    Parameters
+    ----------
+    name : str
+        The name of the field.
+
+    Returns
+    -------
+    property
+        The field's property.
+    """
+    def fget(self):
+        return self._options[name]
+
+    def fset(self, value):
+        if not isinstance(value, bool):
+            raise DavosConfigError(name, "field may be 'True' or 'False'")
+        self._options[name] = value
+
+    return property(fget, fset)
 
 
 class SingletonConfig(type):
@@ -65,6 +97,26 @@ class DavosConfig(metaclass=SingletonConfig):
                 upon smuggling a package that cannot be dynamically
                 reloaded (Note: currently implemented for Jupyter
                 notebooks only)
+            background_install : bool
+                If `True` (default: `False`), `smuggle` statements that
+                need to install a package start the installation in a
+                background thread and return immediately, binding a
+                placeholder object (`davos.core.core.LazyModuleProxy`)
+                in place of the smuggled package. The first time the
+                placeholder is used (including in operations like
+                `len()`, iteration, or `isinstance()` checks), it waits
+                for the installation to finish and replaces itself with
+                the real package.
+                Packages installed with `-e`/`--editable` or `--target`
+                are always installed immediately.
+            batch_install : bool
+                If `True` (default: `False`), collect all `smuggle`
+                statements in a cell before any of them are run, and
+                install all missing packages with a single installer
+                command (i.e., one dependency resolution) when the
+                first of them is executed. Packages whose onion
+                comments pass additional installer options are still
+                installed individually (Note: requires IPython>=7.0)
             conda_env: str or None
                 NOTE: NOT CURRENTLY SUPPORTED.
                 The name of the resident conda environment of the
@@ -74,6 +126,21 @@ class DavosConfig(metaclass=SingletonConfig):
                 If `True` (default: `False`), prompt for user input
                 before installing any smuggled packages not already
                 available locally.
+            installer_backend : {'pip', 'uv'}
+                The program used to install smuggled packages (default:
+                `'pip'`). If `'uv'`, a local `uv` executable is used to
+                resolve and install packages for the interpreter that
+                runs `pip_executable`. Onions that pass `pip install`
+                options `uv` doesn't support are still installed with
+                `pip`. See the `davos.core.installers` module for
+                details.
+            max_output_size : int
+                If non-zero, the maximum amount of output (in KiB) from
+                each install command that's kept in memory (default:
+                `0`). The full output is written to a log file (see
+                `davos.core.core.get_install_log_path()`) instead of
+                being displayed, and only a short summary is shown. Set
+                to `0` to keep and display all output.
             noninteractive : bool
                 If `True` (default: `False`) run `davos` in
                 non-interactive mode. All user input and confirmation
@@ -81,10 +148,49 @@ class DavosConfig(metaclass=SingletonConfig):
                 value of `auto_rerun` will determine whether `davos`
                 restarts the kernel or throws an error when a smuggled
                 package cannot be dynamically reloaded.
+            offline : bool
+                If `True` (default: `False`), install packages only from
+                the shared local wheelhouse (see `wheelhouse`) and never
+                access the network. Packages without a wheel in the
+                wheelhouse can't be installed. See the
+                `davos.core.wheelhouse` module for details.
+            package_store : bool
+                If `True` (default: `False`), move the files of packages
+                installed into projects into a content-addressed store
+                shared by all projects, and replace them with hardlinks
+                to the stored files, so identical packages installed in
+                multiple projects use disk space only once. Packages
+                pinned in a project's lockfile that are already stored
+                are installed by linking them, without running the
+                installer. See the `davos.core.store` module for
+                details.
+            parse_cache_size : int
+                The maximum number of parsed lines of code whose
+                transformed output `davos` caches (default: `256`).
+                When a cell is rerun without changes, cached lines are
+                not re-parsed. The least recently used entries are
+                evicted once the cache is full. Set to `0` to disable
+                caching.
             pip_executable : str of pathlib.Path
                 The path to the `pip` executable that should be used.
                 Must be a path to a real file. Defaults to automatically
                 discovered executable, if available.
+            pip_worker : bool
+                If `True` (default: `False`), run `pip` commands in a
+                long-lived helper process that keeps `pip` imported,
+                rather than starting a new interpreter for each one.
+                Requires `os.fork()` (i.e., not available on Windows).
+                See the `davos.core.pip_worker` module for details.
+            plan_installs : bool
+                If `True` (default: `False`), resolve the full set of
+                distributions a `smuggle` statement would install (with
+                `pip install --dry-run --report`) before installing it,
+                then install exactly that set. Resolved plans are
+                cached across sessions, and are listed in the prompt
+                shown when `confirm_install` is enabled. `asmuggle()`
+                uses only plans that are already cached. Requires
+                `pip>=22.2`. See the `davos.core.planner` module for
+                details.
             project : davos.core.project.ConcreteProject
                 The "Project" environment into which smuggled packages
                 should be installed. The default is a notebook-specific
@@ -103,6 +209,12 @@ class DavosConfig(metaclass=SingletonConfig):
                 output issued by the program. This is often useful when
                 smuggling packages that need to install many
                 dependencies and therefore generate extensive output.
+            wheelhouse : bool
+                If `True` (default: `False`), deposit a wheel for every
+                package `davos` installs in a local wheelhouse shared by
+                all projects, and let the installer reuse wheels from it
+                rather than downloading or building them again. See the
+                `davos.core.wheelhouse` module for details.
         **Read-only fields**:
             conda_avail : bool
                 NOTE: NOT CURRENTLY SUPPORTED.
@@ -199,13 +311,16 @@ class DavosConfig(metaclass=SingletonConfig):
         self._conda_envs_dirs = None
         self._default_pip_executable = self._find_default_pip_executable()
         self._ipy_showsyntaxerror_orig = None
+        self._batch_queue = []
+        self._parse_cache = OrderedDict()
         self._repr_formatter = pprint.PrettyPrinter()
         if sys.version_info.minor >= 8:
             # sort_dicts constructor param added in Python 3.8, defaults
             # to True. Set it to False here for consistency.
             self._repr_formatter._sort_dicts = False
         self._smuggled = {}
-        self._stdlib_modules = _get_stdlib_modules()
+        # computed on first access (see `_stdlib_modules` property)
+        self._stdlib_module_names = None
         ########################################
         #          CONFIGURABLE FIELDS         #
         ########################################
@@ -217,11 +332,25 @@ class DavosConfig(metaclass=SingletonConfig):
         self._project = None
         self._suppress_stdout = False
         self._pip_executable = self._default_pip_executable
+        # fields that toggle/configure optional features
+        self._options = {
+            'background_install': False,
+            'batch_install': False,
+            'installer_backend': 'pip',
+            'max_output_size': 0,
+            'offline': False,
+            'package_store': False,
+            'parse_cache_size': 256,
+            'pip_worker': False,
+            'plan_installs': False,
+            'wheelhouse': False
+        }
 
     def __repr__(self):
         cls_name = self.__class__.__name__
         base_indent = len(cls_name) + 1
-        attrs_in_repr = ['active', 'auto_rerun']
+        attrs_in_repr = ['active', 'auto_rerun', 'background_install',
+                         'batch_install']
         if self._conda_avail is not None:
             attrs_in_repr.append('conda_avail')
             if self._conda_avail is True:
@@ -229,11 +358,19 @@ class DavosConfig(metaclass=SingletonConfig):
         attrs_in_repr.extend([
             'confirm_install',
             'environment',
+            'installer_backend',
             'ipython_shell',
+            'max_output_size',
             'noninteractive',
+            'offline',
+            'package_store',
+            'parse_cache_size',
             'pip_executable',
+            'pip_worker',
+            'plan_installs',
             'project',
             'suppress_stdout',
+            'wheelhouse',
             'smuggled'
         ])
         newline_delim = ',\n' + ' ' * base_indent
@@ -249,7 +386,11 @@ class DavosConfig(metaclass=SingletonConfig):
                 attr_indent = base_indent + len(attr_name) + 1
                 is_last = i == last_item_ix
                 stream.write(f'{attr_name}=')
-                self._repr_formatter._format(getattr(self, f'_{attr_name}'),
+                if attr_name in self._options:
+                    value = self._options[attr_name]
+                else:
+                    value = getattr(self, f'_{attr_name}')
+                self._repr_formatter._format(value,
                                              stream=stream,
                                              indent=attr_indent,
                                              allowance=int(not is_last),
@@ -286,6 +427,24 @@ class DavosConfig(metaclass=SingletonConfig):
             )
         self._auto_rerun = value
 
+    background_install = _bool_option('background_install')
+
+    @property
+    def batch_install(self):
+        return self._options['batch_install']
+
+    @batch_install.setter
+    def batch_install(self, value):
+        if not isinstance(value, bool):
+            raise DavosConfigError('batch_install',
+                                   "field may be 'True' or 'False'")
+        if value and self._environment == 'IPython<7.0':
+            raise DavosConfigError(
+                'batch_install',
+                'batched installation is not available for IPython<7.0'
+            )
+        self._options['batch_install'] = value
+
     @property
     def confirm_install(self):
         return self._confirm_install
@@ -309,6 +468,26 @@ class DavosConfig(metaclass=SingletonConfig):
     def environment(self, _):
         raise DavosConfigError('environment', 'field is read-only')
 
+    @property
+    def installer_backend(self):
+        return self._options['installer_backend']
+
+    @installer_backend.setter
+    def installer_backend(self, value):
+        if value == 'uv':
+            # imported here to avoid a circular import
+            from davos.core.installers import find_uv_executable
+            if find_uv_executable() is None:
+                raise DavosConfigError(
+                    'installer_backend',
+                    "no 'uv' executable found alongside the pip executable "
+                    "or Python interpreter, or on the PATH"
+                )
+        elif value != 'pip':
+            raise DavosConfigError('installer_backend',
+                                   "field may be 'pip' or 'uv'")
+        self._options['installer_backend'] = value
+
     @property
     def ipython_shell(self):
         return self._ipython_shell
@@ -317,6 +496,17 @@ class DavosConfig(metaclass=SingletonConfig):
     def ipython_shell(self, _):
         raise DavosConfigError('ipython_shell', 'field is read-only')
 
+    @property
+    def max_output_size(self):
+        return self._options['max_output_size']
+
+    @max_output_size.setter
+    def max_output_size(self, value):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise DavosConfigError('max_output_size',
+                                   "field must be a non-negative integer")
+        self._options['max_output_size'] = value
+
     @property
     def noninteractive(self):
         return self._noninteractive
@@ -338,6 +528,24 @@ class DavosConfig(metaclass=SingletonConfig):
             self._confirm_install = False
         self._noninteractive = value
 
+    offline = _bool_option('offline')
+
+    package_store = _bool_option('package_store')
+
+    @property
+    def parse_cache_size(self):
+        return self._options['parse_cache_size']
+
+    @parse_cache_size.setter
+    def parse_cache_size(self, value):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise DavosConfigError('parse_cache_size',
+                                   "field must be a non-negative integer")
+        # evict least recently used entries that no longer fit
+        while len(self._parse_cache) > value:
+            self._parse_cache.popitem(last=False)
+        self._options['parse_cache_size'] = value
+
     @property
     def pip_executable(self) -> str:
         return self._pip_executable
@@ -357,6 +565,29 @@ class DavosConfig(metaclass=SingletonConfig):
                 )
             self._pip_executable = str(exe_path)
 
+    @property
+    def pip_worker(self):
+        return self._options['pip_worker']
+
+    @pip_worker.setter
+    def pip_worker(self, value):
+        if not isinstance(value, bool):
+            raise DavosConfigError('pip_worker',
+                                   "field may be 'True' or 'False'")
+        if value and not hasattr(os, 'fork'):
+            raise DavosConfigError(
+                'pip_worker',
+                'pip worker processes require os.fork(), which is not '
+                'available on this platform'
+            )
+        if not value and self._options['pip_worker']:
+            # imported here to avoid a circular import
+            from davos.core.pip_worker import shutdown_pip_workers
+            shutdown_pip_workers()
+        self._options['pip_worker'] = value
+
+    plan_installs = _bool_option('plan_installs')
+
     @property
     def project(self):
         return self._project
@@ -366,6 +597,8 @@ class DavosConfig(metaclass=SingletonConfig):
         from davos.core.project import AbstractProject, ConcreteProject, Project
         if proj is None or isinstance(proj, ConcreteProject):
             self._project = proj
+            # cached parser output is invalidated when the project changes
+            self._parse_cache.clear()
         elif isinstance(proj, AbstractProject):
             raise ProjectNotebookNotFoundError(
                 "The notebook associated with this Project does not exist: "
@@ -384,6 +617,7 @@ class DavosConfig(metaclass=SingletonConfig):
                     f"found)."
                 )
             self._project = proj
+            self._parse_cache.clear()
         else:
             raise DavosConfigError(
                 'project',
@@ -410,6 +644,17 @@ class DavosConfig(metaclass=SingletonConfig):
                                    "field may be 'True' or 'False'")
         self._suppress_stdout = value
 
+    wheelhouse = _bool_option('wheelhouse')
+
+    @property
+    def _stdlib_modules(self):
+        # determined lazily, since doing so can be slow on Python<3.10
+        # (see `_get_stdlib_modules()`) and it's not needed until a
+        # package is smuggled
+        if self._stdlib_module_names is None:
+            self._stdlib_module_names = _get_stdlib_modules()
+        return self._stdlib_module_names
+
     def _find_default_pip_executable(self):
         """
         Finds the pip executable that should be used to install smuggled
@@ -562,7 +807,7 @@ def _get_stdlib_modules():
     """
     Get names of standard library modules.
 
-    For efficiency, get standard library module names upfront. This
+    For efficiency, get standard library module names once. This
     allows us to skip file system checks for any smuggled stdlib
     modules.
 
@@ -571,11 +816,37 @@ def _get_stdlib_modules():
     frozenset of str
         The names of standard library modules for the user's Python
         implementation.
+
+    Notes
+    -----
+    Python<3.10 doesn't provide `sys.stdlib_module_names`, so the names
+    are found by listing the contents of the standard library
+    directory. Since this can be slow (e.g., on network file systems),
+    the result is cached in `DAVOS_CONFIG_DIR`, keyed by the
+    interpreter's path and the standard library directory's
+    modification time.
     """
     if sys.version_info.minor >= 10:
         return sys.stdlib_module_names
 
+    # imported here to avoid a circular import
+    from davos.core.project import DAVOS_CONFIG_DIR
     stdlib_dir = Path(os.__file__).parent
+    cache_path = DAVOS_CONFIG_DIR.joinpath('stdlib-modules.json')
+    cache_key = f'{sys.executable};{stdlib_dir}'
+    stdlib_dir_mtime = stdlib_dir.stat().st_mtime_ns
+    try:
+        with cache_path.open(encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        # cache file doesn't exist yet or is corrupted
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+    cached = cache.get(cache_key)
+    if isinstance(cached, dict) and cached.get('mtime') == stdlib_dir_mtime:
+        return frozenset(cached['modules'])
+
     stdlib_modules = []
     for p in stdlib_dir.iterdir():
         if (
@@ -590,4 +861,12 @@ def _get_stdlib_modules():
             stdlib_modules.append(p.stem.split('.')[0])
 
     stdlib_modules.extend(sys.builtin_module_names)
-    return frozenset(stdlib_modules)
+    stdlib_modules = frozenset(stdlib_modules)
+    try:
+        cache[cache_key] = {'mtime': stdlib_dir_mtime,
+                            'modules': sorted(stdlib_modules)}
+        write_atomic(cache_path, json.dumps(cache))
+    except OSError:
+        # caching is an optimization; don't fail
+        pass
+    return stdlib_modules
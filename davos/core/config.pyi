@@ -1,9 +1,12 @@
+from collections import OrderedDict
 from collections.abc import Callable, Iterable
 from pathlib import PosixPath
 from pprint import PrettyPrinter
-from typing import ClassVar, Generic, Literal, NoReturn, Protocol, Type, TypeVar
+from typing import ClassVar, Generic, Literal, NoReturn, Protocol, Type, TypedDict, TypeVar
 from google.colab._shell import Shell    # type: ignore
 from IPython.core.interactiveshell import InteractiveShell    # type: ignore
+from davos.core.core import _InstallerName, PipInstallerKwargs
+from davos.core.installers import _BackendName
 from davos.core.project import AbstractProject, ConcreteProject
 
 __all__ = list[Literal['DavosConfig']]
@@ -12,6 +15,19 @@ _Environment = Literal['Colaboratory', 'IPython<7.0', 'IPython>=7.0', 'Python']
 _I= TypeVar('_I', bound=Iterable)
 _DC = TypeVar('_DC', bound=DavosConfig)
 IpythonShell = InteractiveShell | Shell
+_QueuedSmuggle = tuple[str, _InstallerName, str, PipInstallerKwargs]
+
+class _Options(TypedDict):
+    background_install: bool
+    batch_install: bool
+    installer_backend: _BackendName
+    max_output_size: int
+    offline: bool
+    package_store: bool
+    parse_cache_size: int
+    pip_worker: bool
+    plan_installs: bool
+    wheelhouse: bool
 
 class _IpyShowSyntaxErrorPre7(Protocol):
     def __call__(self, filename: str | None = ...) -> None: ...
@@ -28,6 +44,7 @@ class SingletonConfig(type, Generic[_DC]):
 class DavosConfig(metaclass=SingletonConfig):
     _active: bool
     _auto_rerun: bool
+    _batch_queue: list[_QueuedSmuggle]
     _conda_avail: bool | None
     _conda_env: str | None
     _conda_envs_dirs: dict[str, str] | None
@@ -37,11 +54,13 @@ class DavosConfig(metaclass=SingletonConfig):
     _ipy_showsyntaxerror_orig: _IpyShowSyntaxErrorPre7 | _IpyShowSyntaxErrorPost7 | None
     _ipython_shell: IpythonShell | None
     _noninteractive: bool
+    _options: _Options
+    _parse_cache: OrderedDict[tuple[str, bool], tuple[str, tuple[_QueuedSmuggle, ...]]]
     _pip_executable: str
     _project: AbstractProject | ConcreteProject | None
     _repr_formatter: PrettyPrinter
     _smuggled: dict[str, str]
-    _stdlib_modules: frozenset[str]
+    _stdlib_module_names: frozenset[str] | None
     _suppress_stdout: bool
     @staticmethod
     def __mock_sorted(__iterable: _I, key: Callable | None = ..., reverse: bool = ...) -> _I: ...
@@ -56,6 +75,14 @@ class DavosConfig(metaclass=SingletonConfig):
     @auto_rerun.setter
     def auto_rerun(self, value: bool) -> None: ...
     @property
+    def background_install(self) -> bool: ...
+    @background_install.setter
+    def background_install(self, value: bool) -> None: ...
+    @property
+    def batch_install(self) -> bool: ...
+    @batch_install.setter
+    def batch_install(self, value: bool) -> None: ...
+    @property
     def conda_avail(self) -> bool: ...
     @conda_avail.setter
     def conda_avail(self, _: object) -> NoReturn: ...
@@ -76,18 +103,46 @@ class DavosConfig(metaclass=SingletonConfig):
     @environment.setter
     def environment(self, _: object) -> NoReturn: ...
     @property
+    def installer_backend(self) -> _BackendName: ...
+    @installer_backend.setter
+    def installer_backend(self, value: _BackendName) -> None: ...
+    @property
     def ipython_shell(self) -> IpythonShell | None: ...
     @ipython_shell.setter
     def ipython_shell(self, _: object) -> NoReturn: ...
     @property
+    def max_output_size(self) -> int: ...
+    @max_output_size.setter
+    def max_output_size(self, value: int) -> None: ...
+    @property
     def noninteractive(self) -> bool: ...
     @noninteractive.setter
     def noninteractive(self, value: bool) -> None: ...
     @property
+    def offline(self) -> bool: ...
+    @offline.setter
+    def offline(self, value: bool) -> None: ...
+    @property
+    def package_store(self) -> bool: ...
+    @package_store.setter
+    def package_store(self, value: bool) -> None: ...
+    @property
+    def parse_cache_size(self) -> int: ...
+    @parse_cache_size.setter
+    def parse_cache_size(self, value: int) -> None: ...
+    @property
     def pip_executable(self) -> str: ...
     @pip_executable.setter
     def pip_executable(self, exe_path: PosixPath | str) -> None: ...
     @property
+    def pip_worker(self) -> bool: ...
+    @pip_worker.setter
+    def pip_worker(self, value: bool) -> None: ...
+    @property
+    def plan_installs(self) -> bool: ...
+    @plan_installs.setter
+    def plan_installs(self, value: bool) -> None: ...
+    @property
     def project(self) -> AbstractProject | ConcreteProject: ...
     @project.setter
     def project(self, proj: AbstractProject | ConcreteProject | PosixPath | str | None) -> None: ...
@@ -99,7 +154,14 @@ class DavosConfig(metaclass=SingletonConfig):
     def suppress_stdout(self) -> bool: ...
     @suppress_stdout.setter
     def suppress_stdout(self, value: bool) -> None: ...
+    @property
+    def wheelhouse(self) -> bool: ...
+    @wheelhouse.setter
+    def wheelhouse(self, value: bool) -> None: ...
+    @property
+    def _stdlib_modules(self) -> frozenset[str]: ...
     def _find_default_pip_executable(self) -> str: ...
 
 def _block_greedy_ipython_completer() -> None: ...
+def _bool_option(name: str) -> property: ...
 def _get_stdlib_modules() -> frozenset[str]: ...
@@ -12,31 +12,58 @@ loading them into the user's namespace, and more.
 
 # pylint: disable=too-many-lines
 __all__ = [
+    'arun_shell_command',
+    'asmuggle',
+    'batch_install_cmd',
+    'cache_parsed_lines',
     'capture_stdout',
     'check_conda',
+    'distribution_index',
+    'DistributionIndex',
+    'environment_key',
+    'get_install_log_path',
     'get_previously_imported_pkgs',
     'handle_alternate_pip_executable',
     'import_name',
+    'install_onions',
+    'LazyModuleProxy',
     'Onion',
     'parse_line',
+    'prefetch',
     'prompt_input',
     'run_shell_command',
+    'satisfied_cache',
+    'SatisfiedCache',
+    'search_path_mtimes',
     'use_project',
     'smuggle'
 ]
 
 
+import asyncio
+import codecs
 import functools
 import importlib
-import itertools
+import importlib.machinery
+import json
+import locale
+import operator
+import os
 import sys
-from contextlib import contextmanager, redirect_stdout
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager, ExitStack, redirect_stdout
 from io import StringIO
 from pathlib import Path
-from subprocess import CalledProcessError
+from subprocess import CalledProcessError, PIPE, STDOUT
+from subprocess import run as run_subprocess
+from types import ModuleType
 
-from packaging.requirements import InvalidRequirement
+from packaging.requirements import InvalidRequirement, Requirement
 from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
 if sys.version_info < (3, 8):
     import importlib_metadata as metadata
 else:
@@ -52,11 +79,21 @@ from davos.core.exceptions import (
     SmugglerError,
     TheNightIsDarkAndFullOfTErrors
 )
-from davos.core.parsers import pip_parser
-from davos.core.regexps import (
-    pip_installed_pkgs_regex,
-    smuggle_statement_regex
+from davos.core.fileutils import write_atomic
+from davos.core.finder import project_finder
+from davos.core.installers import (
+    attach_report,
+    get_backend,
+    pip_report,
+    select_backend
 )
+from davos.core.parsers import parse_pip_spec_only, pip_parser
+from davos.core.pip_worker import run_in_pip_worker
+from davos.core.planner import get_install_plan, plan_cache
+from davos.core.regexps import smuggle_statement_scanner
+from davos.core.shell import _CHUNK_SIZE, OutputTail, stream_command
+from davos.core.store import ingest_dists, installed_version, link_dists
+from davos.core.wheelhouse import missing_wheels, wheel_cmd
 # noinspection PyUnresolvedReferences
 from davos.implementations import (
     _check_conda_avail_helper,
@@ -66,55 +103,1989 @@ from davos.implementations import (
 )
 
 
+_ParseCacheInfo = namedtuple('ParseCacheInfo',
+                             ['hits', 'misses', 'maxsize', 'currsize'])
+
+# runs installs started by smuggle() when `davos.background_install` is
+# enabled. A single thread, so installs never run concurrently
+_background_executor = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix='davos-install')
+# futures for background installs that may not have finished yet
+_background_installs = []
+# (Onion, asyncio.Future) pairs for packages requested by asmuggle()
+# calls that haven't started installing yet
+_async_install_queue = []
+# tasks running queued asmuggle() installs that may not have finished
+_async_install_tasks = []
+# {absolute module file path: RECORD hash} for files of loaded modules,
+# as of when they were loaded (see _snapshot_record_hashes())
+_loaded_file_hashes = {}
+
+
 class capture_stdout:    # pylint: disable=invalid-name
     """
-    Context manager for sending stdout to multiple streams at once.
+    Context manager for sending stdout to multiple streams at once.
+
+    Similar to `contextlib.redirect_stdout`, but different in that it:
+      - temporarily writes stdout to other streams *in addition to*
+        rather than *instead of* `sys.stdout`
+      - accepts any number of streams and sends stdout to each
+      - can optionally keep streams open after exiting context by
+        passing `closing=False`
+
+    Works by temporarily replacing `sys.stdout`'s `write` method with
+    its own `_write` method, which writes the received data to all
+    provided streams in addition to `sys.stdout`.
+    """
+
+    def __init__(self, *streams, closing=True):
+        """
+        Parameters
+        ----------
+        *streams : tuple of io.TextIOBase
+            I/O stream(s) to receive data sent to `sys.stdout`. Must be
+            subclasses of `io.TextIOBase` (i.e., support reading/writing
+            `str` data, rather than `bytes`).
+        closing : bool, optional
+            if `True` (default), close streams upon exiting the context
+            block.
+        """
+        self.streams = streams
+        self.closing = closing
+        self.sys_stdout_write = sys.stdout.write
+
+    def __enter__(self):
+        sys.stdout.write = self._write
+        if len(self.streams) == 1:
+            return self.streams[0]
+        return self.streams
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        sys.stdout.write = self.sys_stdout_write
+        if self.closing:
+            for stream in self.streams:
+                stream.close()
+
+    def _write(self, data):
+        for stream in self.streams:
+            stream.write(data)
+        self.sys_stdout_write(data)
+        sys.stdout.flush()
+
+
+async def _adeposit_wheels(installer_stdout, installer):
+    """
+    Add wheels for just-installed distributions to the wheelhouse.
+
+    The asynchronous counterpart to `_deposit_wheels()`, used by
+    `asmuggle()` so that the `pip wheel` command doesn't block the
+    running event loop.
+
+    Parameters
+    ----------
+    installer_stdout : str
+        The stdout generated by the installer command.
+    installer : {'pip', 'uv'}
+        The name of the installer backend that generated
+        `installer_stdout`.
+    """
+    dists = _wheels_to_deposit(installer_stdout, installer)
+    if not dists:
+        return
+    try:
+        await arun_shell_command(wheel_cmd(dists), live_stdout=False)
+    except CalledProcessError:
+        pass
+
+
+async def _asmuggle(namespace, project, name, *, as_, installer, args_str,
+                    installer_kwargs):
+    """
+    Coroutine that implements `asmuggle()`.
+
+    Parameters
+    ----------
+    namespace : dict
+        The namespace into which the smuggled object is loaded.
+    project : davos.core.project.ConcreteProject or None
+        The project that was active when `asmuggle()` was called.
+    name : str
+        The qualified name of the object to be smuggled.
+    as_ : str or None
+        The alias under which to load the object, if any.
+    installer : {'pip', 'conda'}
+        The name of the installer program.
+    args_str : str
+        Raw arguments to be passed to the installer.
+    installer_kwargs : dict
+        Argument values parsed from `args_str`.
+
+    Returns
+    -------
+    object
+        The smuggled object.
+    """
+    # let earlier installs finish before checking whether the package
+    # is installed, without blocking the event loop
+    pending_tasks = [task for task in _async_install_tasks if not task.done()]
+    if pending_tasks:
+        await asyncio.wait(pending_tasks)
+    if _background_installs:
+        await asyncio.get_running_loop().run_in_executor(
+            None, _wait_for_background_installs
+        )
+    with _project_on_path(project):
+        onion, smuggled_obj, install_pkg = _prepare_smuggle(
+            name, installer, args_str, installer_kwargs, blocking=False
+        )
+    if install_pkg:
+        if _is_detachable(onion):
+            # (wheels are deposited by the task that installs it)
+            installer_stdout = await _queue_async_install(onion)
+        else:
+            # editable and --target installs update sys.path, so run
+            # them (synchronously) the same way smuggle() does
+            _wait_for_background_installs()
+            installer_stdout = onion.install_package()
+            if onion.installer == 'pip':
+                await _adeposit_wheels(installer_stdout, onion.backend.name)
+        with _project_on_path(project):
+            smuggled_obj = _finish_install(
+                name, onion, installer_stdout,
+                installer_kwargs.get('no_input', False),
+                deposit_wheels=False
+            )
+    _bind_smuggled(namespace, name, as_, onion, smuggled_obj)
+    return smuggled_obj
+
+
+def _bind_smuggled(namespace, name, as_, onion, smuggled_obj):
+    """
+    Add a smuggled object to a namespace and record it as smuggled.
+
+    Parameters
+    ----------
+    namespace : dict
+        The namespace (see `_caller_namespace()`).
+    name : str
+        The qualified name of the smuggled object.
+    as_ : str or None
+        The alias under which to bind the object, if any.
+    onion : Onion
+        The `Onion` for the smuggled package.
+    smuggled_obj : object
+        The smuggled object (or a `LazyModuleProxy` for it).
+    """
+    # add the object name/alias to the notebook's global namespace
+    binding = name if as_ is None else as_
+    namespace[binding] = smuggled_obj
+    if isinstance(smuggled_obj, LazyModuleProxy):
+        # the package is cached once its installation finishes
+        smuggled_obj._davos_bind(namespace, binding)
+        return
+    # cache the smuggled (top-level) package by its full onion comment
+    # so rerunning cells is more efficient, but any change to version,
+    # source, etc. is caught
+    config.smuggled[onion.import_name] = onion.cache_key
+
+
+def _caller_namespace():
+    """
+    Get the namespace into which smuggled objects should be loaded.
+
+    Returns
+    -------
+    dict
+        The notebook's global namespace or, when running a module
+        transformed by the pure Python import hook, the global namespace
+        of the module that called `smuggle()` (i.e., the first frame
+        outside this module, which also contains the `use_project`
+        wrapper).
+    """
+    if config._ipython_shell is not None:
+        return config._ipython_shell.user_ns
+    frame = sys._getframe(1)
+    while frame.f_globals['__name__'] == __name__:
+        frame = frame.f_back
+    return frame.f_globals
+
+
+def _changed_modules(pkg_name, new_hashes, module_names):
+    """
+    Find which of a package's loaded modules an installation changed.
+
+    Compares the `RECORD` hashes of the files the package's loaded
+    modules were imported from (recorded before the installation by
+    `_snapshot_record_hashes()`) with those of the newly installed
+    version. Modules whose files changed must be re-executed, as must
+    other modules in the package that hold objects defined in them
+    (e.g., by importing names from them or subclassing their classes),
+    which would otherwise keep using the old versions of those objects.
+    The package's other modules don't need to be reloaded.
+
+    Parameters
+    ----------
+    pkg_name : str
+        The package's (top-level) import name.
+    new_hashes : dict of {str: str}
+        Hashes of the files of the newly installed distributions that
+        provide the package (see `_record_hashes()`). For a namespace
+        package, those of all its distributions that were installed.
+    module_names : list of str
+        Sorted names of loaded modules (see `_submodule_names()`).
+
+    Returns
+    -------
+    list of str or None
+        Names of the modules to reload, ordered so that each comes
+        after the others it uses objects from. `None` if which modules
+        changed can't be determined (e.g., the hash of the file a
+        module was loaded from wasn't recorded, or the file isn't part
+        of the new version), in which case the whole package must be
+        reloaded.
+    """
+    modules = {}
+    changed = set()
+    for mod_name in (pkg_name, *_submodule_names(module_names, pkg_name)):
+        module = sys.modules.get(mod_name)
+        if module is None:
+            continue
+        modules[mod_name] = module
+        module_file = getattr(module, '__file__', None)
+        if module_file is None:
+            # namespace package -- has no file that could have changed
+            continue
+        if not isinstance(module_file, str) or not module_file.endswith('.py'):
+            # only source files are compared, since a module loaded
+            # from a cached .pyc file or an archive may be out of sync
+            # with the source file recorded for it
+            return None
+        module_file = os.path.normpath(module_file)
+        old_hash = _loaded_file_hashes.get(module_file)
+        new_hash = new_hashes.get(module_file)
+        if old_hash is None or new_hash is None:
+            return None
+        if old_hash != new_hash:
+            changed.add(mod_name)
+    uses = {
+        mod_name: [ref for ref in _referenced_modules(module)
+                   if ref in modules and ref != mod_name]
+        for mod_name, module in modules.items()
+    }
+    # add modules that use objects from modules being reloaded until
+    # none are left
+    to_reload = changed
+    while True:
+        dependents = {
+            mod_name for mod_name, refs in uses.items()
+            if mod_name not in to_reload and not to_reload.isdisjoint(refs)
+        }
+        if not dependents:
+            break
+        to_reload |= dependents
+    to_reload = [mod_name for mod_name in modules if mod_name in to_reload]
+    return _dependency_order(to_reload, uses)
+
+
+def _dependency_order(keys, dependencies):
+    """
+    Order items so each comes after those it depends on.
+
+    Parameters
+    ----------
+    keys : iterable
+        The items to order.
+    dependencies : dict
+        Maps each item in `keys` to an iterable of items it depends on.
+        Items not in `keys` are ignored.
+
+    Returns
+    -------
+    list
+        The items in `keys`, ordered so each comes after its
+        dependencies. Items that don't depend on each other, or depend
+        on each other cyclically, keep their original relative order.
+    """
+    # depth-first search, adding each item once all of its dependencies
+    # have been added
+    keys = list(keys)
+    remaining = set(keys)
+    ordered = []
+    for root in keys:
+        if root not in remaining:
+            continue
+        remaining.discard(root)
+        stack = [(root, iter(dependencies.get(root, ())))]
+        while stack:
+            key, deps = stack[-1]
+            for dep_key in deps:
+                if dep_key in remaining:
+                    remaining.discard(dep_key)
+                    stack.append((dep_key, iter(dependencies.get(dep_key, ()))))
+                    break
+            else:
+                stack.pop()
+                ordered.append(key)
+    return ordered
+
+
+def _deposit_wheels(installer_stdout, installer):
+    """
+    Add wheels for just-installed distributions to the wheelhouse.
+
+    Called after installing one or more packages when `davos.wheelhouse`
+    is enabled. Runs a single `pip wheel --no-deps` command for the
+    exact versions of all installed distributions not already in the
+    shared wheelhouse (see `davos.core.wheelhouse`). Distributions
+    installed from a direct URL (e.g., a local path or VCS repository)
+    are excluded, since `pip wheel` can't find them by version (and
+    would fail the whole command).
+
+    Parameters
+    ----------
+    installer_stdout : str
+        The stdout generated by the installer command.
+    installer : {'pip', 'uv'}
+        The name of the installer backend that generated
+        `installer_stdout`.
+
+    Notes
+    -----
+    Depositing wheels is an optimization for future installs, so errors
+    are ignored rather than interrupting the `smuggle` statement that
+    triggered the installation.
+    """
+    dists = _wheels_to_deposit(installer_stdout, installer)
+    if not dists:
+        return
+    try:
+        run_shell_command(wheel_cmd(dists), live_stdout=False)
+    except CalledProcessError:
+        pass
+
+
+def _finish_install(name, onion, installer_stdout, no_input=False, *,
+                    deposit_wheels=True):
+    """
+    Load a just-installed package.
+
+    Called by `smuggle()` (or, for packages installed in the background,
+    `LazyModuleProxy`) after a package's install command has run. Adds
+    the installed distributions to the wheelhouse and/or package store,
+    if enabled, reloads any previously imported packages that were
+    updated, and imports the smuggled object.
+
+    Parameters
+    ----------
+    name : str
+        The qualified name of the smuggled object.
+    onion : Onion
+        The `Onion` for the installed package.
+    installer_stdout : str
+        The stdout generated by the install command.
+    no_input : bool, optional
+        Whether the user passed `--no-input` to the installer via an
+        onion comment (default: `False`). See
+        `_reload_previously_imported()`.
+    deposit_wheels : bool, optional
+        Whether to add the installed distributions to the wheelhouse
+        (default: `True`). `asmuggle()` passes `False`, and deposits
+        them asynchronously instead (see `_adeposit_wheels()`).
+
+    Returns
+    -------
+    object
+        The smuggled object.
+    """
+    if onion.installer == 'pip':
+        if deposit_wheels:
+            _deposit_wheels(installer_stdout, onion.backend.name)
+        _store_dists(installer_stdout, onion.backend.name)
+    _reload_previously_imported(installer_stdout, onion.backend.name,
+                                [name.split('.')[0]], no_input)
+    if (
+            config._project is None and
+            config._pip_executable != config._default_pip_executable
+    ):
+        # setting `davos.pip_executable` to a non-default value
+        # changes the executable used in all cases, but only affects
+        # the install location if not using a davos Project
+        with handle_alternate_pip_executable(onion.install_name):
+            return import_name(name)
+    return import_name(name)
+
+
+def _install_batch_queue():
+    """
+    Install all missing packages queued by the parser in a single step.
+
+    When `davos.batch_install` is `True`, the `davos` parser records the
+    arguments for each `smuggle()` call it generates for a cell in
+    `davos.config._batch_queue`. The first `smuggle()` call executed in
+    that cell then calls this function, which creates an `Onion` for
+    each queued package, and installs all of those not already
+    available locally with a single installer command (see
+    `install_onions()`). The `smuggle()` calls themselves then run in
+    statement order as usual, but find their packages already
+    installed. If any packages are missing and the active project has a
+    lockfile, the lockfile's packages are installed first (see
+    `_install_lockfile()`).
+
+    Onions that can't be combined with others in a single command (see
+    `Onion.is_batchable`) are skipped, as are packages that appear in
+    multiple `smuggle` statements after their first occurrence, and
+    Onions whose arguments are invalid. These are left for their
+    individual `smuggle()` calls to install (or raise errors for) as
+    they normally would.
+
+    Raises
+    ------
+    SmugglerError
+        If `davos.confirm_install` is `True` and the user declines to
+        install the batched packages.
+
+    Notes
+    -----
+    Because the queue is populated when the cell is parsed, the batch
+    includes packages from *all* `smuggle` statements in the cell,
+    including any that are not ultimately executed (e.g., those inside
+    an `if` block whose condition is not met).
+    """
+    queued = config._batch_queue
+    # reset the queue before installing so that the batch is processed
+    # only once, even if the installation fails
+    config._batch_queue = []
+    to_install = {}
+    seen_pkgs = set()
+    for name, installer, args_str, installer_kwargs in queued:
+        pkg_name = name.split('.')[0]
+        if pkg_name in seen_pkgs or pkg_name == 'davos':
+            continue
+        seen_pkgs.add(pkg_name)
+        try:
+            onion = Onion(pkg_name, installer=installer,
+                          args_str=args_str, **installer_kwargs)
+        except DavosError:
+            # defer raising errors for invalid onions to the
+            # corresponding smuggle() call, so they're raised in order
+            continue
+        if (
+                onion.is_batchable and
+                # pip raises an error if the same distribution is
+                # requested twice in a single command
+                onion.install_name not in to_install and
+                not onion.is_installed
+        ):
+            to_install[onion.install_name] = onion
+
+    if to_install and _install_lockfile():
+        # the active project's lockfile may have provided some packages
+        to_install = {
+            install_name: onion for install_name, onion in to_install.items()
+            if not onion.is_installed
+        }
+
+    if not to_install:
+        return
+
+    onions = list(to_install.values())
+    if config.confirm_install:
+        pkg_names = ', '.join(repr(onion.import_name) for onion in onions)
+        msg = (f"packages {pkg_names} will be installed with the following "
+               f"command:\n\t`{batch_install_cmd(onions)}`\nProceed?")
+        confirmed = prompt_input(msg, default='y')
+        if not confirmed:
+            raise SmugglerError(f"packages {pkg_names} not installed") from None
+
+    _wait_for_background_installs()
+    _snapshot_record_hashes(onions)
+    installer_stdout = install_onions(onions)
+    _deposit_wheels(installer_stdout, get_backend().name)
+    _store_dists(installer_stdout, get_backend().name)
+    _reload_previously_imported(installer_stdout, get_backend().name,
+                                [onion.import_name for onion in onions])
+
+
+def _install_in_background(onion):
+    """
+    Start installing a package in a background thread.
+
+    Parameters
+    ----------
+    onion : Onion
+        The `Onion` for the package to be installed.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        A future whose result is the stdout generated by the install
+        command.
+    """
+    _background_installs[:] = [
+        future for future in _background_installs if not future.done()
+    ]
+    _snapshot_record_hashes([onion])
+    future = _background_executor.submit(_run_background_install_cmd,
+                                         onion.install_cmd)
+    _background_installs.append(future)
+    return future
+
+
+def _is_detachable(onion):
+    """
+    Check whether a package can be installed separately from loading it.
+
+    Parameters
+    ----------
+    onion : Onion
+        The `Onion` for the package to be installed.
+
+    Returns
+    -------
+    bool
+        `True` if the package's install command can run without
+        `Onion.install_package()` (i.e., in the background or
+        asynchronously). `False` for editable installs and those with
+        a custom `--target` directory, which require updating
+        `sys.path` after installation.
+    """
+    return (
+        onion.installer == 'pip' and
+        not onion.is_editable and
+        onion.installer_kwargs.get('target') is None
+    )
+
+
+def _install_lockfile():
+    """
+    Install all packages pinned in the active project's lockfile.
+
+    If the active project (`davos.project`) has a lockfile (see
+    `Project.lock()`) whose packages haven't been installed since it was
+    last modified (in this or a previous session), installs them all
+    with a single `pip install --no-deps` command. Because the lockfile
+    pins every package in the project, including dependencies, pip
+    doesn't need to resolve dependencies, and simply skips those that
+    are already installed.
+    This is called only when a smuggled package is missing, so that
+    rerunning a notebook whose packages are all installed doesn't
+    require running pip at all.
+
+    Returns
+    -------
+    bool
+        `True` if the lockfile's packages were installed, or `False` if
+        there is no lockfile or its packages were already installed.
+
+    Raises
+    ------
+    SmugglerError
+        If `davos.confirm_install` is `True` and the user declines to
+        install the lockfile's packages.
+    InstallerError
+        If the installer command returns a non-zero exit status.
+    """
+    project = config.project
+    if project is None:
+        return False
+    try:
+        lockfile_mtime = project.lockfile.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    if lockfile_mtime == project._lockfile_mtime:
+        return False
+    if project._lockfile_installed():
+        # installed in a previous session. Reinstalling it would
+        # downgrade any packages upgraded in the project since then
+        project._lockfile_mtime = lockfile_mtime
+        return False
+
+    backend = get_backend()
+    install_cmd = backend.install_cmd(f'--no-deps -r "{project.lockfile}"')
+    if config.confirm_install:
+        msg = (f"packages pinned in {project.lockfile} will be installed "
+               f"with the following command:\n\t`{install_cmd}`\nProceed?")
+        confirmed = prompt_input(msg, default='y')
+        if not confirmed:
+            raise SmugglerError(
+                f"packages pinned in {project.lockfile} not installed"
+            ) from None
+    _wait_for_background_installs()
+    if config.package_store:
+        linked_stdout, run_installer = _link_lockfile(project)
+    else:
+        linked_stdout, run_installer = '', True
+    if run_installer:
+        try:
+            installer_stdout = run_shell_command(install_cmd)
+        except CalledProcessError as e:
+            raise InstallerError.from_error(e)
+    # record the lockfile's mtime only after a successful install so a
+    # failed install is retried by the next smuggle() call
+    project._lockfile_mtime = lockfile_mtime
+    project._record_lockfile_installed()
+    if linked_stdout:
+        _reload_previously_imported(linked_stdout, 'pip', [])
+    if run_installer:
+        _deposit_wheels(installer_stdout, backend.name)
+        _store_dists(installer_stdout, backend.name)
+        _reload_previously_imported(installer_stdout, backend.name, [])
+    return True
+
+
+def _link_lockfile(project):
+    """
+    Install packages pinned in a project's lockfile from the store.
+
+    Called by `_install_lockfile()` when `davos.package_store` is
+    enabled. Links each distribution pinned to an exact version in the
+    project's lockfile that's available in the package store (and not
+    already installed) into the project's `site-packages` directory
+    (see `davos.core.store`).
+
+    Parameters
+    ----------
+    project : davos.core.project.ConcreteProject
+        The project whose lockfile should be installed.
+
+    Returns
+    -------
+    linked_stdout : str
+        A `pip install`-style summary of the distributions that were
+        linked (empty if none were).
+    run_installer : bool
+        Whether the installer still needs to be run for the lockfile
+        (i.e., whether any of its requirements aren't pinned to an
+        exact version or weren't available in the store).
+    """
+    pins = []
+    run_installer = False
+    lockfile_text = project.lockfile.read_text(encoding='utf-8')
+    for line in lockfile_text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, sep, version = line.partition('==')
+        if sep and ';' not in version and ' ' not in version:
+            pins.append((name.strip(), version))
+        else:
+            # requirement installed from a VCS repository, URL, or
+            # local path
+            run_installer = True
+    linked = link_dists(project.site_packages_dir, pins)
+    if not run_installer:
+        run_installer = any(
+            installed_version(project.site_packages_dir, name) is None
+            for name, _ in pins
+        )
+    if not linked:
+        return '', run_installer
+    linked_stdout = ('Successfully installed '
+                     f"{' '.join(f'{name}-{version}' for name, version in linked)}\n")
+    if not config._suppress_stdout:
+        print(f'Linked {len(linked)} packages from the davos package store')
+        print(linked_stdout, end='')
+    return linked_stdout, run_installer
+
+
+@contextmanager
+def _logged_output_tail(command):
+    """
+    Capture a command's output, keeping only its end in memory.
+
+    Used when `davos.max_output_size` is set. The command's full output
+    is appended to the install log file (see `get_install_log_path()`),
+    and only its last `davos.max_output_size` KiB are kept in memory.
+
+    Parameters
+    ----------
+    command : str
+        The command whose output is captured (recorded in the log file
+        before its output).
+
+    Yields
+    ------
+    tail : davos.core.shell.OutputTail
+        The stream to which the command's output should be written.
+    log_msg : str
+        A note saying where the full output was saved, for display.
+    """
+    log_path = get_install_log_path()
+    try:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_file = log_path.open('a', encoding='utf-8', errors='replace')
+    except OSError:
+        # the log is for reference only; don't fail the install
+        log_file = None
+        log_msg = "full output not saved"
+    else:
+        log_file.write(f'$ {command}\n')
+        log_msg = f"full output in {log_path}"
+    try:
+        yield OutputTail(config.max_output_size * 1024, log_file), log_msg
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+
+def _needs_restart(pkg_name, dists, module_names):
+    """
+    Predict whether a package can't be reloaded after an installation.
+
+    Packages with compiled extension modules can't be reloaded within
+    an interpreter session. `importlib.reload()` fails for some of them
+    only after it has removed and re-imported some of the package's
+    submodules. For others, it appears to succeed while keeping the old
+    version's extensions in use. So rather than attempting the reload,
+    a package is predicted to need a restart if any of its extension
+    modules were loaded from the previous version and the new version
+    also contains extension modules.
+
+    Parameters
+    ----------
+    pkg_name : str
+        The package's (top-level) import name.
+    dists : list of importlib.metadata.Distribution
+        The newly installed distributions that provide the package
+        (more than one if it's a namespace package with portions in
+        several distributions).
+    module_names : list of str
+        Sorted names of loaded modules (see `_submodule_names()`).
+
+    Returns
+    -------
+    bool
+        `True` if the interpreter must be restarted to use the new
+        version of the package. `False` if it may be reloaded, or if
+        the new versions' files aren't recorded in their metadata
+        (i.e., they have no `RECORD` files).
+    """
+    extension_suffixes = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+    for mod_name in (pkg_name, *_submodule_names(module_names, pkg_name)):
+        module_file = getattr(sys.modules.get(mod_name), '__file__', None)
+        if (
+                isinstance(module_file, str) and
+                module_file.endswith(extension_suffixes)
+        ):
+            # extension module loaded from the previous version
+            break
+    else:
+        return False
+    for dist in dists:
+        for path in dist.files or ():
+            # the package's own extension modules, or an extension
+            # module installed as a top-level module (e.g.,
+            # `_cffi_backend`), excluding shared libraries in other
+            # directories (e.g., `numpy.libs/`)
+            if path.name.endswith(extension_suffixes) and (
+                    path.parts[0] == pkg_name or
+                    path.name.startswith(f'{pkg_name}.')
+            ):
+                return True
+    return False
+
+
+def _prepare_smuggle(name, installer, args_str, installer_kwargs, *,
+                     blocking=True):
+    """
+    Load a smuggled object if it's installed, or prepare to install it.
+
+    Implements the first steps of `smuggle()`: installs any packages
+    queued by the parser in batch install mode, waits for any
+    background installs to finish, creates the `Onion` for the package,
+    and tries to load the smuggled object from an existing local
+    installation or the active project's lockfile. If the package needs
+    to be installed, resolves its install plan if `davos.plan_installs`
+    is enabled, and asks the user for confirmation if
+    `davos.confirm_install` is enabled.
+
+    Parameters
+    ----------
+    name : str
+        The qualified name of the smuggled object.
+    installer : {'pip', 'conda'}
+        The name of the installer program.
+    args_str : str
+        Raw arguments to be passed to the installer.
+    installer_kwargs : dict
+        Argument values parsed from `args_str`.
+    blocking : bool, optional
+        Whether to perform the steps that run installer commands
+        synchronously (default: `True`): installing packages queued in
+        batch install mode, installing the active project's lockfile,
+        and resolving an uncached install plan with a dry run.
+        `asmuggle()` passes `False`, so that they don't block the
+        running event loop.
+
+    Returns
+    -------
+    onion : Onion
+        The `Onion` for the smuggled package.
+    smuggled_obj : object or None
+        The smuggled object, or `None` if it needs to be installed.
+    install_pkg : bool
+        Whether the package needs to be installed.
+
+    Raises
+    ------
+    SmugglerError
+        If the user declines to install the package.
+    """
+    pkg_name = name.split('.')[0]
+
+    if pkg_name == 'davos':
+        raise TheNightIsDarkAndFullOfTErrors("Don't do that.")
+
+    if config._batch_queue and blocking:
+        # first smuggle() call in a cell parsed with `batch_install`
+        # enabled -- install all of the cell's missing packages at once
+        _install_batch_queue()
+
+    # a background install may still be writing to the environment, and
+    # may even be installing this package
+    _wait_for_background_installs()
+    onion = Onion(pkg_name, installer=installer,
+                  args_str=args_str, **installer_kwargs)
+    smuggled_obj = None
+
+    if onion.is_installed:
+        try:
+            # Unlike regular import, can be called on non-module items:
+            #     ```python
+            #     import numpy.array`                   # fails
+            #     array = import_item('numpy.array')    # succeeds
+            #     ```
+            # Also adds module (+ parents, if any) to sys.modules if not
+            # already present.
+            smuggled_obj = import_name(name)
+        except ModuleNotFoundError:
+            install_pkg = True
+        else:
+            install_pkg = False
+    else:
+        install_pkg = True
+
+    if (
+            install_pkg and
+            blocking and
+            onion.installer == 'pip' and
+            _install_lockfile()
+    ):
+        # the active project's lockfile may have provided the package
+        if onion.is_installed:
+            try:
+                smuggled_obj = import_name(name)
+            except ModuleNotFoundError:
+                pass
+            else:
+                install_pkg = False
+
+    if not install_pkg:
+        # remember that the package is installed so future sessions
+        # don't have to search for it again
+        satisfied_cache.add(onion)
+        return onion, smuggled_obj, install_pkg
+
+    if config.plan_installs:
+        onion.plan = get_install_plan(onion, resolve=blocking)
+    if config.confirm_install and not installer_kwargs.get('no_input'):
+        msg = (f"package {pkg_name!r} will be installed with the "
+               f"following command:\n\t`{onion.install_cmd}`\n")
+        if onion.plan is not None:
+            msg += f"{onion.plan.summary()}\n"
+        msg += "Proceed?"
+        confirmed = prompt_input(msg, default='y')
+        if not confirmed:
+            raise SmugglerError(
+                f"package {pkg_name!r} not installed"
+            ) from None
+
+    return onion, smuggled_obj, install_pkg
+
+
+def _previously_imported_dists(install_cmd_stdout, installer):
+    """
+    Find previously imported packages and the distributions providing them.
+
+    Implements `get_previously_imported_pkgs()`.
+
+    Parameters
+    ----------
+    install_cmd_stdout : str
+        Captured stdout generated by the installation.
+    installer : {'pip', 'uv', 'conda'}
+        The name of the program (installer backend) that generated the
+        output to be parsed.
+
+    Returns
+    -------
+    list of tuple
+        (import name, distribution) pairs for the installed/upgraded
+        packages that were previously imported, where each distribution
+        is the (newly installed) `importlib.metadata.Distribution` that
+        provides the package. Ordered so that each package comes after
+        the packages its distribution depends on.
+    """
+    if installer == 'conda':
+        raise NotImplementedError(
+            "conda-install stdout parsing is not yet implemented"
+        )
+    # install command's stdout contains install names (e.g.,
+    # scikit-learn), but we need import names (e.g., sklearn).
+    # use the install names to get the package distribution objects
+    backend = get_backend(installer)
+    installed_dists = [
+        (pkg_name, distribution_index.distribution(pkg_name))
+        for pkg_name in backend.installed_dists(install_cmd_stdout)
+    ]
+    prev_imported = []
+    for pkg_name, dist in _sort_by_dependencies(installed_dists):
+        # check the distribution's metadata for a file containing
+        # top-level import names. Also includes names of namespace
+        # packages (e.g. mpl_toolkits from matplotlib), if any.
+        toplevel_names = dist.read_text('top_level.txt')
+        if toplevel_names is None:
+            # importlib.metadata.PathDistribution.read_text() suppresses
+            # FileNotFoundError (also IsADirectoryError, KeyError,
+            # NotADirectoryError, and PermissionError), so if
+            # toplevel_names is None, top_level.txt doesn't exist and
+            # the import name is the install name
+            toplevel_names = (pkg_name,)
+        else:
+            # file contains one name per line (with trailing newline)
+            toplevel_names = toplevel_names.split()
+
+        for name in toplevel_names:
+            if name in sys.modules:
+                prev_imported.append((name, dist))
+
+    return prev_imported
+
+
+def _print_output_summary(tail, log_msg, failed):
+    """
+    Display a short summary of a command's bounded output.
+
+    Shows the last few lines of output if the command succeeded, or all
+    of the output kept in memory if it failed, followed by the output's
+    total size and where it was saved. Does nothing if
+    `davos.suppress_stdout` is `True`.
+
+    Parameters
+    ----------
+    tail : davos.core.shell.OutputTail
+        The stream that captured the command's output (see
+        `_logged_output_tail()`).
+    log_msg : str
+        A note saying where the full output was saved.
+    failed : bool
+        Whether the command returned a non-zero exit status.
+    """
+    if config._suppress_stdout:
+        return
+    stdout = tail.getvalue()
+    if failed:
+        summary = stdout
+    else:
+        summary = ''.join(stdout.splitlines(keepends=True)[-3:])
+    if summary and not summary.endswith('\n'):
+        summary += '\n'
+    sys.stdout.write(
+        f"{summary}[{tail.size / 1024:,.1f} KiB of output; {log_msg}]\n"
+    )
+
+
+@contextmanager
+def _project_on_path(project):
+    """
+    Make a project's packages importable within a context.
+
+    Parameters
+    ----------
+    project : davos.core.project.ConcreteProject or None
+        The project whose packages should be importable. If `None`,
+        only packages in the main environment are importable.
+
+    See Also
+    --------
+    use_project : Applies this context to all `smuggle()` calls.
+    """
+    if project is None:
+        yield
+        return
+    # serve the project's packages from the persistent meta path finder
+    # (with priority over versions in the "regular" environment) rather
+    # than prepending its site-packages directory to sys.path, which
+    # would require invalidating all import finders' caches both when
+    # it's added and when it's removed
+    with project_finder.activate(project.site_packages_dir):
+        yield
+
+
+def _proxy_method(func, reflected=False):
+    """
+    Create a `LazyModuleProxy` method that forwards to the real object.
+
+    Special methods (operators, `len()`, iteration, etc.) are looked up
+    on an object's type rather than the object itself, so
+    `LazyModuleProxy.__getattr__` never sees them. Each one is instead
+    defined on the class as a method that resolves the proxy and
+    applies the corresponding function to the smuggled object.
+
+    Parameters
+    ----------
+    func : callable
+        The function the method applies (e.g., `operator.add`). Its
+        first argument is the smuggled object.
+    reflected : bool, optional
+        If `True` (default: `False`), pass the smuggled object to
+        `func` as its second argument instead (for reflected binary
+        operators such as `__radd__`).
+
+    Returns
+    -------
+    function
+        The method.
+    """
+    if reflected:
+        def method(self, other):
+            return func(other, self._davos_resolve())
+    else:
+        def method(self, *args):
+            return func(self._davos_resolve(), *args)
+
+    method.__name__ = getattr(func, '__name__', method.__name__)
+    return method
+
+
+def _queue_async_install(onion):
+    """
+    Queue a package to be installed by the running event loop.
+
+    Packages queued by `asmuggle()` calls that run concurrently (e.g.,
+    via `asyncio.gather()`) during the same iteration of the event loop
+    are installed together, with a single installer command where
+    possible (see `_run_async_installs()`).
+
+    Parameters
+    ----------
+    onion : Onion
+        The `Onion` for the package to be installed.
+
+    Returns
+    -------
+    asyncio.Future
+        A future whose result is the stdout generated by the install
+        command.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _async_install_queue.append((onion, future))
+    if len(_async_install_queue) == 1:
+        # start installing once the other coroutines scheduled for this
+        # iteration of the event loop have had a chance to queue theirs
+        loop.call_soon(_start_async_installs)
+    return future
+
+
+def _record_hashes(dist):
+    """
+    Get the hashes of a distribution's files from its `RECORD` file.
+
+    Parameters
+    ----------
+    dist : importlib.metadata.Distribution
+        The installed distribution.
+
+    Returns
+    -------
+    dict of {str: str}
+        Maps the normalized, absolute path of each of the
+        distribution's files whose hash is recorded to its hash (e.g.,
+        `'sha256=<digest>'`). Empty if the distribution has no `RECORD`
+        file.
+    """
+    hashes = {}
+    for path in dist.files or ():
+        if path.hash is not None:
+            file_path = os.path.normpath(dist.locate_file(path))
+            hashes[file_path] = f'{path.hash.mode}={path.hash.value}'
+    return hashes
+
+
+def _referenced_modules(module):
+    """
+    Find the modules that define the objects in a module's namespace.
+
+    Parameters
+    ----------
+    module : types.ModuleType
+        The module.
+
+    Returns
+    -------
+    set of str
+        The names of the modules in which the objects bound to names
+        in `module` (other than modules themselves, which are reloaded
+        in place) and their classes' base classes were defined.
+    """
+    refs = set()
+    for value in list(vars(module).values()):
+        if isinstance(value, ModuleType):
+            continue
+        try:
+            owner = getattr(value, '__module__', None)
+            bases = value.__mro__[1:] if isinstance(value, type) else ()
+        except Exception:    # pylint: disable=broad-except
+            # some objects (e.g., lazy-loading proxies) may raise
+            # arbitrary errors on attribute access
+            continue
+        if isinstance(owner, str):
+            refs.add(owner)
+        refs.update(base.__module__ for base in bases)
+    return refs
+
+
+def _reload_modules(mod_names):
+    """
+    Reload specific modules, restoring them if any of them fails.
+
+    Parameters
+    ----------
+    mod_names : list of str
+        Names of loaded modules, in the order they should be reloaded.
+
+    Returns
+    -------
+    bool
+        Whether all of the modules were reloaded successfully. If not,
+        the original module objects are put back in `sys.modules` and
+        their namespaces are restored to their contents before the
+        first reload, so the previous version remains usable.
+    """
+    saved = {}
+    for mod_name in mod_names:
+        module = sys.modules[mod_name]
+        saved[mod_name] = (module, module.__dict__.copy())
+    try:
+        for mod_name in mod_names:
+            importlib.reload(sys.modules[mod_name])
+    except (ImportError, RuntimeError):
+        for mod_name, (module, namespace) in saved.items():
+            module.__dict__.clear()
+            module.__dict__.update(namespace)
+            sys.modules[mod_name] = module
+        return False
+    return True
+
+
+def _reload_package(pkg_name, module_names):
+    """
+    Reload a package and all of its loaded submodules.
+
+    Parameters
+    ----------
+    pkg_name : str
+        The package's (top-level) import name.
+    module_names : list of str
+        Sorted names of loaded modules (see `_submodule_names()`).
+
+    Returns
+    -------
+    bool
+        Whether the package was reloaded successfully. If not, the
+        previous version's modules are left in place.
+    """
+    dep_modules_old = {}
+    for mod_name in _submodule_names(module_names, pkg_name):
+        # remove submodules of previously imported packages so
+        # new versions get imported when main package is
+        # reloaded (importlib.reload only reloads top-level
+        # module). IPython.lib.deepreload.reload recursively
+        # reloads submodules, but is basically broken because
+        # it's *too* aggressive. It reloads *all* imported
+        # modules... including the import machinery it needs to
+        # run, which crashes it... (-_-* )
+        if mod_name in sys.modules:
+            dep_modules_old[mod_name] = sys.modules.pop(mod_name)
+
+    # get (but don't pop) top-level package to that it can be
+    # reloaded (must exist in sys.modules)
+    dep_modules_old[pkg_name] = sys.modules[pkg_name]
+    try:
+        importlib.reload(sys.modules[pkg_name])
+    except (ImportError, RuntimeError):
+        # if we aren't able to reload the module, put the old
+        # version's submodules we removed back in sys.modules
+        # for now and prepare to show a warning post-execution.
+        # This way:
+        #   1. the user still has a working module until they
+        #      restart the runtime
+        #   2. the error we got doesn't keep getting raised when
+        #      we try to reload/import other modules that
+        #      import it
+        sys.modules.update(dep_modules_old)
+        return False
+    return True
+
+
+def _reload_previously_imported(
+        installer_stdout,
+        installer,
+        smuggled_pkgs,
+        no_input=False
+):
+    """
+    Reload packages affected by an installation that were already loaded.
+
+    Called after installing one or more smuggled packages. Makes the
+    import machinery aware of the newly installed package(s), then
+    checks whether any of the installed/upgraded distributions were
+    previously imported during the current interpreter session and, if
+    so, reloads them. Packages that cannot be reloaded (e.g., because
+    their C extensions have changed) are handled according to the
+    `auto_rerun` and `noninteractive` config fields. Packages predicted
+    not to be reloadable (see `_needs_restart()`) are handled the same
+    way, without attempting to reload them. When the files that a
+    package's loaded modules were imported from were recorded before
+    the installation (see `_snapshot_record_hashes()`), only the modules
+    whose files changed, and those that use objects from them, are
+    re-executed (see `_changed_modules()`). Otherwise, or if reloading
+    only those modules fails, the package and all of its loaded
+    submodules are reloaded.
+
+    Parameters
+    ----------
+    installer_stdout : str
+        The stdout generated by the installer command.
+    installer : {'pip', 'uv', 'conda'}
+        The name of the program (installer backend) that installed the
+        package(s).
+    smuggled_pkgs : list of str
+        Top-level names of the package(s) explicitly smuggled. Any of
+        these that were previously imported are reloaded after their
+        dependencies.
+    no_input : bool, optional
+        Whether the user passed `--no-input` to the installer via an
+        onion comment (default: `False`). If `True`, an error is raised
+        rather than prompting the user to restart the interpreter if any
+        packages could not be reloaded.
+
+    Raises
+    ------
+    SmugglerError
+        If any previously imported packages could not be reloaded and
+        `davos` is running in non-interactive mode (or `no_input` is
+        `True`) without `auto_rerun` enabled.
+    """
+    if project_finder.site_packages_dir is None:
+        # invalidate sys.meta_path module finder caches. Forces import
+        # machinery to notice newly installed module
+        importlib.invalidate_caches()
+    else:
+        # packages were installed into the active project's
+        # site-packages directory, so only its finder's caches are
+        # outdated
+        project_finder.invalidate_caches()
+    # if pkg_resources module has already been loaded, reload it in
+    # case the just-installed package uses it internally to populate
+    # its __version__ attribute from its metadata, Otherwise,
+    # pkg_resources's cached working set won't include the new
+    # package
+    if 'pkg_resources' in sys.modules:
+        importlib.reload(sys.modules['pkg_resources'])
+        if project_finder.site_packages_dir is not None:
+            # the project's site-packages directory isn't on sys.path
+            sys.modules['pkg_resources'].working_set.add_entry(
+                project_finder.site_packages_dir
+            )
+    # check whether the smuggled package and/or any
+    # installed/updated dependencies were already imported during
+    # the current runtime (in dependency order, so each package is
+    # reloaded after those it imports)
+    # {import name: [distributions]}. Portions of a namespace package
+    # (e.g., google) may be provided by several distributions
+    prev_imported_dists = {}
+    for pkg_name, dist in _previously_imported_dists(installer_stdout,
+                                                     installer):
+        prev_imported_dists.setdefault(pkg_name, []).append(dist)
+    prev_imported_pkgs = list(prev_imported_dists)
+    # if the smuggled package was previously imported, deal with
+    # it last so it's reloaded after its dependencies are in place
+    for pkg_name in smuggled_pkgs:
+        try:
+            prev_imported_pkgs.remove(pkg_name)
+        except ValueError:
+            # smuggled package is brand new
+            pass
+        else:
+            prev_imported_pkgs.append(pkg_name)
+
+    failed_reloads = []
+    # sort loaded modules' names once so each package's submodules can
+    # be found without scanning all of them. Submodules first imported
+    # while reloading an earlier package (which aren't included) are
+    # already from the newly installed version.
+    module_names = sorted(sys.modules)
+    for dep_name in prev_imported_pkgs:
+        dists = prev_imported_dists[dep_name]
+        if _needs_restart(dep_name, dists, module_names):
+            # reloading would fail partway through (or appear to
+            # succeed while keeping the old compiled extensions), so
+            # don't try
+            failed_reloads.append(dep_name)
+            continue
+        new_hashes = {}
+        for dist in dists:
+            new_hashes.update(_record_hashes(dist))
+        changed_modules = _changed_modules(dep_name, new_hashes, module_names)
+        if changed_modules is None:
+            # can't tell which of the package's modules changed, so
+            # re-import all of them
+            reloaded = _reload_package(dep_name, module_names)
+        else:
+            # re-execute only the modules whose files changed and those
+            # that use objects from them, keeping the rest as they are
+            reloaded = _reload_modules(changed_modules)
+            if not reloaded:
+                # e.g., a changed module imports a name its package's
+                # new version defines in a module not yet reloaded.
+                # Reloading the whole package may still succeed
+                reloaded = _reload_package(dep_name, module_names)
+        if reloaded:
+            # the new version's files are now the ones loaded
+            for file_path, file_hash in new_hashes.items():
+                if file_path in _loaded_file_hashes:
+                    _loaded_file_hashes[file_path] = file_hash
+        else:
+            failed_reloads.append(dep_name)
+
+    if any(failed_reloads):
+        # packages with C extensions (e.g., numpy, pandas) cannot be
+        # reloaded within an interpreter session. If the package was
+        # previously imported (even if not by the user), the kernel
+        # will most likely need to be restarted for changes to take
+        # effect
+        if config.auto_rerun:
+            auto_restart_rerun(failed_reloads)
+        elif config.noninteractive or no_input:
+            # if not auto_rerun, only remaining non-interactive
+            # option is to raise error
+            msg = (
+                "The following packages were previously imported by the "
+                "interpreter and could not be reloaded because their C "
+                "extensions have changed:\n\t"
+                f"[{', '.join(failed_reloads)}]\nRestart the kernel to "
+                "use the newly installed version."
+            )
+            if config.environment != 'Colaboratory':
+                msg = (
+                    f"{msg}\nTo make this happen automatically, set "
+                    "'davos.auto_rerun = True'."
+                )
+            raise SmugglerError(msg)
+        else:
+            prompt_restart_rerun_buttons(failed_reloads)
+
+
+def _required_names(dist):
+    """
+    Get the names of the distributions a distribution requires.
+
+    Parameters
+    ----------
+    dist : importlib.metadata.Distribution
+        The installed distribution.
+
+    Returns
+    -------
+    list of str
+        The canonicalized names of the distributions required by
+        `dist` (according to its metadata), excluding optional
+        dependencies and those for other platforms or Python versions.
+    """
+    names = []
+    for requirement in dist.requires or ():
+        try:
+            requirement = Requirement(requirement)
+        except InvalidRequirement:
+            continue
+        if (
+                requirement.marker is not None and
+                not requirement.marker.evaluate({'extra': ''})
+        ):
+            # dependency is optional (i.e., part of an extra) or for a
+            # different platform/Python version
+            continue
+        names.append(canonicalize_name(requirement.name))
+    return names
+
+
+async def _run_async_installs(queued, previous_tasks):
+    """
+    Install packages queued by concurrent `asmuggle()` calls.
+
+    Batchable packages (see `Onion.is_batchable`) are installed with a
+    single installer command, and the rest are installed one at a time.
+
+    Parameters
+    ----------
+    queued : list of tuple
+        (Onion, asyncio.Future) pairs for the queued packages. Each
+        future's result is set to the stdout of the command that
+        installed its package, or its exception to an `InstallerError`
+        if the command failed (or to any other error raised while
+        installing the packages). If the task is cancelled, the
+        futures are cancelled too.
+    previous_tasks : list of asyncio.Task
+        Earlier batches of installs that may still be running. These
+        are awaited first, so that multiple installer processes never
+        modify the same environment at once.
+    """
+    try:
+        if previous_tasks:
+            await asyncio.wait(previous_tasks)
+        # don't block the event loop while background installs finish
+        await asyncio.get_running_loop().run_in_executor(
+            None, _wait_for_background_installs
+        )
+        _snapshot_record_hashes([onion for onion, _ in queued])
+        batch = {}
+        commands = {}
+        for onion, future in queued:
+            if onion.is_batchable:
+                # pip raises an error if the same distribution is
+                # requested twice in a single command, so install it
+                # once for all calls that requested it
+                batch.setdefault(onion.install_name,
+                                 (onion, []))[1].append(future)
+            else:
+                commands.setdefault(
+                    onion.install_cmd, (onion.backend.name, [])
+                )[1].append(future)
+        if len(batch) > 1:
+            onions = [onion for onion, _ in batch.values()]
+            futures = [future for _, futures in batch.values()
+                       for future in futures]
+            commands = {
+                batch_install_cmd(onions): (get_backend().name, futures),
+                **commands
+            }
+        else:
+            commands = {
+                **{onion.install_cmd: (onion.backend.name, futures)
+                   for onion, futures in batch.values()},
+                **commands
+            }
+        for command, (installer, futures) in commands.items():
+            try:
+                installer_stdout = await arun_shell_command(command)
+            except CalledProcessError as e:
+                error = InstallerError.from_error(e)
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                await _adeposit_wheels(installer_stdout, installer)
+                for future in futures:
+                    # (the awaiting coroutine may have been cancelled)
+                    if not future.done():
+                        future.set_result(installer_stdout)
+    except Exception as e:    # pylint: disable=broad-exception-caught
+        # raise any other error from the awaiting coroutines, rather
+        # than leaving them waiting forever
+        for _, future in queued:
+            if not future.done():
+                future.set_exception(e)
+    finally:
+        # if this task was cancelled (or interrupted), cancel the
+        # awaiting coroutines too
+        for _, future in queued:
+            if not future.done():
+                future.cancel()
+
+
+def _run_background_install_cmd(command):
+    """
+    Run an install command from a background thread.
+
+    Unlike `run_shell_command()`, this doesn't redirect or write to
+    `sys.stdout` (which would affect output from the main thread), so
+    the command's output is captured and returned instead. If
+    `davos.max_output_size` is set, only the end of the output is kept
+    in memory, and the full output is appended to the install log file
+    (see `get_install_log_path()`).
+
+    Parameters
+    ----------
+    command : str
+        The install command.
+
+    Returns
+    -------
+    str
+        The command's stdout (with stderr merged in), or its end if
+        `davos.max_output_size` is set.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the command returns a non-zero exit status.
+    """
+    with pip_report(command) as (report_command, report_path):
+        if config.max_output_size:
+            # keep memory use bounded, as run_shell_command() does
+            with _logged_output_tail(report_command) as (tail, _):
+                returncode = stream_command(report_command,
+                                            write=tail.write)
+            stdout = tail.getvalue()
+        else:
+            result = run_subprocess(report_command,
+                                    shell=True,
+                                    stdout=PIPE,
+                                    stderr=STDOUT,
+                                    encoding=locale.getpreferredencoding(),
+                                    errors='replace',
+                                    check=False)
+            returncode, stdout = result.returncode, result.stdout
+        if returncode != 0:
+            raise CalledProcessError(returncode=returncode,
+                                     cmd=report_command, output=stdout)
+        return attach_report(stdout, report_path)
+
+
+def _run_shell_command_bounded(command):
+    """
+    Run a shell command, keeping only the end of its output in memory.
+
+    Used by `run_shell_command()` when `davos.max_output_size` is set.
+    The command's full output is appended to the install log file (see
+    `get_install_log_path()`) rather than displayed, and only its last
+    `davos.max_output_size` KiB are kept in memory. Unless
+    `davos.suppress_stdout` is `True`, a short summary is displayed
+    afterward: the last few lines of output if the command succeeded,
+    or all of the output kept in memory if it failed.
+
+    Parameters
+    ----------
+    command : str
+        The shell command to run.
+
+    Returns
+    -------
+    str
+        The end of the stdout generated by the command.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the command returns a non-zero exit status. Its `output`
+        attribute holds the end of the command's output.
+    """
+    error = None
+    with _logged_output_tail(command) as (tail, log_msg):
+        with redirect_stdout(tail):
+            try:
+                if not (config.pip_worker and run_in_pip_worker(command)):
+                    _run_shell_command_helper(command)
+            except CalledProcessError as e:
+                error = e
+    stdout = tail.getvalue()
+    _print_output_summary(tail, log_msg, error is not None)
+    if error is not None:
+        error.output = stdout
+        raise error
+    return stdout
+
+
+def _snapshot_record_hashes(onions):
+    """
+    Record the hashes of loaded modules' files before an installation.
+
+    Called before installing `onions`, since the installer removes the
+    `RECORD` files of any distributions it upgrades. Looks up the
+    hashes of the files that currently loaded modules were imported
+    from in the `RECORD` files of the distributions the packages may
+    upgrade: those the `onions` request and the installed distributions
+    they require (recursively). After the installation,
+    `_reload_previously_imported()` compares them with the new
+    version's hashes to reload only the modules whose files changed
+    (see `_changed_modules()`).
+
+    Parameters
+    ----------
+    onions : list of Onion
+        The `Onion`s for the packages about to be installed.
+    """
+    loaded_files = set()
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, '__file__', None)
+        if isinstance(module_file, str):
+            loaded_files.add(os.path.normpath(module_file))
+    # files already recorded haven't changed since they were loaded
+    loaded_files.difference_update(_loaded_file_hashes)
+    if not loaded_files:
+        return
+    to_visit = []
+    for onion in onions:
+        try:
+            to_visit.append(canonicalize_name(Requirement(onion.install_name).name))
+        except InvalidRequirement:
+            # e.g., a VCS URL or local path
+            pass
+    visited = set()
+    while to_visit:
+        name = to_visit.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+        try:
+            dist = distribution_index.distribution(name)
+        except metadata.PackageNotFoundError:
+            # not installed yet
+            continue
+        for file_path, file_hash in _record_hashes(dist).items():
+            if file_path in loaded_files:
+                _loaded_file_hashes[file_path] = file_hash
+        to_visit.extend(_required_names(dist))
 
-    Similar to `contextlib.redirect_stdout`, but different in that it:
-      - temporarily writes stdout to other streams *in addition to*
-        rather than *instead of* `sys.stdout`
-      - accepts any number of streams and sends stdout to each
-      - can optionally keep streams open after exiting context by
-        passing `closing=False`
 
-    Works by temporarily replacing `sys.stdout`'s `write` method with
-    its own `_write` method, which writes the received data to all
-    provided streams in addition to `sys.stdout`.
+def _sort_by_dependencies(dists):
     """
+    Sort distributions so each comes after those it depends on.
 
-    def __init__(self, *streams, closing=True):
-        """
-        Parameters
-        ----------
-        *streams : tuple of io.TextIOBase
-            I/O stream(s) to receive data sent to `sys.stdout`. Must be
-            subclasses of `io.TextIOBase` (i.e., support reading/writing
-            `str` data, rather than `bytes`).
-        closing : bool, optional
-            if `True` (default), close streams upon exiting the context
-            block.
-        """
-        self.streams = streams
-        self.closing = closing
-        self.sys_stdout_write = sys.stdout.write
+    Parameters
+    ----------
+    dists : list of tuple
+        (name, distribution) pairs, where each distribution is an
+        `importlib.metadata.Distribution`.
 
-    def __enter__(self):
-        sys.stdout.write = self._write
-        if len(self.streams) == 1:
-            return self.streams[0]
-        return self.streams
+    Returns
+    -------
+    list of tuple
+        The same pairs, ordered so that each distribution comes after
+        the others in `dists` that it requires (according to its
+        metadata, excluding optional dependencies). Distributions that
+        don't depend on each other, or depend on each other cyclically,
+        keep their original relative order.
+    """
+    by_name = {canonicalize_name(name): (name, dist) for name, dist in dists}
+    requires = {
+        key: [dep_key for dep_key in _required_names(dist)
+              if dep_key in by_name and dep_key != key]
+        for key, (_, dist) in by_name.items()
+    }
+    return [by_name[key] for key in _dependency_order(by_name, requires)]
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        sys.stdout.write = self.sys_stdout_write
-        if self.closing:
-            for stream in self.streams:
-                stream.close()
 
-    def _write(self, data):
-        for stream in self.streams:
-            stream.write(data)
-        self.sys_stdout_write(data)
-        sys.stdout.flush()
+def _start_async_installs():
+    """
+    Start installing all packages queued by `_queue_async_install()`.
+    """
+    queued = _async_install_queue[:]
+    _async_install_queue.clear()
+    previous_tasks = [task for task in _async_install_tasks if not task.done()]
+    task = asyncio.get_running_loop().create_task(
+        _run_async_installs(queued, previous_tasks)
+    )
+    _async_install_tasks[:] = previous_tasks + [task]
+
+
+def _store_dists(installer_stdout, installer):
+    """
+    Add just-installed distributions to the package store.
+
+    Called after installing one or more packages into a project when
+    `davos.package_store` is enabled. Moves each newly installed
+    distribution's files into the shared, content-addressed package
+    store (or, if an identical distribution is already stored, reuses
+    the stored files) and replaces them in the project with hardlinks
+    (see `davos.core.store`).
+
+    Parameters
+    ----------
+    installer_stdout : str
+        The stdout generated by the installer command.
+    installer : {'pip', 'uv'}
+        The name of the installer backend that generated
+        `installer_stdout`.
+    """
+    project = config._project
+    if not config.package_store or project is None:
+        return
+    backend = get_backend(installer)
+    ingest_dists(project.site_packages_dir,
+                 backend.installed_versions(installer_stdout))
+
+
+def _submodule_names(module_names, pkg_name):
+    """
+    Find the names of a package's submodules among sorted module names.
+
+    Parameters
+    ----------
+    module_names : list of str
+        Sorted names of modules (e.g., `sorted(sys.modules)`).
+    pkg_name : str
+        The name of the package.
+
+    Returns
+    -------
+    list of str
+        The names in `module_names` of `pkg_name`'s submodules (i.e.,
+        those that start with "`{pkg_name}.`").
+
+    Notes
+    -----
+    Since `module_names` is sorted, the submodules' names are
+    contiguous, and end before any names starting with "`{pkg_name}/`"
+    ("`/`" is the character after "`.`"). So they're found with a binary
+    search, rather than by checking every name.
+    """
+    start = bisect_left(module_names, f'{pkg_name}.')
+    stop = bisect_left(module_names, f'{pkg_name}/', lo=start)
+    return module_names[start:stop]
+
+
+def _wait_for_background_installs():
+    """
+    Wait for all background installs to finish.
+
+    Called before running any other install command, so that multiple
+    installer processes never modify the same environment at once.
+    Errors from background installs are left to be raised by their
+    `LazyModuleProxy` objects.
+    """
+    wait(_background_installs)
+    _background_installs.clear()
+
+
+def _wheels_to_deposit(installer_stdout, installer):
+    """
+    Find just-installed distributions whose wheels should be deposited.
+
+    Implements the first steps of `_deposit_wheels()` and
+    `_adeposit_wheels()`.
+
+    Parameters
+    ----------
+    installer_stdout : str
+        The stdout generated by the installer command.
+    installer : {'pip', 'uv'}
+        The name of the installer backend that generated
+        `installer_stdout`.
+
+    Returns
+    -------
+    list of tuple of str
+        (name, version) pairs for the installed distributions missing
+        from the wheelhouse, excluding those installed from a direct
+        URL. Empty if `davos.wheelhouse` is disabled or
+        `davos.offline` is enabled.
+    """
+    if not config.wheelhouse or config.offline:
+        # in offline mode, everything was installed from the wheelhouse
+        return []
+    backend = get_backend(installer)
+    report = getattr(installer_stdout, 'report', None)
+    if report is not None:
+        direct_names = {
+            canonicalize_name(item['metadata']['name'])
+            for item in report.get('install', []) if item.get('is_direct')
+        }
+    else:
+        direct_names = None
+    dists = []
+    for name, version in backend.installed_versions(installer_stdout):
+        if direct_names is None:
+            # no install report -- check the installed distribution's
+            # metadata, where pip records direct URLs
+            try:
+                dist = distribution_index.distribution(name)
+            except metadata.PackageNotFoundError:
+                continue
+            is_direct = dist.read_text('direct_url.json') is not None
+        else:
+            is_direct = canonicalize_name(name) in direct_names
+        if not is_direct:
+            dists.append((name, version))
+    return missing_wheels(dists)
+
+
+async def arun_shell_command(command, live_stdout=None):
+    """
+    Execute a shell command without blocking the running event loop.
+
+    The asynchronous counterpart to `run_shell_command()`.
+
+    Parameters
+    ----------
+    command : str
+        The shell command to run. May not end in "*&*", as background
+        processes are not supported.
+    live_stdout : bool, optional
+        Whether to display streaming stdout from `command` execution in
+        real time *in addition to* capturing and returning it. If `None`
+        (default), behavior is determined by the current value of
+        `davos.suppress_stdout`, or if `davos.max_output_size` is set,
+        only a summary is displayed and only the end of the output is
+        captured, as with `run_shell_command()`.
+
+    Returns
+    -------
+    str
+        The stdout generated by executing the shell command (with
+        stderr merged in).
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the command returns a non-zero exit status.
+
+    See Also
+    --------
+    run_shell_command : Runs a shell command synchronously.
+    """
+    if command.rstrip().endswith('&'):
+        raise OSError("Background processes are not supported.")
+
+    # keep memory use and displayed output bounded, as
+    # run_shell_command() does
+    bounded = live_stdout is None and bool(config.max_output_size)
+    if live_stdout is None:
+        live_stdout = not (bounded or config.suppress_stdout)
+    encoding = locale.getpreferredencoding()
+    with ExitStack() as stack:
+        report_command, report_path = stack.enter_context(
+            pip_report(command)
+        )
+        if bounded:
+            output, log_msg = stack.enter_context(
+                _logged_output_tail(report_command)
+            )
+        else:
+            output, log_msg = StringIO(), None
+        process = await asyncio.create_subprocess_shell(report_command,
+                                                        stdout=PIPE,
+                                                        stderr=STDOUT)
+        # read in chunks rather than lines, which the stream reader
+        # limits to 64 KiB (progress bars can make much longer ones)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        while True:
+            chunk = await process.stdout.read(_CHUNK_SIZE)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                output.write(text)
+                if live_stdout:
+                    sys.stdout.write(text)
+            if not chunk:
+                break
+        returncode = await process.wait()
+        stdout = output.getvalue()
+        if bounded:
+            _print_output_summary(output, log_msg, returncode != 0)
+        if returncode != 0:
+            raise CalledProcessError(returncode=returncode,
+                                     cmd=report_command, output=stdout)
+        return attach_report(stdout, report_path)
+
+
+def asmuggle(
+        name,
+        as_=None,
+        installer='pip',
+        args_str='',
+        installer_kwargs=None
+):
+    """
+    Smuggle a package without blocking the running event loop.
+
+    The awaitable counterpart to `smuggle()`, for use in asynchronous
+    code. If the package needs to be installed, the install command
+    runs as a subprocess managed by the event loop, so other tasks can
+    continue running in the meantime. Packages requested by multiple
+    `asmuggle()` calls awaited concurrently (e.g., with
+    `asyncio.gather()`) are installed together, with a single installer
+    command where possible. As with `smuggle()`, the smuggled object is
+    loaded into the caller's namespace under `name` (or `as_`).
+
+    Parameters
+    ----------
+    name : str
+        The qualified name of the package, module, function, or other
+        object to be smuggled.
+    as_ : str, optional
+        The alias under which to load the object into the namespace.
+    installer : {'pip', 'conda'}, optional
+        The name of the program used to install the package if a
+        satisfactory distribution is not found locally (default:
+        `'pip'`).
+    args_str : str, optional
+        Arguments to be passed to the `installer` program's "install"
+        command, in the same format as in an onion comment (e.g.,
+        `'numpy==1.26.4'`).
+    installer_kwargs : dict, optional
+        Argument values parsed from `args_str`. If `None` (default),
+        they're parsed from `args_str`.
+
+    Returns
+    -------
+    coroutine
+        A coroutine that smuggles the object and returns it.
+
+    Examples
+    --------
+    ```python
+    np, pd = await asyncio.gather(
+        davos.asmuggle('numpy', as_='np'),
+        davos.asmuggle('pandas', as_='pd', args_str='pandas>=2')
+    )
+    ```
+
+    Notes
+    -----
+    Editable installs and installs with a custom `--target` directory
+    run synchronously, as they do for `smuggle()`. Other steps that
+    `smuggle()` performs with blocking installer commands are skipped:
+    packages queued by `smuggle` statements in batch install mode are
+    left for the next `smuggle()` call to install, packages aren't
+    installed from the active project's lockfile, and only install
+    plans that are already cached are used (see `davos.plan_installs`).
+    """
+    # the namespace and project are determined when asmuggle() is
+    # called, since the coroutine may run in a different context
+    namespace = _caller_namespace()
+    if installer_kwargs is None:
+        if args_str:
+            _, args_str, installer_kwargs = Onion.parse_onion(
+                f'{installer}: {args_str}'
+            )
+            args_str = args_str[3:-3]
+        else:
+            installer_kwargs = {}
+    return _asmuggle(namespace, config._project, name, as_=as_,
+                     installer=installer, args_str=args_str,
+                     installer_kwargs=installer_kwargs)
+
+
+def batch_install_cmd(onions):
+    """
+    Get the shell command that installs multiple packages at once.
+
+    Parameters
+    ----------
+    onions : list of Onion
+        The `Onion`s for the packages to be installed. Each must be
+        installable alongside the others (i.e., `onion.is_batchable`
+        must be `True`).
+
+    Returns
+    -------
+    str
+        The shell command.
+    """
+    specs = ' '.join(onion.args_str or onion.install_name for onion in onions)
+    return get_backend().install_cmd(specs)
 
 
 def check_conda():
@@ -178,21 +2149,224 @@ def check_conda():
             config._conda_env = env_name
             return
 
-    if envs_dirs_dict is not None:
-        # if we somehow fail to parse the environment directory path
-        # from the output, but we DID successfully create the
-        # environment mapping, something weird is going on and it's
-        # worth throwing an error with some info now. Otherwise, defer
-        # potential errors to conda executable
-        raise DavosError(
-            "Failed to programmatically determine path to conda environment "
-            "directory. If you want to install smuggled packages using conda, "
-            "you can either:\n\t1. set `davos.conda_env_path` to your "
-            "environment's path (e.g., $CONDA_PREFIX/envs/this_env)\n\t2. "
-            "pass the environment path to `-p`/`--prefix` in each onion "
-            "comment\n\t3. pass your environment's name to `-n`/`--name` in "
-            "each onion comment"
-        )
+    if envs_dirs_dict is not None:
+        # if we somehow fail to parse the environment directory path
+        # from the output, but we DID successfully create the
+        # environment mapping, something weird is going on and it's
+        # worth throwing an error with some info now. Otherwise, defer
+        # potential errors to conda executable
+        raise DavosError(
+            "Failed to programmatically determine path to conda environment "
+            "directory. If you want to install smuggled packages using conda, "
+            "you can either:\n\t1. set `davos.conda_env_path` to your "
+            "environment's path (e.g., $CONDA_PREFIX/envs/this_env)\n\t2. "
+            "pass the environment path to `-p`/`--prefix` in each onion "
+            "comment\n\t3. pass your environment's name to `-n`/`--name` in "
+            "each onion comment"
+        )
+
+
+class DistributionIndex:
+    """
+    Index of installed distributions on the module search path.
+
+    Maps each installed distribution's normalized name (see PEP 503) to
+    its version and the path to its metadata directory, so that looking
+    up a distribution doesn't require searching every `sys.path` entry
+    for matching `.dist-info`/`.egg-info` directories, as
+    `importlib.metadata` does. Each directory on `sys.path` is scanned
+    once and its contents cached until the directory's modification
+    time changes (i.e., a distribution is installed into, upgraded in,
+    or removed from it). The combined index is rebuilt from those
+    per-directory caches only when `sys.path` or one of its
+    directories changes.
+
+    While a project is active, its site-packages directory is indexed
+    before the directories on `sys.path` (see
+    `davos.core.finder.ProjectFinder.search_path()`). As with
+    `importlib.metadata`, if multiple versions of a distribution are
+    found, the one in the directory searched first is used.
+
+    Notes
+    -----
+    Only `sys.path` entries that are directories are indexed, so
+    distributions inside zip files on the module search path are not
+    found.
+    """
+
+    def __init__(self):
+        # {dirpath: (mtime, {normalized_name: (version, dist_path)})}
+        self._dir_cache = {}
+        # (sys.path entries and their mtimes) when index was last built
+        self._index_key = None
+        # {normalized_name: (version, dist_path)}
+        self._index = {}
+
+    def _refresh(self):
+        """Rebuild the index if sys.path or its directories changed."""
+        path_mtimes = []
+        for entry in project_finder.search_path():
+            # empty string denotes the current working directory
+            entry = entry or os.getcwd()
+            try:
+                path_mtimes.append((entry, os.stat(entry).st_mtime_ns))
+            except OSError:
+                # sys.path entry doesn't exist
+                continue
+        index_key = tuple(path_mtimes)
+        if index_key == self._index_key:
+            return
+
+        index = {}
+        for entry, mtime in reversed(path_mtimes):
+            # entries earlier in sys.path take precedence, so add them
+            # last
+            index.update(self._scan_dir(entry, mtime))
+        self._index = index
+        self._index_key = index_key
+
+    def _scan_dir(self, dirpath, mtime):
+        """
+        Get the distributions installed in a single directory.
+
+        Parameters
+        ----------
+        dirpath : str
+            A directory on `sys.path`.
+        mtime : int
+            The directory's modification time (in nanoseconds).
+
+        Returns
+        -------
+        dict
+            Mapping of normalized distribution names to (version, path)
+            tuples. Version is `None` for distributions whose version
+            can't be determined from their metadata directory's name.
+        """
+        try:
+            cached_mtime, dists = self._dir_cache[dirpath]
+        except KeyError:
+            pass
+        else:
+            if cached_mtime == mtime:
+                return dists
+
+        dists = {}
+        try:
+            with os.scandir(dirpath) as dir_entries:
+                for dir_entry in dir_entries:
+                    stem, ext = os.path.splitext(dir_entry.name)
+                    if ext == '.dist-info':
+                        # {name}-{version}.dist-info (name is escaped so
+                        # it can't contain "-")
+                        name, _, version = stem.partition('-')
+                    elif ext == '.egg-info':
+                        # may or may not include version & Python tag
+                        name, version = stem.partition('-')[0], None
+                    else:
+                        continue
+                    dists.setdefault(canonicalize_name(name),
+                                     (version or None, dir_entry.path))
+        except OSError:
+            # e.g., zip file on sys.path
+            pass
+        self._dir_cache[dirpath] = (mtime, dists)
+        return dists
+
+    def distribution(self, name):
+        """
+        Get the installed distribution for a distribution name.
+
+        Parameters
+        ----------
+        name : str
+            The distribution name (normalized or not).
+
+        Returns
+        -------
+        importlib.metadata.Distribution
+            The distribution's metadata.
+
+        Raises
+        ------
+        importlib.metadata.PackageNotFoundError
+            If no distribution with the given name is installed.
+        """
+        self._refresh()
+        try:
+            _, dist_path = self._index[canonicalize_name(name)]
+        except KeyError:
+            raise metadata.PackageNotFoundError(name) from None
+        return metadata.PathDistribution(Path(dist_path))
+
+    def version(self, name):
+        """
+        Get the installed version of a distribution.
+
+        Parameters
+        ----------
+        name : str
+            The distribution name (normalized or not).
+
+        Returns
+        -------
+        str
+            The distribution's version.
+
+        Raises
+        ------
+        importlib.metadata.PackageNotFoundError
+            If no distribution with the given name is installed.
+        """
+        self._refresh()
+        normalized_name = canonicalize_name(name)
+        try:
+            version, dist_path = self._index[normalized_name]
+        except KeyError:
+            raise metadata.PackageNotFoundError(name) from None
+        if version is None:
+            # read (and store) version from the distribution's metadata
+            version = metadata.PathDistribution(Path(dist_path)).version
+            self._index[normalized_name] = (version, dist_path)
+        return version
+
+
+distribution_index = DistributionIndex()
+
+
+def environment_key():
+    """
+    Identify the environment into which packages are installed.
+
+    Returns
+    -------
+    str
+        A key made up of the Python interpreter, the `pip` executable,
+        and the active project's directory (if any).
+    """
+    project = config._project
+    project_dir = '' if project is None else str(project.project_dir)
+    return f'{sys.executable};{config._pip_executable};{project_dir}'
+
+
+def get_install_log_path():
+    """
+    Get the path to the log file for installer output.
+
+    When `davos.max_output_size` is set, the full output of each install
+    command is appended to this file rather than displayed.
+
+    Returns
+    -------
+    pathlib.Path
+        `install.log` in the active project's directory, or in
+        `DAVOS_CONFIG_DIR` if no project is active.
+    """
+    if config._project is not None:
+        return config._project.project_dir.joinpath('install.log')
+    # imported here to avoid a circular import
+    from davos.core.project import DAVOS_CONFIG_DIR
+    return DAVOS_CONFIG_DIR.joinpath('install.log')
 
 
 def get_previously_imported_pkgs(install_cmd_stdout, installer):
@@ -209,14 +2383,17 @@ def get_previously_imported_pkgs(install_cmd_stdout, installer):
     ----------
     install_cmd_stdout : str
         Captured stdout generated by the smuggled package's installation
-    installer : {'pip', 'conda'}
-        The name of the program that generated the output to be parsed
+    installer : {'pip', 'uv', 'conda'}
+        The name of the program (installer backend) that generated the
+        output to be parsed
 
     Returns
     -------
     list of str
         Names of packages installed/upgraded when installed the smuggled
-        package that were previously imported by the current interpreter
+        package that were previously imported by the current interpreter,
+        ordered so that each package comes after the packages its
+        distribution depends on
 
     See Also
     --------
@@ -230,50 +2407,15 @@ def get_previously_imported_pkgs(install_cmd_stdout, installer):
       has some minor tweaks that make it more efficient, but is mostly
       meant to be available when `colabtools` may not be installed
       (i.e., outside of Colaboratory).
-    - There's an edge case neither this nor `colabtools`'s version
-      handles: if the user passes -q/--quiet 3x to the pip-install
-      command, there will be no stdout to parse.
+    - There's an edge case `colabtools`'s version doesn't handle: if
+      the user passes -q/--quiet 3x to the pip-install command, there
+      will be no stdout to parse. With `pip>=22.2`, installed
+      distributions are instead read from the JSON report attached to
+      `install_cmd_stdout` (see `installers.attach_report()`), which is
+      unaffected by `pip`'s verbosity.
     """
-    if installer == 'conda':
-        raise NotImplementedError(
-            "conda-install stdout parsing is not yet implemented"
-        )
-    installed_pkg_regex = pip_installed_pkgs_regex
-
-    matches = installed_pkg_regex.findall(install_cmd_stdout)
-    if len(matches) == 0:
-        return []
-
-    # flatten and split matches to separate packages
-    matches_iter = itertools.chain(*(map(str.split, matches)))
-    prev_imported_pkgs = []
-    # install command's stdout contains install names (e.g.,
-    # scikit-learn), but we need import names (e.g., sklearn).
-    for dist_name in matches_iter:
-        # get the install name without the version
-        pkg_name = dist_name.rsplit('-', maxsplit=1)[0]
-        # use the install name to get the package distribution object
-        dist = metadata.distribution(pkg_name)
-        # check the distribution's metadata for a file containing
-        # top-level import names. Also includes names of namespace
-        # packages (e.g. mpl_toolkits from matplotlib), if any.
-        toplevel_names = dist.read_text('top_level.txt')
-        if toplevel_names is None:
-            # importlib.metadata.PathDistribution.read_text() suppresses
-            # FileNotFoundError (also IsADirectoryError, KeyError,
-            # NotADirectoryError, and PermissionError), so if
-            # toplevel_names is None, top_level.txt doesn't exist and
-            # the import name is the install name
-            toplevel_names = (pkg_name,)
-        else:
-            # file contains one name per line (with trailing newline)
-            toplevel_names = toplevel_names.split()
-
-        for name in toplevel_names:
-            if name in sys.modules:
-                prev_imported_pkgs.append(name)
-
-    return prev_imported_pkgs
+    prev_imported = _previously_imported_dists(install_cmd_stdout, installer)
+    return [name for name, _ in prev_imported]
 
 
 @contextmanager
@@ -313,22 +2455,22 @@ def handle_alternate_pip_executable(installed_name):
     # but since this runs only if non-default pip_executable is set,
     # it's worth the extra run time to check the safer way in order to
     # handle various edge cases (e.g., installing from VCS, etc.)
-    pip_show_cmd = f'{config._pip_executable} show {dist_name}'
+    backend = get_backend()
     try:
-        pip_show_stdout = run_shell_command(pip_show_cmd, live_stdout=False)
-        location_line = next(
-            l for l in pip_show_stdout.strip().splitlines()
-            if l.startswith('Location')
-        )
-    except (CalledProcessError, StopIteration) as e:
+        show_stdout = run_shell_command(backend.show_cmd(dist_name),
+                                        live_stdout=False)
+    except CalledProcessError:
+        install_location = None
+    else:
+        install_location = backend.parse_show_location(show_stdout)
+    if install_location is None:
         msg = (
             "Unable to locate package installed installed with non-default "
             f"'pip' executable: {dist_name}. Package has been successfully "
             "installed but not loaded."
         )
-        raise SmugglerError(msg) from e
+        raise SmugglerError(msg)
 
-    install_location = location_line.split(': ', maxsplit=1)[1].strip()
     sys.path.insert(0, install_location)
     try:
         yield
@@ -382,6 +2524,236 @@ def import_name(name):
     return __import__(parts[0])
 
 
+def install_onions(onions):
+    """
+    Install multiple smuggled packages with a single installer command.
+
+    Combining packages into a single `pip install` command means the
+    installer starts up and resolves dependencies only once, rather than
+    once per package, which is substantially faster when a notebook
+    smuggles many packages that aren't installed locally.
+
+    Parameters
+    ----------
+    onions : list of Onion
+        The `Onion`s for the packages to be installed. Each must be
+        installable alongside the others (i.e., `onion.is_batchable`
+        must be `True`).
+
+    Returns
+    -------
+    str
+        The stdout generated by the installer command.
+
+    Raises
+    ------
+    InstallerError
+        If the installer command returns a non-zero exit status.
+
+    See Also
+    --------
+    batch_install_cmd : Formats the installer command.
+    Onion.is_batchable : Whether an Onion can be installed in a batch.
+    """
+    try:
+        return run_shell_command(batch_install_cmd(onions))
+    except CalledProcessError as e:
+        raise InstallerError.from_error(e)
+
+
+class LazyModuleProxy:
+    """
+    Placeholder for a smuggled object whose package is being installed.
+
+    When `davos.background_install` is enabled, a `smuggle` statement
+    that needs to install its package starts the installation in a
+    background thread and binds one of these in the namespace in place
+    of the smuggled object, so the notebook (or script) can continue
+    running while the package installs. The first time the proxy is
+    used (e.g., one of its attributes is accessed, it's called, or it's
+    used as an operand, container, or context manager), it waits for
+    the installation to finish, loads the smuggled object, and replaces
+    itself with that object in the namespace. Any other references to
+    the proxy forward attribute access, special methods, and
+    `isinstance()` checks to the real object. Only `type()` and
+    identity (`is`) comparisons can distinguish the proxy from the
+    object it stands in for.
+
+    Errors raised by the installation (or when loading the object) are
+    raised the first time the proxy is used.
+    """
+
+    def __init__(self, name, onion, install_future, no_input=False):
+        """
+        Parameters
+        ----------
+        name : str
+            The qualified name of the smuggled object.
+        onion : Onion
+            The `Onion` for the package being installed.
+        install_future : concurrent.futures.Future
+            The background installation (see
+            `_install_in_background()`).
+        no_input : bool, optional
+            Whether the user passed `--no-input` to the installer via an
+            onion comment (default: `False`).
+        """
+        # bypass __setattr__, which forwards to the smuggled object
+        object.__setattr__(self, '_davos_state', {
+            'name': name,
+            'onion': onion,
+            'future': install_future,
+            'no_input': no_input,
+            'project': config._project,
+            'bindings': [],
+            'lock': threading.Lock()
+        })
+
+    # special methods are looked up on the type, so they must be
+    # forwarded explicitly rather than through __getattr__
+    __abs__ = _proxy_method(operator.abs)
+    __add__ = _proxy_method(operator.add)
+    __and__ = _proxy_method(operator.and_)
+    __bool__ = _proxy_method(bool)
+    __bytes__ = _proxy_method(bytes)
+    __complex__ = _proxy_method(complex)
+    __contains__ = _proxy_method(operator.contains)
+    __delitem__ = _proxy_method(operator.delitem)
+    __enter__ = _proxy_method(operator.methodcaller('__enter__'))
+    __eq__ = _proxy_method(operator.eq)
+    __exit__ = _proxy_method(lambda obj, *exc_info: obj.__exit__(*exc_info))
+    __float__ = _proxy_method(float)
+    __floordiv__ = _proxy_method(operator.floordiv)
+    __format__ = _proxy_method(format)
+    __fspath__ = _proxy_method(os.fspath)
+    __ge__ = _proxy_method(operator.ge)
+    __getitem__ = _proxy_method(operator.getitem)
+    __gt__ = _proxy_method(operator.gt)
+    __hash__ = _proxy_method(hash)
+    __index__ = _proxy_method(operator.index)
+    __instancecheck__ = _proxy_method(isinstance, reflected=True)
+    __int__ = _proxy_method(int)
+    __invert__ = _proxy_method(operator.invert)
+    __iter__ = _proxy_method(iter)
+    __le__ = _proxy_method(operator.le)
+    __len__ = _proxy_method(len)
+    __lshift__ = _proxy_method(operator.lshift)
+    __lt__ = _proxy_method(operator.lt)
+    __matmul__ = _proxy_method(operator.matmul)
+    __mod__ = _proxy_method(operator.mod)
+    __mul__ = _proxy_method(operator.mul)
+    __ne__ = _proxy_method(operator.ne)
+    __neg__ = _proxy_method(operator.neg)
+    __next__ = _proxy_method(next)
+    __or__ = _proxy_method(operator.or_)
+    __pos__ = _proxy_method(operator.pos)
+    __pow__ = _proxy_method(pow)
+    __radd__ = _proxy_method(operator.add, reflected=True)
+    __rand__ = _proxy_method(operator.and_, reflected=True)
+    __reversed__ = _proxy_method(reversed)
+    __rfloordiv__ = _proxy_method(operator.floordiv, reflected=True)
+    __rlshift__ = _proxy_method(operator.lshift, reflected=True)
+    __rmatmul__ = _proxy_method(operator.matmul, reflected=True)
+    __rmod__ = _proxy_method(operator.mod, reflected=True)
+    __rmul__ = _proxy_method(operator.mul, reflected=True)
+    __ror__ = _proxy_method(operator.or_, reflected=True)
+    __round__ = _proxy_method(round)
+    __rpow__ = _proxy_method(pow, reflected=True)
+    __rrshift__ = _proxy_method(operator.rshift, reflected=True)
+    __rshift__ = _proxy_method(operator.rshift)
+    __rsub__ = _proxy_method(operator.sub, reflected=True)
+    __rtruediv__ = _proxy_method(operator.truediv, reflected=True)
+    __rxor__ = _proxy_method(operator.xor, reflected=True)
+    __setitem__ = _proxy_method(operator.setitem)
+    __str__ = _proxy_method(str)
+    __sub__ = _proxy_method(operator.sub)
+    __subclasscheck__ = _proxy_method(issubclass, reflected=True)
+    __truediv__ = _proxy_method(operator.truediv)
+    __xor__ = _proxy_method(operator.xor)
+
+    def __call__(self, *args, **kwargs):
+        return self._davos_resolve()(*args, **kwargs)
+
+    @property
+    def __class__(self):
+        # makes isinstance(proxy, cls) check the smuggled object's type
+        return type(self._davos_resolve())
+
+    def __delattr__(self, name):
+        delattr(self._davos_resolve(), name)
+
+    def __dir__(self):
+        return dir(self._davos_resolve())
+
+    def __getattr__(self, name):
+        return getattr(self._davos_resolve(), name)
+
+    def __mro_entries__(self, _bases):
+        # allows a smuggled class's proxy to be used as a base class
+        return (self._davos_resolve(),)
+
+    def __repr__(self):
+        state = self._davos_state
+        if 'obj' in state:
+            return repr(state['obj'])
+        status = 'installed' if state['future'].done() else 'installing'
+        return f"<{type(self).__name__} for {state['name']!r} ({status})>"
+
+    def __setattr__(self, name, value):
+        setattr(self._davos_resolve(), name, value)
+
+    def _davos_bind(self, namespace, binding):
+        """
+        Record a name the proxy is bound to in a namespace.
+
+        Parameters
+        ----------
+        namespace : dict
+            The namespace (e.g., the notebook's global namespace).
+        binding : str
+            The name to which the proxy is bound.
+        """
+        self._davos_state['bindings'].append((namespace, binding))
+
+    def _davos_resolve(self):
+        """
+        Wait for the installation to finish and load the smuggled
+        object.
+
+        Returns
+        -------
+        object
+            The smuggled object.
+
+        Raises
+        ------
+        InstallerError
+            If the install command returned a non-zero exit status.
+        """
+        state = self._davos_state
+        with state['lock']:
+            if 'obj' in state:
+                return state['obj']
+            onion = state['onion']
+            try:
+                installer_stdout = state['future'].result()
+            except CalledProcessError as e:
+                # output wasn't displayed while the command was running
+                raise InstallerError.from_error(e, show_output=True) from None
+            if not config._suppress_stdout:
+                sys.stdout.write(installer_stdout)
+            # load the package from the project it was installed into
+            with _project_on_path(state['project']):
+                obj = _finish_install(state['name'], onion, installer_stdout,
+                                      state['no_input'])
+            state['obj'] = obj
+            for namespace, binding in state['bindings']:
+                if namespace.get(binding) is self:
+                    namespace[binding] = obj
+            config._smuggled[onion.import_name] = onion.cache_key
+            return obj
+
+
 class Onion:
     """
     Class representing a single package to be smuggled.
@@ -426,7 +2798,12 @@ class Onion:
         # regex parsing to identify onion comments already ensures the
         # comment will start with "<installer>:"
         if installer == 'pip':
-            parser = pip_parser
+            args = args_str.split()
+            # skip the (relatively slow) full argument parser for onion
+            # comments consisting of only a requirement specifier
+            installer_kwargs = parse_pip_spec_only(args)
+            if installer_kwargs is None:
+                installer_kwargs = vars(pip_parser.parse_args(args))
         elif installer == 'conda':
             msg = "smuggling packages via conda is not yet supported"
             raise ParserNotImplementedError(
@@ -439,7 +2816,6 @@ class Onion:
             msg = ("An unexpected error occurred while trying to parse onion "
                    f"comment: {onion_text}")
             raise OnionParserError(msg, target_text=onion_text)
-        installer_kwargs = vars(parser.parse_args(args_str.split()))
         # arg_str could potentially have both single and double quotes
         # in it, so triple quote to be safe
         return f'"{installer}"', f'"""{args_str}"""', installer_kwargs
@@ -477,6 +2853,11 @@ class Onion:
             )
         self.args_str = args_str
         self.cache_key = f"{installer};{';'.join(args_str.split())}"
+        # set to an InstallPlan when the package's dependencies have
+        # been resolved ahead of time (see `davos.plan_installs`)
+        self.plan = None
+        # key under which the plan is cached (see `PlanCache.discard()`)
+        self.plan_key = None
         if args_str == '':
             # bare smuggle statement without onion comment
             self.is_editable = False
@@ -571,23 +2952,41 @@ class Onion:
                 self.install_name = full_spec
                 self.version_spec = ''
 
+    @property
+    def backend(self):
+        """The installer backend used to install the package"""
+        return select_backend(self)
+
     @property
     def install_cmd(self):
         """The shell command run to install the package as specified"""
-        if self.args_str == '':
+        if self.plan is not None:
+            # install exactly the planned distributions, without
+            # resolving dependencies again
+            args = f"--no-deps {' '.join(self.plan.requirements())}"
+        elif self.args_str == '':
             args = self.install_name
         else:
-            args = self.args_str.replace("<", "'<'").replace(">", "'>'")
+            args = self.args_str
         if self.installer == 'pip':
-            install_exe = config._pip_executable
-            if config.noninteractive:
-                args = f'{args} --no-input'
-            if config.project is not None:
-                install_exe = f'PYTHONUSERBASE="{config.project.project_dir}" {install_exe}'
-                args = f'--no-warn-script-location --user {args}'
-        else:
-            install_exe = self.installer
-        return f'{install_exe} install {args}'
+            return self.backend.install_cmd(args)
+        return f'{self.installer} install {args}'
+
+    @property
+    def is_batchable(self):
+        """
+        True if the package can be installed in the same command as
+        other packages; otherwise, False
+        """
+        # only plain requirement specifiers (with no additional
+        # installer options, which would apply to all packages in the
+        # command) can be combined
+        return (
+            self.installer == 'pip' and
+            not self.is_editable and
+            not self.installer_kwargs and
+            self.verbosity == 0
+        )
 
     @property
     def is_installed(self):
@@ -609,10 +3008,15 @@ class Onion:
             # the current interpreter session/notebook runtime (i.e.,
             # a line is just being rerun with no change)
             return True
+        if satisfied_cache.contains(self):
+            # the same package was found to be installed in the same
+            # environment in a previous interpreter session, and nothing
+            # has been installed or removed since
+            return True
         if '/' not in self.install_name:
             # onion comment does not specify a VCS URL
             try:
-                installed_version = metadata.version(self.install_name)
+                local_version = distribution_index.version(self.install_name)
             except metadata.PackageNotFoundError:
                 # smuggled name could be a non-distribution name from a
                 # namespace package (e.g., mpl_toolkits from matplotlib,
@@ -652,7 +3056,7 @@ class Onion:
                 return False
             if (
                     not self.version_spec or
-                    installed_version in SpecifierSet(self.version_spec)
+                    local_version in SpecifierSet(self.version_spec)
             ):
                 # include explicit `not self.version_spec` condition
                 # because `x in SpecifierSet("")` evaluates to False for
@@ -670,9 +3074,14 @@ class Onion:
         )
 
     def _pip_install_package(self):
+        _snapshot_record_hashes([self])
         try:
             stdout = run_shell_command(self.install_cmd)
         except CalledProcessError as e:
+            if self.plan is not None:
+                # the plan may be outdated (e.g., a planned version was
+                # yanked), so resolve it again next time
+                plan_cache.discard(self)
             raise InstallerError.from_error(e)
         # handle packages installed in non-standard locations
         install_dir = self.installer_kwargs.get('target')
@@ -700,6 +3109,85 @@ class Onion:
         return stdout
 
 
+def cache_parsed_lines(parse_func):
+    """
+    Cache the output of the line parser, keyed by the input line.
+
+    Decorator that wraps the `parse_line` function with a bounded,
+    least-recently-used cache whose size is given by
+    `davos.parse_cache_size`. When a cell is rerun without changes, its
+    lines' transformed output is returned directly rather than
+    re-matching the `smuggle` statement regex and re-parsing onion
+    comments. Any packages recorded for batched installation (see
+    `davos.batch_install`) when a line was first parsed are recorded
+    again on subsequent cache hits. The cache is emptied whenever the
+    onion comment parser (`pip_parser`) or `davos.project` changes.
+
+    Parameters
+    ----------
+    parse_func : function
+        The line parser function, `davos.core.core.parse_line`.
+
+    Returns
+    -------
+    function
+        The wrapped line parser function. The wrapper has two
+        additional attributes: `cache_info()`, which returns a named
+        tuple of the cache's hits, misses, maximum size, and current
+        size, and `cache_clear()`, which empties the cache and resets
+        its statistics.
+    """
+    hits = misses = 0
+    # the onion comment parser whose output is currently cached
+    cached_parser = None
+
+    @functools.wraps(parse_func)
+    def parse_wrapper(line):
+        nonlocal hits, misses, cached_parser
+        if not config.parse_cache_size:
+            return parse_func(line)
+        cache = config._parse_cache
+        if cached_parser is not pip_parser:
+            # onion parser was replaced; cached output may be stale
+            cache.clear()
+            cached_parser = pip_parser
+        # the same line yields different side effects depending on
+        # whether packages are being queued for batched installation
+        cache_key = (line, config.batch_install)
+        try:
+            parsed_line, queued = cache[cache_key]
+        except KeyError:
+            misses += 1
+            queue_start = len(config._batch_queue)
+            parsed_line = parse_func(line)
+            queued = tuple(config._batch_queue[queue_start:])
+            cache[cache_key] = (parsed_line, queued)
+            if len(cache) > config.parse_cache_size:
+                cache.popitem(last=False)
+        else:
+            hits += 1
+            cache.move_to_end(cache_key)
+            config._batch_queue.extend(
+                (name, installer, args_str, dict(installer_kwargs))
+                for name, installer, args_str, installer_kwargs in queued
+            )
+        return parsed_line
+
+    def cache_info():
+        return _ParseCacheInfo(hits, misses, config.parse_cache_size,
+                               len(config._parse_cache))
+
+    def cache_clear():
+        nonlocal hits, misses
+        config._parse_cache.clear()
+        hits = misses = 0
+
+    parse_wrapper.cache_info = cache_info
+    parse_wrapper.cache_clear = cache_clear
+    return parse_wrapper
+
+
+@cache_parsed_lines
 def parse_line(line):
     """
     Parse a single line of code, transforming `smuggle` statements.
@@ -721,8 +3209,8 @@ def parse_line(line):
 
     See Also
     --------
-    regexps.smuggle_statement_regex :
-        Regexp for `smuggle` statements.
+    regexps.smuggle_statement_scanner :
+        Linear-time matcher for `smuggle` statements.
     implementations.ipython_pre7.generate_parser_func :
         Generates full parser wrapper function for `IPython<7.0`.
     implementations.ipython_post7.generate_parser_func :
@@ -736,9 +3224,9 @@ def parse_line(line):
     assembled from multiple physical lines before being passed to
     `parse_line()`. This function is wrapped by an implementation-
     specific parser function and called for each (logical) line to be
-    parsed.
+    parsed. Transformed lines are cached (see `cache_parsed_lines()`).
     """
-    match = smuggle_statement_regex.match(line)
+    match = smuggle_statement_scanner.match(line)
     if match is None:
         return line
 
@@ -772,6 +3260,10 @@ def parse_line(line):
         qualname_prefix = ''
 
     kwargs_str = ''
+    queue_args = ('pip', '', {})
+    # position at which to record this statement's packages, so they
+    # precede those from any subsequent semicolon-separated statements
+    queue_pos = len(config._batch_queue)
     if has_semicolon_sep:
         after_chars = '; ' + parse_line(after_chars.lstrip('; '))
     elif onion_chars is not None:
@@ -785,6 +3277,8 @@ def parse_line(line):
         kwargs_str = (f', installer={installer}, '
                       f'args_str={args_str}, '
                       f'installer_kwargs={installer_kwargs}')
+        # strip quotes added for code generation
+        queue_args = (installer[1:-1], args_str[3:-3], installer_kwargs)
 
     smuggle_funcs = []
     names_aliases = to_smuggle.split(',')
@@ -799,11 +3293,108 @@ def parse_line(line):
 
         name = name.replace(' ', '')
         smuggle_funcs.append(f'smuggle(name={name}, as_={alias})')
+        if config.batch_install:
+            # record the package so it can be installed along with the
+            # rest of the cell's packages by the first smuggle() call.
+            # Onion arguments apply only to the first name smuggled
+            installer, args_str, installer_kwargs = queue_args
+            config._batch_queue.insert(
+                queue_pos,
+                (name[1:-1], installer, args_str, dict(installer_kwargs))
+            )
+            queue_pos += 1
+            queue_args = ('pip', '', {})
 
     smuggle_funcs[0] = smuggle_funcs[0][:-1] + kwargs_str + ')'
     return before_chars + '; '.join(smuggle_funcs) + after_chars
 
 
+def prefetch(notebook_path):
+    """
+    Install all packages a notebook smuggles before running it.
+
+    Reads the notebook file and parses each of its code cells (without
+    executing them) to collect the packages from all of its `smuggle`
+    statements and onion comments. All of those that aren't already
+    available locally are then installed with a single `pip install`
+    command (see `install_onions()`), into the active project's
+    directory if one is in use. Subsequently running the notebook
+    therefore requires no further installation.
+
+    Packages whose onion comments pass additional installer options
+    (see `Onion.is_batchable`) are skipped, as are packages that appear
+    in multiple `smuggle` statements after their first occurrence and
+    those whose onion comments are invalid. These are installed (or
+    raise errors) when their `smuggle` statements are executed, as
+    usual.
+
+    Parameters
+    ----------
+    notebook_path : str or pathlib.Path
+        Path to the Jupyter notebook (`.ipynb`) file.
+
+    Raises
+    ------
+    SmugglerError
+        If `davos.confirm_install` is `True` and the user declines to
+        install the packages.
+    InstallerError
+        If the installer command returns a non-zero exit status.
+
+    See Also
+    --------
+    davos.batch_install :
+        Install all packages smuggled in a cell at once.
+
+    Notes
+    -----
+    Because the notebook is parsed as plain text, packages from *all*
+    `smuggle` statements are installed, including any that would not
+    ultimately be executed (e.g., those inside an `if` block whose
+    condition is not met). Cells run with an IPython cell magic (e.g.,
+    `%%bash`) are skipped.
+    """
+    # assemble logical lines the same way the `IPython>=7.0` davos
+    # parser does (see `implementations.ipython_post7`)
+    from IPython.core.inputtransformer import assemble_python_lines
+
+    notebook = json.loads(Path(notebook_path).read_text(encoding='utf-8'))
+    pyline_assembler = assemble_python_lines()
+    # use the batched installation machinery to record each smuggled
+    # package as it's parsed, preserving the current cell's queue (if
+    # any) so its first smuggle() call still processes it
+    orig_batch_install = config.batch_install
+    orig_batch_queue = config._batch_queue
+    config.batch_install = True
+    config._batch_queue = []
+    try:
+        for cell in notebook['cells']:
+            if cell['cell_type'] != 'code':
+                continue
+            source = cell['source']
+            if not isinstance(source, str):
+                source = ''.join(source)
+            if 'smuggle ' not in source or source.startswith('%%'):
+                continue
+            for raw_line in source.splitlines():
+                python_line = pyline_assembler.push(raw_line)
+                if python_line is not None and 'smuggle ' in python_line:
+                    try:
+                        parse_line(python_line)
+                    except DavosError:
+                        # invalid onion comment (or unsupported
+                        # installer) -- leave it for the smuggle
+                        # statement to raise when it's run
+                        continue
+            pyline_assembler.reset()
+        # installation must happen with the project active so
+        # packages installed in it are detected
+        use_project(_install_batch_queue)()
+    finally:
+        config.batch_install = orig_batch_install
+        config._batch_queue = orig_batch_queue
+
+
 def prompt_input(prompt, default=None, interrupt=None):
     """
     Prompt the user for [y]es/[n]o input, return a boolean accordingly.
@@ -884,7 +3475,9 @@ def run_shell_command(command, live_stdout=None):
         Whether to display streaming stdout from `command` execution in
         real time *in addition to* capturing and returning it. If `None`
         (default), behavior is determined by the current value of
-        `davos.suppress_stdout`.
+        `davos.suppress_stdout`, or if `davos.max_output_size` is set,
+        only a summary is displayed and only the end of the output is
+        captured (see `_run_shell_command_bounded()`).
 
     Returns
     -------
@@ -906,6 +3499,9 @@ def run_shell_command(command, live_stdout=None):
     implementations.python._run_shell_command_helper :
         Helper function to run shell command in "pure"
         (non-interactive) Python environments
+    pip_worker.run_in_pip_worker :
+        Runs `pip` commands in a persistent worker process, if
+        `davos.pip_worker` is enabled
 
     Notes
     -----
@@ -916,25 +3512,200 @@ def run_shell_command(command, live_stdout=None):
     if command.rstrip().endswith('&'):
         raise OSError("Background processes are not supported.")
 
-    if live_stdout is None:
-        live_stdout = not config.suppress_stdout
-    if live_stdout:
-        command_context = capture_stdout
-    else:
-        command_context = redirect_stdout
+    with pip_report(command) as (report_command, report_path):
+        if live_stdout is None:
+            if config.max_output_size:
+                # keep memory use and displayed output bounded
+                stdout = _run_shell_command_bounded(report_command)
+                return attach_report(stdout, report_path)
+            live_stdout = not config.suppress_stdout
+        if live_stdout:
+            command_context = capture_stdout
+        else:
+            command_context = redirect_stdout
 
-    with command_context(StringIO()) as stdout:
-        try:
-            _run_shell_command_helper(command)
-        except CalledProcessError as e:
-            # if the exception doesn't record the output, add it
-            # manually before raising
+        with command_context(StringIO()) as stdout:
+            try:
+                if not (
+                        config.pip_worker and
+                        run_in_pip_worker(report_command)
+                ):
+                    _run_shell_command_helper(report_command)
+            except CalledProcessError as e:
+                # if the exception doesn't record the output, add it
+                # manually before raising
+                stdout = stdout.getvalue()
+                if e.output is None and stdout != '':
+                    e.output = stdout
+                raise e
             stdout = stdout.getvalue()
-            if e.output is None and stdout != '':
-                e.output = stdout
-            raise e
-        stdout = stdout.getvalue()
-    return stdout
+        return attach_report(stdout, report_path)
+
+
+class SatisfiedCache:
+    """
+    Persistent record of smuggled packages found to be installed.
+
+    `davos.config.smuggled` lets rerunning a `smuggle` statement skip
+    searching the local environment for the package, but only within a
+    single interpreter session. This cache persists the same
+    information across sessions (in `DAVOS_CONFIG_DIR`), so that a
+    freshly started kernel can resolve a notebook's `smuggle`
+    statements without reading any package metadata, as long as
+    nothing has been installed or removed since.
+
+    Records are grouped by context: the Python interpreter, the `pip`
+    executable, and the active project (if any). Each context's records
+    are stored along with the modification times of the directories on
+    `sys.path` (and the active project's site-packages directory) when
+    they were made. Installing, upgrading, or removing
+    a distribution changes the modification time of the directory it's
+    in, so if any of those differ from the current values, all of the
+    context's records are discarded.
+
+    Notes
+    -----
+    The current working directory is excluded from the modification
+    time check, since in notebook environments, it typically changes
+    every time the notebook is saved.
+    """
+
+    def __init__(self):
+        # {context_key: {'mtimes': {dirpath: mtime}, 'satisfied': [key]}}
+        # loaded from the cache file on first access
+        self._records = None
+
+    @property
+    def cache_path(self):
+        """Path to the file where the cache is stored"""
+        # imported here to avoid a circular import
+        from davos.core.project import DAVOS_CONFIG_DIR
+        return DAVOS_CONFIG_DIR.joinpath('satisfied-cache.json')
+
+    @staticmethod
+    def _onion_key(onion):
+        # Onion.cache_key alone doesn't identify the package for bare
+        # smuggle statements without onion comments
+        return f'{onion.import_name};{onion.cache_key}'
+
+    def _load(self):
+        try:
+            with self.cache_path.open(encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            # cache file doesn't exist yet or is corrupted
+            records = {}
+        if not isinstance(records, dict):
+            records = {}
+        self._records = records
+        return records
+
+    def add(self, onion):
+        """
+        Record that a package is installed in the current context.
+
+        Parameters
+        ----------
+        onion : Onion
+            The `Onion` for the package's `smuggle` statement, which
+            was found to be installed.
+        """
+        if onion.import_name in config._stdlib_modules:
+            return
+        if self.contains(onion):
+            return
+        onion_key = self._onion_key(onion)
+        context_key = environment_key()
+        path_mtimes = search_path_mtimes()
+        # re-read the cache file so records added by other sessions
+        # since it was loaded aren't overwritten
+        records = self._load()
+        record = records.get(context_key)
+        if (
+                not isinstance(record, dict) or
+                record.get('mtimes') != path_mtimes or
+                not isinstance(record.get('satisfied'), list)
+        ):
+            record = {'mtimes': path_mtimes, 'satisfied': []}
+            records[context_key] = record
+        elif onion_key in record['satisfied']:
+            return
+        record['satisfied'].append(onion_key)
+        cache_path = self.cache_path
+        try:
+            write_atomic(cache_path, json.dumps(records))
+        except OSError:
+            # caching is an optimization; don't fail the smuggle
+            pass
+
+    def clear(self):
+        """Remove all records from the cache."""
+        self._records = {}
+        try:
+            self.cache_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def contains(self, onion):
+        """
+        Check whether a package was recorded as installed.
+
+        Parameters
+        ----------
+        onion : Onion
+            The `Onion` for the package's `smuggle` statement.
+
+        Returns
+        -------
+        bool
+            `True` if the package was previously found to be installed
+            in the current context and no distributions have been
+            installed or removed since. Otherwise, `False`.
+        """
+        records = self._records
+        if records is None:
+            records = self._load()
+        record = records.get(environment_key())
+        if not isinstance(record, dict):
+            return False
+        return (
+            self._onion_key(onion) in record.get('satisfied', ()) and
+            record.get('mtimes') == search_path_mtimes()
+        )
+
+
+satisfied_cache = SatisfiedCache()
+
+
+def search_path_mtimes():
+    """
+    Get the modification times of the directories on the search path.
+
+    Installing, upgrading, or removing a distribution changes the
+    modification time of the directory it's installed in, so caches of
+    information about the installed distributions can be invalidated by
+    comparing these.
+
+    Returns
+    -------
+    dict of {str: int}
+        The modification times (in nanoseconds) of the existing
+        directories on `sys.path` and the active project's
+        site-packages directory, other than the current working
+        directory (which, in notebook environments, typically changes
+        every time the notebook is saved).
+    """
+    cwd = os.getcwd()
+    mtimes = {}
+    for entry in project_finder.search_path():
+        if not entry or entry == cwd:
+            continue
+        try:
+            mtimes[entry] = os.stat(entry).st_mtime_ns
+        except OSError:
+            # sys.path entry doesn't exist
+            continue
+    return mtimes
 
 
 def use_project(smuggle_func):
@@ -958,35 +3729,7 @@ def use_project(smuggle_func):
     """
     @functools.wraps(smuggle_func)
     def smuggle_wrapper(*args, **kwargs):
-        project = config.project
-        if project is not None:
-            # prepend the project's site-packages directory to sys.path
-            # so project's package versions are prioritized for import
-            # over versions in "regular" environment
-            sys.path.insert(0, str(project.site_packages_dir))
-            # invalidate sys.meta_path finder caches so the global
-            # working set is regenerated based on the updated sys.path.
-            # Note: after pretty extensive spot checking, I haven't
-            # managed found a case where this is actually since
-            # migrating to importlib.metadata instead of pkg_resources,
-            # but the docs recommend it and the overhead is extremely
-            # minor, so probably worth including in case the user or
-            # notebook environment has implemented some unusual custom
-            # meta path finder
-            importlib.invalidate_caches()
-            try:
-                return smuggle_func(*args, **kwargs)
-            finally:
-                # after (possibly installing and) loading the package,
-                # remove the project's site-packages directory from
-                # sys.path and restore the original working set.
-                # Note: can't assume the project site-packages dir is
-                # still sys.path[0] -- some install options result in
-                # other dirs being prepended to load modules installed
-                # in custom locations
-                sys.path.remove(str(project.site_packages_dir))
-                importlib.invalidate_caches()
-        else:
+        with _project_on_path(config.project):
             return smuggle_func(*args, **kwargs)
 
     return smuggle_wrapper
@@ -1038,149 +3781,23 @@ def smuggle(
     if installer_kwargs is None:
         installer_kwargs = {}
 
-    pkg_name = name.split('.')[0]
-
-    if pkg_name == 'davos':
-        raise TheNightIsDarkAndFullOfTErrors("Don't do that.")
-
-    onion = Onion(pkg_name, installer=installer,
-                  args_str=args_str, **installer_kwargs)
-
-    if onion.is_installed:
-        try:
-            # Unlike regular import, can be called on non-module items:
-            #     ```python
-            #     import numpy.array`                   # fails
-            #     array = import_item('numpy.array')    # succeeds
-            #     ```
-            # Also adds module (+ parents, if any) to sys.modules if not
-            # already present.
-            smuggled_obj = import_name(name)
-        except ModuleNotFoundError:
-            install_pkg = True
-        else:
-            install_pkg = False
-    else:
-        install_pkg = True
-
+    onion, smuggled_obj, install_pkg = _prepare_smuggle(name, installer,
+                                                        args_str,
+                                                        installer_kwargs)
     if install_pkg:
-        if config.confirm_install and not installer_kwargs.get('no_input'):
-            msg = (f"package {pkg_name!r} will be installed with the "
-                   f"following command:\n\t`{onion.install_cmd}`\n"
-                   f"Proceed?")
-            confirmed = prompt_input(msg, default='y')
-            if not confirmed:
-                raise SmugglerError(
-                    f"package {pkg_name!r} not installed"
-                ) from None
-        installer_stdout = onion.install_package()
-        # invalidate sys.meta_path module finder caches. Forces import
-        # machinery to notice newly installed module
-        importlib.invalidate_caches()
-        # if pkg_resources module has already been loaded, reload it in
-        # case the just-installed package uses it internally to populate
-        # its __version__ attribute from its metadata, Otherwise,
-        # pkg_resources's cached working set won't include the new
-        # package
-        if 'pkg_resources' in sys.modules:
-            importlib.reload(sys.modules['pkg_resources'])
-        # check whether the smuggled package and/or any
-        # installed/updated dependencies were already imported during
-        # the current runtime
-        prev_imported_pkgs = get_previously_imported_pkgs(installer_stdout,
-                                                          onion.installer)
-        # if the smuggled package was previously imported, deal with
-        # it last so it's reloaded after its dependencies are in place
-        try:
-            prev_imported_pkgs.remove(pkg_name)
-        except ValueError:
-            # smuggled package is brand new
-            pass
-        else:
-            prev_imported_pkgs.append(pkg_name)
-
-        failed_reloads = []
-        for dep_name in prev_imported_pkgs:
-            dep_modules_old = {}
-            for mod_name in tuple(sys.modules.keys()):
-                # remove submodules of previously imported packages so
-                # new versions get imported when main package is
-                # reloaded (importlib.reload only reloads top-level
-                # module). IPython.lib.deepreload.reload recursively
-                # reloads submodules, but is basically broken because
-                # it's *too* aggressive. It reloads *all* imported
-                # modules... including the import machinery it needs to
-                # run, which crashes it... (-_-* )
-                if mod_name.startswith(f'{dep_name}.'):
-                    dep_modules_old[mod_name] = sys.modules.pop(mod_name)
-
-            # get (but don't pop) top-level package to that it can be
-            # reloaded (must exist in sys.modules)
-            dep_modules_old[dep_name] = sys.modules[dep_name]
-            try:
-                importlib.reload(sys.modules[dep_name])
-            except (ImportError, RuntimeError):
-                # if we aren't able to reload the module, put the old
-                # version's submodules we removed back in sys.modules
-                # for now and prepare to show a warning post-execution.
-                # This way:
-                #   1. the user still has a working module until they
-                #      restart the runtime
-                #   2. the error we got doesn't keep getting raised when
-                #      we try to reload/import other modules that
-                #      import it
-                sys.modules.update(dep_modules_old)
-                failed_reloads.append(dep_name)
-
-        if any(failed_reloads):
-            # packages with C extensions (e.g., numpy, pandas) cannot be
-            # reloaded within an interpreter session. If the package was
-            # previously imported (even if not by the user), the kernel
-            # will most likely need to be restarted for changes to take
-            # effect
-            if config.auto_rerun:
-                auto_restart_rerun(failed_reloads)
-            elif config.noninteractive or installer_kwargs.get('no_input'):
-                # if not auto_rerun, only remaining non-interactive
-                # option is to raise error
-                msg = (
-                    "The following packages were previously imported by the "
-                    "interpreter and could not be reloaded because their C "
-                    "extensions have changed:\n\t"
-                    f"[{', '.join(failed_reloads)}]\nRestart the kernel to "
-                    "use the newly installed version."
-                )
-                if config.environment != 'Colaboratory':
-                    msg = (
-                        f"{msg}\nTo make this happen automatically, set "
-                        "'davos.auto_rerun = True'."
-                    )
-                raise SmugglerError(msg)
-            else:
-                prompt_restart_rerun_buttons(failed_reloads)
-
-        if (
-                config._project is None and
-                config._pip_executable != config._default_pip_executable
-        ):
-            # setting `davos.pip_executable` to a non-default value
-            # changes the executable used in all cases, but only affects
-            # the install location if not using a davos Project
-            with handle_alternate_pip_executable(onion.install_name):
-                smuggled_obj = import_name(name)
+        no_input = installer_kwargs.get('no_input', False)
+        if config.background_install and _is_detachable(onion):
+            # return immediately and let the package be loaded when
+            # it's first used
+            smuggled_obj = LazyModuleProxy(name, onion,
+                                           _install_in_background(onion),
+                                           no_input)
+            if not config._suppress_stdout:
+                print(f"installing {onion.import_name!r} in the background")
         else:
-            smuggled_obj = import_name(name)
+            _wait_for_background_installs()
+            installer_stdout = onion.install_package()
+            smuggled_obj = _finish_install(name, onion, installer_stdout,
+                                           no_input)
 
-    # add the object name/alias to the notebook's global namespace
-    if as_ is None:
-        # noinspection PyUnboundLocalVariable
-        # (false-positive warning, PyCharm doesn't parse logic fully)
-        config.ipython_shell.user_ns[name] = smuggled_obj
-    else:
-        # noinspection PyUnboundLocalVariable
-        # (false-positive warning, PyCharm doesn't parse logic fully)
-        config.ipython_shell.user_ns[as_] = smuggled_obj
-    # cache the smuggled (top-level) package by its full onion comment
-    # so rerunning cells is more efficient, but any change to version,
-    # source, etc. is caught
-    config.smuggled[pkg_name] = onion.cache_key
+    _bind_smuggled(_caller_namespace(), name, as_, onion, smuggled_obj)
@@ -1,20 +1,68 @@
-from collections.abc import Callable
+from asyncio import Future as AsyncFuture, Task
+from collections.abc import Callable, Coroutine, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import AbstractContextManager
+from importlib.metadata import Distribution
 from io import TextIOBase
-from types import TracebackType
-from typing import Generic, Literal, NoReturn, overload, Protocol, Type, TypeVar, TypedDict
+from pathlib import PosixPath
+from types import ModuleType, TracebackType
+from threading import Lock
+from typing import Any, Generic, Literal, NamedTuple, NoReturn, overload, Protocol, Type, TypeVar, TypedDict
+from davos.core.installers import InstallerBackend
+from davos.core.planner import InstallPlan
+from davos.core.project import ConcreteProject
+from davos.core.shell import OutputTail
 
-__all__ = list[Literal['capture_stdout', 'check_conda', 'get_previously_imported_pkgs', 'handle_alternate_pip_executable',
-                      'import_name', 'Onion', 'parse_line', 'prompt_input', 'run_shell_command', 'use_project', 'smuggle']]
+__all__ = list[Literal['arun_shell_command', 'asmuggle', 'batch_install_cmd', 'cache_parsed_lines', 'capture_stdout', 'check_conda',
+                      'distribution_index', 'DistributionIndex', 'environment_key', 'get_install_log_path',
+                      'get_previously_imported_pkgs',
+                      'handle_alternate_pip_executable', 'import_name', 'install_onions', 'LazyModuleProxy', 'Onion',
+                      'parse_line',
+                      'prefetch', 'prompt_input', 'run_shell_command', 'satisfied_cache', 'SatisfiedCache',
+                      'search_path_mtimes', 'use_project', 'smuggle']]
 
 _Exc = TypeVar('_Exc', bound=BaseException)
+_T = TypeVar('_T')
 _Streams = TypeVar('_Streams', bound=tuple[TextIOBase, ...])
 _InstallerName = Literal['conda', 'pip']
+_BackendName = Literal['conda', 'pip', 'uv']
+_DistIndexEntry = tuple[str | None, str]
+
+_background_executor: ThreadPoolExecutor
+_background_installs: list[Future[str]]
+_async_install_queue: list[tuple[Onion, AsyncFuture[str]]]
+_async_install_tasks: list[Task[None]]
+_loaded_file_hashes: dict[str, str]
+
+class _LazyModuleProxyState(TypedDict, total=False):
+    bindings: list[tuple[dict[str, object], str]]
+    future: Future[str]
+    lock: Lock
+    name: str
+    no_input: bool
+    obj: object
+    onion: Onion
+    project: ConcreteProject | None
+
+class _SatisfiedRecord(TypedDict):
+    mtimes: dict[str, int]
+    satisfied: list[str]
 
 class SmuggleFunc(Protocol):
     def __call__(self, name: str, as_: str | None = ..., installer: Literal['conda', 'pip'] = ..., args_str: str = ...,
                  installer_kwargs: PipInstallerKwargs | None = ... ) -> None: ...
 
+class _ParseCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class _CachedLineParser(Protocol):
+    def __call__(self, line: str) -> str: ...
+    def cache_info(self) -> _ParseCacheInfo: ...
+    def cache_clear(self) -> None: ...
+
 class PipInstallerKwargs(TypedDict, total=False):
     abi: str
     cache_dir: str
@@ -81,10 +129,146 @@ class capture_stdout(Generic[_Streams]):
     def __exit__(self, exc_type: Type[_Exc], exc_value: _Exc, exc_tb: TracebackType) -> bool | None: ...
     def _write(self, data: str) -> None: ...
 
+async def _adeposit_wheels(installer_stdout: str, installer: _BackendName) -> None: ...
+async def _asmuggle(namespace: dict[str, object], project: ConcreteProject | None, name: str, *, as_: str | None,
+                    installer: _InstallerName, args_str: str, installer_kwargs: dict[str, Any]) -> object: ...
+def _bind_smuggled(namespace: dict[str, object], name: str, as_: str | None, onion: Onion,
+                   smuggled_obj: object) -> None: ...
+def _caller_namespace() -> dict[str, object]: ...
+def _changed_modules(pkg_name: str, new_hashes: dict[str, str], module_names: list[str]) -> list[str] | None: ...
+def _dependency_order(keys: Iterable[_T], dependencies: dict[_T, Iterable[_T]]) -> list[_T]: ...
+def _deposit_wheels(installer_stdout: str, installer: _BackendName) -> None: ...
+def _finish_install(name: str, onion: Onion, installer_stdout: str, no_input: bool = ..., *,
+                    deposit_wheels: bool = ...) -> object: ...
+def _install_batch_queue() -> None: ...
+def _install_in_background(onion: Onion) -> Future[str]: ...
+def _is_detachable(onion: Onion) -> bool: ...
+def _install_lockfile() -> bool: ...
+def _link_lockfile(project: ConcreteProject) -> tuple[str, bool]: ...
+def _logged_output_tail(command: str) -> AbstractContextManager[tuple[OutputTail, str]]: ...
+def _needs_restart(pkg_name: str, dists: list[Distribution], module_names: list[str]) -> bool: ...
+def _prepare_smuggle(name: str, installer: _InstallerName, args_str: str,
+                     installer_kwargs: dict[str, Any], *, blocking: bool = ...) -> tuple[Onion, object | None, bool]: ...
+def _previously_imported_dists(install_cmd_stdout: str,
+                               installer: _BackendName) -> list[tuple[str, Distribution]]: ...
+def _print_output_summary(tail: OutputTail, log_msg: str, failed: bool) -> None: ...
+def _project_on_path(project: ConcreteProject | None) -> AbstractContextManager[None]: ...
+def _proxy_method(func: Callable[..., Any], reflected: bool = ...) -> Callable[..., Any]: ...
+def _queue_async_install(onion: Onion) -> AsyncFuture[str]: ...
+def _record_hashes(dist: Distribution) -> dict[str, str]: ...
+def _referenced_modules(module: ModuleType) -> set[str]: ...
+def _reload_modules(mod_names: list[str]) -> bool: ...
+def _reload_package(pkg_name: str, module_names: list[str]) -> bool: ...
+def _reload_previously_imported(installer_stdout: str, installer: _BackendName, smuggled_pkgs: list[str],
+                                no_input: bool = ...) -> None: ...
+def _required_names(dist: Distribution) -> list[str]: ...
+async def _run_async_installs(queued: list[tuple[Onion, AsyncFuture[str]]], previous_tasks: list[Task[None]]) -> None: ...
+def _run_background_install_cmd(command: str) -> str: ...
+def _run_shell_command_bounded(command: str) -> str: ...
+def _snapshot_record_hashes(onions: list[Onion]) -> None: ...
+def _sort_by_dependencies(dists: list[tuple[str, Distribution]]) -> list[tuple[str, Distribution]]: ...
+def _start_async_installs() -> None: ...
+def _store_dists(installer_stdout: str, installer: _BackendName) -> None: ...
+def _submodule_names(module_names: list[str], pkg_name: str) -> list[str]: ...
+def _wait_for_background_installs() -> None: ...
+def _wheels_to_deposit(installer_stdout: str, installer: _BackendName) -> list[tuple[str, str]]: ...
+async def arun_shell_command(command: str, live_stdout: bool | None = ...) -> str: ...
+def asmuggle(name: str, as_: str | None = ..., installer: _InstallerName = ..., args_str: str = ...,
+             installer_kwargs: dict[str, Any] | None = ...) -> Coroutine[Any, Any, object]: ...
+def batch_install_cmd(onions: list[Onion]) -> str: ...
 def check_conda() -> None: ...
-def get_previously_imported_pkgs(install_cmd_stdout: str, installer: _InstallerName) -> list[str]: ...
+
+class DistributionIndex:
+    _dir_cache: dict[str, tuple[int, dict[str, _DistIndexEntry]]]
+    _index: dict[str, _DistIndexEntry]
+    _index_key: tuple[tuple[str, int], ...] | None
+    def __init__(self) -> None: ...
+    def _refresh(self) -> None: ...
+    def _scan_dir(self, dirpath: str, mtime: int) -> dict[str, _DistIndexEntry]: ...
+    def distribution(self, name: str) -> Distribution: ...
+    def version(self, name: str) -> str: ...
+
+distribution_index: DistributionIndex
+
+def environment_key() -> str: ...
+def get_install_log_path() -> PosixPath: ...
+def get_previously_imported_pkgs(install_cmd_stdout: str, installer: _BackendName) -> list[str]: ...
 def handle_alternate_pip_executable(installed_name: str) -> AbstractContextManager[None]: ...
 def import_name(name: str) -> object: ...
+def install_onions(onions: list[Onion]) -> str: ...
+
+class LazyModuleProxy:
+    _davos_state: _LazyModuleProxyState
+    def __init__(self, name: str, onion: Onion, install_future: Future[str], no_input: bool = ...) -> None: ...
+    def __abs__(self) -> Any: ...
+    def __add__(self, other: Any) -> Any: ...
+    def __and__(self, other: Any) -> Any: ...
+    def __bool__(self) -> bool: ...
+    def __bytes__(self) -> bytes: ...
+    def __call__(self, *args: Any, **kwargs: Any) -> Any: ...
+    @property  # type: ignore[misc]
+    def __class__(self) -> type: ...  # type: ignore[override]
+    def __complex__(self) -> complex: ...
+    def __contains__(self, other: Any) -> bool: ...
+    def __delattr__(self, name: str) -> None: ...
+    def __delitem__(self, other: Any) -> Any: ...
+    def __dir__(self) -> list[str]: ...
+    def __enter__(self) -> Any: ...
+    def __eq__(self, other: Any) -> Any: ...
+    def __exit__(self, *exc_info: Any) -> Any: ...
+    def __float__(self) -> float: ...
+    def __floordiv__(self, other: Any) -> Any: ...
+    def __format__(self, other: str) -> str: ...
+    def __fspath__(self) -> str | bytes: ...
+    def __ge__(self, other: Any) -> Any: ...
+    def __getattr__(self, name: str) -> Any: ...
+    def __getitem__(self, other: Any) -> Any: ...
+    def __gt__(self, other: Any) -> Any: ...
+    def __hash__(self) -> int: ...
+    def __index__(self) -> int: ...
+    def __instancecheck__(self, other: Any) -> bool: ...
+    def __int__(self) -> int: ...
+    def __invert__(self) -> Any: ...
+    def __iter__(self) -> Any: ...
+    def __le__(self, other: Any) -> Any: ...
+    def __len__(self) -> int: ...
+    def __lshift__(self, other: Any) -> Any: ...
+    def __lt__(self, other: Any) -> Any: ...
+    def __matmul__(self, other: Any) -> Any: ...
+    def __mod__(self, other: Any) -> Any: ...
+    def __mro_entries__(self, _bases: tuple[type, ...]) -> tuple[type]: ...
+    def __mul__(self, other: Any) -> Any: ...
+    def __ne__(self, other: Any) -> Any: ...
+    def __neg__(self) -> Any: ...
+    def __next__(self) -> Any: ...
+    def __or__(self, other: Any) -> Any: ...
+    def __pos__(self) -> Any: ...
+    def __pow__(self, other: Any, modulo: Any = ...) -> Any: ...
+    def __radd__(self, other: Any) -> Any: ...
+    def __rand__(self, other: Any) -> Any: ...
+    def __reversed__(self) -> Any: ...
+    def __rfloordiv__(self, other: Any) -> Any: ...
+    def __rlshift__(self, other: Any) -> Any: ...
+    def __rmatmul__(self, other: Any) -> Any: ...
+    def __rmod__(self, other: Any) -> Any: ...
+    def __rmul__(self, other: Any) -> Any: ...
+    def __ror__(self, other: Any) -> Any: ...
+    def __round__(self, ndigits: int | None = ...) -> Any: ...
+    def __rpow__(self, other: Any) -> Any: ...
+    def __rrshift__(self, other: Any) -> Any: ...
+    def __rshift__(self, other: Any) -> Any: ...
+    def __rsub__(self, other: Any) -> Any: ...
+    def __rtruediv__(self, other: Any) -> Any: ...
+    def __rxor__(self, other: Any) -> Any: ...
+    def __setitem__(self, key: Any, value: Any) -> None: ...
+    def __str__(self) -> str: ...
+    def __sub__(self, other: Any) -> Any: ...
+    def __subclasscheck__(self, other: Any) -> bool: ...
+    def __truediv__(self, other: Any) -> Any: ...
+    def __xor__(self, other: Any) -> Any: ...
+    def __setattr__(self, name: str, value: object) -> None: ...
+    def _davos_bind(self, namespace: dict[str, object], binding: str) -> None: ...
+    def _davos_resolve(self) -> object: ...
 
 class Onion:
     args_str: str
@@ -96,6 +280,8 @@ class Onion:
     installer: _InstallerName
     installer_kwargs: PipInstallerKwargs
     is_editable: bool
+    plan: InstallPlan | None
+    plan_key: str | None
     verbosity: Literal[-3, -2, -1, 0, 1, 2, 3]
     version_spec: str
     @staticmethod
@@ -103,16 +289,41 @@ class Onion:
     def __init__(self, package_name: str, installer: _InstallerName, args_str: str,
                  **installer_kwargs: bool | float | str | list[str]) -> None: ...
     @property
+    def backend(self) -> InstallerBackend: ...
+    @property
     def install_cmd(self) -> str: ...
     @property
+    def is_batchable(self) -> bool: ...
+    @property
     def is_installed(self) -> bool: ...
     def _conda_install_package(self) -> NoReturn: ...
     def _pip_install_package(self) -> str: ...
 
-def parse_line(line: str) -> str: ...
+def cache_parsed_lines(parse_func: Callable[[str], str]) -> _CachedLineParser: ...
+
+parse_line: _CachedLineParser
+
+def prefetch(notebook_path: PosixPath | str) -> None: ...
 def prompt_input(prompt: str, default: Literal['n', 'no', 'y', 'yes'] | None = ...,
                  interrupt: Literal['n', 'no', 'y', 'yes'] | None = ...) -> bool: ...
 def run_shell_command(command: str, live_stdout: bool | None = ...) -> str: ...
+
+class SatisfiedCache:
+    _records: dict[str, _SatisfiedRecord] | None
+    def __init__(self) -> None: ...
+    @property
+    def cache_path(self) -> PosixPath: ...
+    @staticmethod
+    def _onion_key(onion: Onion) -> str: ...
+    def _load(self) -> dict[str, _SatisfiedRecord]: ...
+    def add(self, onion: Onion) -> None: ...
+    def clear(self) -> None: ...
+    def contains(self, onion: Onion) -> bool: ...
+
+satisfied_cache: SatisfiedCache
+
+def search_path_mtimes() -> dict[str, int]: ...
+
 def use_project(smuggle_func: SmuggleFunc) -> SmuggleFunc: ...
 def smuggle(name: str, as_: str | None = ..., installer: _InstallerName = ..., args_str: str = ...,
             installer_kwargs: PipInstallerKwargs | None = ...) -> None: ...
@@ -0,0 +1,57 @@
+"""
+Helpers for writing the files `davos` caches on disk.
+
+Several caches (e.g., the stdlib module cache, the "already satisfied"
+cache, install plans, the package store's index, and transformed
+bytecode) are stored in files that may be read and rewritten by
+multiple sessions, and by multiple threads within a session (e.g., when
+`davos.background_install` is enabled), at once.
+"""
+
+
+__all__ = ['write_atomic']
+
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def write_atomic(path, data):
+    """
+    Write data to a file so that readers never see a partial write.
+
+    The data is written to a uniquely named temporary file in the same
+    directory, which then replaces `path`. Concurrent writers each use
+    their own temporary file, so the last write wins and readers see
+    either the old or the new contents.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to write. Its parent directory is created if it
+        doesn't exist.
+    data : str or bytes
+        The contents to write. `str` data is encoded as UTF-8.
+
+    Raises
+    ------
+    OSError
+        If the file can't be written. The temporary file is removed.
+    """
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,6 @@
+from os import PathLike
+from typing import Literal
+
+__all__ = list[Literal['write_atomic']]
+
+def write_atomic(path: str | PathLike[str], data: str | bytes) -> None: ...
@@ -0,0 +1,258 @@
+"""
+A meta path finder that imports packages from the active project.
+
+Packages smuggled into a `davos` project are installed into the
+project's own site-packages directory, which isn't on `sys.path`. While
+a `smuggle` statement runs, `project_finder` (a `ProjectFinder`
+installed on `sys.meta_path` ahead of the standard path-based finder)
+makes the project's packages importable, and their distributions' metadata
+discoverable by `importlib.metadata`, with priority over those in the
+main Python environment.
+
+This replaces prepending the project's site-packages directory to
+`sys.path` for each `smuggle` statement and removing it afterward,
+which required invalidating every import finder's caches both times,
+so that the next import of any module had to rebuild them. Instead,
+the finder keeps an index of the top-level modules and packages in
+each project's site-packages directory, which is rebuilt only when the
+directory's modification time changes (i.e., when packages are
+installed into or removed from it).
+"""
+
+
+__all__ = ['find_module_spec', 'project_finder', 'ProjectFinder']
+
+
+import os
+import sys
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from importlib.machinery import all_suffixes, PathFinder
+
+if sys.version_info < (3, 8):
+    import importlib_metadata as metadata
+else:
+    from importlib import metadata
+
+
+class ProjectFinder(MetaPathFinder):
+    """
+    Meta path finder for the packages in the active project.
+
+    Inserted into `sys.meta_path` immediately before the standard
+    path-based finder (`importlib.machinery.PathFinder`) the first time
+    a project is activated, and left there afterward. Only finds
+    top-level modules and packages while a project is active (see
+    `ProjectFinder.activate()`), and only those installed in the
+    project's site-packages directory. Their submodules are found by
+    the standard finder, via the package's `__path__`.
+    """
+
+    def __init__(self):
+        # site-packages directories of active projects, innermost last
+        self._active_dirs = []
+        # {dirpath: (mtime, {top-level module names})}
+        self._index = {}
+
+    @property
+    def site_packages_dir(self):
+        """The active project's site-packages directory, or `None`"""
+        return self._active_dirs[-1] if self._active_dirs else None
+
+    def _install(self):
+        if self in sys.meta_path:
+            return
+        for ix, finder in enumerate(sys.meta_path):
+            if finder is PathFinder:
+                sys.meta_path.insert(ix, self)
+                return
+        sys.meta_path.append(self)
+
+    def _top_level_names(self, dirpath):
+        """
+        Get the names of the top-level modules in a directory.
+
+        Parameters
+        ----------
+        dirpath : str
+            A site-packages directory.
+
+        Returns
+        -------
+        set of str
+            Names of the modules and packages (including namespace
+            packages) importable from `dirpath`.
+        """
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            # project has no packages installed yet
+            return set()
+        try:
+            cached_mtime, names = self._index[dirpath]
+        except KeyError:
+            pass
+        else:
+            if cached_mtime == mtime:
+                return names
+
+        suffixes = all_suffixes()
+        names = set()
+        with os.scandir(dirpath) as dir_entries:
+            for dir_entry in dir_entries:
+                name = dir_entry.name
+                if not dir_entry.is_dir():
+                    for suffix in suffixes:
+                        if name.endswith(suffix):
+                            name = name[:-len(suffix)]
+                            break
+                    else:
+                        continue
+                # excludes metadata directories (*.dist-info, etc.),
+                # __pycache__, etc.
+                if name.isidentifier() and name != '__pycache__':
+                    names.add(name)
+        # the standard finder's cached directory contents may be stale
+        # too if the directory was modified within its mtime resolution
+        path_entry_finder = sys.path_importer_cache.get(dirpath)
+        if path_entry_finder is not None:
+            path_entry_finder.invalidate_caches()
+        self._index[dirpath] = (mtime, names)
+        return names
+
+    @contextmanager
+    def activate(self, site_packages_dir):
+        """
+        Make a project's packages importable within a context.
+
+        Parameters
+        ----------
+        site_packages_dir : str or pathlib.Path
+            The project's site-packages directory.
+        """
+        self._install()
+        self._active_dirs.append(str(site_packages_dir))
+        try:
+            yield
+        finally:
+            self._active_dirs.pop()
+
+    def find_distributions(self, context=metadata.DistributionFinder.Context()):
+        """
+        Find distributions installed in the active project.
+
+        Called by `importlib.metadata` when searching for installed
+        distributions. Only searches the active project's site-packages
+        directory for searches of the default module search path (i.e.,
+        not those restricted to specific directories).
+
+        Parameters
+        ----------
+        context : importlib.metadata.DistributionFinder.Context
+            The search parameters.
+
+        Returns
+        -------
+        iterable of importlib.metadata.Distribution
+            The matching distributions.
+        """
+        site_packages_dir = self.site_packages_dir
+        if site_packages_dir is None or context.path is not sys.path:
+            return ()
+        project_context = metadata.DistributionFinder.Context(
+            name=context.name,
+            path=[site_packages_dir]
+        )
+        return metadata.MetadataPathFinder.find_distributions(project_context)
+
+    def find_spec(self, fullname, path, target=None):
+        """
+        Find the spec for a top-level module in the active project.
+
+        Called by the import system when a module is imported.
+
+        Parameters
+        ----------
+        fullname : str
+            The module's fully qualified name.
+        path : list of str or None
+            The parent package's `__path__` for submodules, or `None`
+            for top-level modules.
+        target : types.ModuleType, optional
+            The module object being reloaded, if any.
+
+        Returns
+        -------
+        importlib.machinery.ModuleSpec or None
+            The module's spec, or `None` if no project is active or the
+            module isn't a top-level module installed in it.
+        """
+        site_packages_dir = self.site_packages_dir
+        if (
+                site_packages_dir is None or
+                path is not None or
+                fullname not in self._top_level_names(site_packages_dir)
+        ):
+            return None
+        # search the rest of sys.path too, so that portions of namespace
+        # packages installed in the main environment are included
+        return PathFinder.find_spec(fullname,
+                                    [site_packages_dir, *sys.path],
+                                    target)
+
+    def invalidate_caches(self):
+        """
+        Clear the index of the active projects' modules.
+
+        Called by `importlib.invalidate_caches()`, and after installing
+        packages into the active project.
+        """
+        for dirpath in self._active_dirs:
+            self._index.pop(dirpath, None)
+            path_entry_finder = sys.path_importer_cache.get(dirpath)
+            if path_entry_finder is not None:
+                path_entry_finder.invalidate_caches()
+
+    def search_path(self):
+        """
+        Get the directories searched for installed distributions.
+
+        Returns
+        -------
+        list of str
+            The active project's site-packages directory (if a project
+            is active) followed by the entries on `sys.path`.
+        """
+        return [*self._active_dirs[-1:], *sys.path]
+
+
+project_finder = ProjectFinder()
+
+
+def find_module_spec(fullname, path=None, target=None):
+    """
+    Find the spec for a module with the path-based import machinery.
+
+    Modules installed in the active project (if any) take priority over
+    those in the main Python environment, as they do for imports within
+    `project_finder.activate()`.
+
+    Parameters
+    ----------
+    fullname : str
+        The module's fully qualified name.
+    path : list of str, optional
+        The parent package's `__path__` for submodules. Defaults to
+        `None` (for top-level modules).
+    target : types.ModuleType, optional
+        The module object being reloaded, if any.
+
+    Returns
+    -------
+    importlib.machinery.ModuleSpec or None
+        The module's spec, or `None` if it can't be found.
+    """
+    spec = project_finder.find_spec(fullname, path, target)
+    if spec is None:
+        spec = PathFinder.find_spec(fullname, path, target)
+    return spec
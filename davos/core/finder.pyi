@@ -0,0 +1,30 @@
+from collections.abc import Iterable
+from contextlib import AbstractContextManager
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec
+from importlib.metadata import Distribution, DistributionFinder
+from os import PathLike
+from types import ModuleType
+from typing import Literal, Sequence
+
+__all__ = list[Literal['find_module_spec', 'project_finder', 'ProjectFinder']]
+
+class ProjectFinder(MetaPathFinder):
+    _active_dirs: list[str]
+    _index: dict[str, tuple[int, set[str]]]
+    def __init__(self) -> None: ...
+    @property
+    def site_packages_dir(self) -> str | None: ...
+    def _install(self) -> None: ...
+    def _top_level_names(self, dirpath: str) -> set[str]: ...
+    def activate(self, site_packages_dir: str | PathLike[str]) -> AbstractContextManager[None]: ...
+    def find_distributions(self, context: DistributionFinder.Context = ...) -> Iterable[Distribution]: ...
+    def find_spec(self, fullname: str, path: Sequence[str] | None,
+                  target: ModuleType | None = ...) -> ModuleSpec | None: ...
+    def invalidate_caches(self) -> None: ...
+    def search_path(self) -> list[str]: ...
+
+project_finder: ProjectFinder
+
+def find_module_spec(fullname: str, path: Sequence[str] | None = ...,
+                     target: ModuleType | None = ...) -> ModuleSpec | None: ...
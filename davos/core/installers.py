@@ -0,0 +1,597 @@
+"""
+Installer backends used to install and inspect smuggled packages.
+
+Onion comments always use `pip`'s command line syntax, but the program
+that actually runs the installation is determined by
+`davos.installer_backend`. Each backend formats the shell commands
+used to install packages (`InstallerBackend.install_cmd`), list the
+packages installed in a project (`InstallerBackend.list_cmd`), and show
+where a package is installed (`InstallerBackend.show_cmd`), and parses
+those commands' output.
+
+`PipBackend` (the default) runs the configured `davos.pip_executable`.
+`UvBackend` runs [`uv`](https://github.com/astral-sh/uv)'s
+pip-compatible interface, whose resolver and installer are typically
+much faster than `pip`'s. `uv` doesn't support all of `pip install`'s
+options, so Onions that pass any unsupported options (see
+`UvBackend.supports`) are installed with `pip`, regardless of the
+configured backend.
+
+Both backends pass the options that make the installer use the shared
+local wheelhouse when `davos.wheelhouse` and/or `davos.offline` are
+enabled (see `davos.core.wheelhouse`).
+
+With `pip>=22.2`, the `pip` backend also passes `--report <file>` to
+the install command, so `pip` writes a JSON report of the distributions
+it installs. `davos` runs shell commands through
+`davos.core.core.run_shell_command()` (and its background and
+asynchronous counterparts), which give each command its own report
+file (see `pip_report()`) and attach the report to the command's
+output (see `attach_report()`). The distributions installed by the
+command are then read from the report rather than parsed from its
+output, which may be missing (e.g., with `-qqq`) or truncated (see
+`davos.max_output_size`).
+"""
+
+
+__all__ = [
+    'attach_report',
+    'find_uv_executable',
+    'get_backend',
+    'InstallerBackend',
+    'InstallerOutput',
+    'pip_backend',
+    'pip_report',
+    'PipBackend',
+    'select_backend',
+    'UvBackend'
+]
+
+
+import itertools
+import json
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import CalledProcessError, PIPE, STDOUT
+from subprocess import run as run_subprocess
+
+from packaging.version import InvalidVersion, Version
+if sys.version_info < (3, 8):
+    import importlib_metadata as metadata
+else:
+    from importlib import metadata
+
+from davos import config
+from davos.core.pip_worker import _find_interpreter
+from davos.core.regexps import pip_installed_pkgs_regex, uv_installed_pkgs_regex
+from davos.core.wheelhouse import wheelhouse_args
+
+
+# first version of pip whose install command accepts --report
+_MIN_REPORT_PIP_VERSION = Version('22.2')
+# whether each pip executable supports --report (see
+# `PipBackend.supports_report`)
+_report_support = {}
+
+
+def _get_pip_version(pip_executable):
+    """
+    Get the version of a `pip` executable.
+
+    Parameters
+    ----------
+    pip_executable : str
+        The `pip` executable (e.g., `davos.pip_executable`).
+
+    Returns
+    -------
+    packaging.version.Version or None
+        The executable's version, or `None` if it can't be determined.
+    """
+    try:
+        if pip_executable == config._default_pip_executable:
+            # installed in the same environment as davos
+            return Version(metadata.version('pip'))
+        # "pip X.Y.Z from <location> (python X.Y)"
+        result = run_subprocess(f'{pip_executable} --version', shell=True,
+                                stdout=PIPE, stderr=STDOUT,
+                                encoding='utf-8', errors='replace',
+                                check=True)
+        return Version(result.stdout.split()[1])
+    except (
+            metadata.PackageNotFoundError,
+            InvalidVersion,
+            IndexError,
+            OSError,
+            CalledProcessError
+    ):
+        return None
+
+
+def _report_path():
+    """
+    Get the report path in install commands formatted by `PipBackend`.
+
+    Returns
+    -------
+    pathlib.Path
+        A placeholder path in the system's temporary directory. Before
+        an install command runs, `pip_report()` replaces it with the
+        path to a new, uniquely named file, so that no two commands
+        write to the same report and no other user can predict (and
+        pre-create) it.
+    """
+    return Path(tempfile.gettempdir(), 'davos-pip-report.json')
+
+
+class InstallerOutput(str):
+    """
+    The output of an install command, plus its installer's report.
+
+    A `str` subclass, so it can be used (and parsed) like the output of
+    any other command. The report is available as the `report`
+    attribute.
+    """
+
+    def __new__(cls, output, report):
+        """
+        Parameters
+        ----------
+        output : str
+            The command's output.
+        report : dict
+            The JSON report written by the installer (see
+            https://pip.pypa.io/en/stable/reference/installation-report/).
+        """
+        instance = super().__new__(cls, output)
+        instance.report = report
+        return instance
+
+
+class InstallerBackend:
+    """
+    Base class for installer backends.
+
+    Subclasses define how to build each shell command for a particular
+    installer program, and how to parse its output.
+    """
+
+    # name used for the backend in `davos.installer_backend`
+    name = None
+
+    def install_cmd(self, args):
+        """
+        Format the shell command used to install a package or packages.
+
+        Parameters
+        ----------
+        args : str
+            Arguments to pass to the install command (i.e., one or more
+            requirement specifiers, plus any additional options), in
+            `pip install` syntax.
+
+        Returns
+        -------
+        str
+            The full install command, adjusted for the current
+            `davos.noninteractive` mode and `davos.project`.
+        """
+        raise NotImplementedError
+
+    def installed_dists(self, install_stdout):
+        """
+        Get the names of distributions installed by an install command.
+
+        Parameters
+        ----------
+        install_stdout : str
+            The output of a command formatted by `install_cmd()`.
+
+        Returns
+        -------
+        list of str
+            Names of the distributions that were installed or updated.
+        """
+        return [name for name, _ in self.installed_versions(install_stdout)]
+
+    def installed_versions(self, install_stdout):
+        """
+        Get the distributions and versions installed by an install
+        command.
+
+        Parameters
+        ----------
+        install_stdout : str
+            The output of a command formatted by `install_cmd()`.
+
+        Returns
+        -------
+        list of tuple of str
+            (name, version) pairs for each distribution that was
+            installed or updated.
+        """
+        raise NotImplementedError
+
+    def list_cmd(self, project):
+        """
+        Format the shell command that lists a project's packages.
+
+        Parameters
+        ----------
+        project : davos.core.project.Project
+            The project whose packages should be listed.
+
+        Returns
+        -------
+        str
+            A command that outputs the names and versions of packages
+            installed in the project as a JSON array of objects with
+            "name" and "version" keys.
+        """
+        raise NotImplementedError
+
+    def show_cmd(self, dist_name):
+        """
+        Format the shell command that shows info about a distribution.
+
+        Parameters
+        ----------
+        dist_name : str
+            The name of an installed distribution.
+
+        Returns
+        -------
+        str
+            A command whose output includes a "`Location: <dir>`" line
+            with the directory into which the distribution is installed.
+        """
+        raise NotImplementedError
+
+    def supports(self, _onion):
+        """
+        Check whether the backend can install a package as specified.
+
+        Parameters
+        ----------
+        _onion : davos.core.core.Onion
+            The `Onion` for the package to be installed.
+
+        Returns
+        -------
+        bool
+            `True` if the Onion's install arguments can be passed to the
+            backend's install command; otherwise, `False`.
+        """
+        return True
+
+    @staticmethod
+    def parse_list(list_stdout):
+        """
+        Parse the output of a command formatted by `list_cmd()`.
+
+        Parameters
+        ----------
+        list_stdout : str
+            The command's output.
+
+        Returns
+        -------
+        list of tuple of str
+            (name, version) pairs for each installed package.
+        """
+        # ignore any warnings/messages printed before the JSON output
+        for line in reversed(list_stdout.splitlines()):
+            if line.startswith('['):
+                return [(pkg['name'], pkg['version'])
+                        for pkg in json.loads(line)]
+        return []
+
+    @staticmethod
+    def parse_show_location(show_stdout):
+        """
+        Parse the output of a command formatted by `show_cmd()`.
+
+        Parameters
+        ----------
+        show_stdout : str
+            The command's output.
+
+        Returns
+        -------
+        str or None
+            The directory into which the distribution is installed, or
+            `None` if the output doesn't include it.
+        """
+        for line in show_stdout.strip().splitlines():
+            if line.startswith('Location'):
+                return line.split(': ', maxsplit=1)[1].strip()
+        return None
+
+
+class PipBackend(InstallerBackend):
+    """Installer backend that runs `davos.pip_executable`."""
+
+    name = 'pip'
+
+    @property
+    def supports_report(self):
+        """
+        Whether `davos.pip_executable` accepts `pip install --report`.
+        """
+        pip_executable = config._pip_executable
+        if pip_executable not in _report_support:
+            pip_version = _get_pip_version(pip_executable)
+            _report_support[pip_executable] = (
+                pip_version is not None and
+                pip_version >= _MIN_REPORT_PIP_VERSION
+            )
+        return _report_support[pip_executable]
+
+    def install_cmd(self, args):
+        # escape comparison operators so they aren't parsed as redirects
+        args = args.replace("<", "'<'").replace(">", "'>'")
+        install_exe = config._pip_executable
+        if config.noninteractive:
+            args = f'{args} --no-input'
+        if config.wheelhouse or config.offline:
+            args = f'{wheelhouse_args()} {args}'
+        if self.supports_report:
+            args = f'--report "{_report_path()}" {args}'
+        if config.project is not None:
+            install_exe = f'PYTHONUSERBASE="{config.project.project_dir}" {install_exe}'
+            args = f'--no-warn-script-location --user {args}'
+        return f'{install_exe} install {args}'
+
+    def installed_versions(self, install_stdout):
+        report = getattr(install_stdout, 'report', None)
+        if report is not None:
+            return [(item['metadata']['name'], item['metadata']['version'])
+                    for item in report.get('install', [])]
+        # no report (e.g., older pip version) -- parse the output
+        matches = pip_installed_pkgs_regex.findall(install_stdout)
+        # flatten and split matches to separate packages, then split
+        # each "<name>-<version>"
+        return [tuple(dist.rsplit('-', maxsplit=1))
+                for dist in itertools.chain(*map(str.split, matches))]
+
+    def list_cmd(self, project):
+        return (
+            f'{config.pip_executable} list '
+            '--disable-pip-version-check '
+            f'--path {project.site_packages_dir} '
+            f'--format json'
+        )
+
+    def show_cmd(self, dist_name):
+        return f'{config._pip_executable} show {dist_name}'
+
+
+class UvBackend(InstallerBackend):
+    """
+    Installer backend that runs `uv pip`.
+
+    Packages are installed for the Python interpreter that runs
+    `davos.pip_executable`. When a project is active, they're installed
+    with `--prefix <project_dir>`, which uses the same directory layout
+    as `pip install --user` with `PYTHONUSERBASE=<project_dir>`.
+
+    Notes
+    -----
+    Unlike `pip install --user`, `uv pip install --prefix` doesn't
+    consider packages installed in the main environment when resolving
+    dependencies, so a project's dependencies are always installed into
+    the project itself.
+    """
+
+    name = 'uv'
+
+    # `pip install` options (as `Onion.installer_kwargs` keys) that
+    # `uv pip install` accepts with the same meaning
+    supported_options = frozenset({
+        'break_system_packages',
+        'cache_dir',
+        'config_settings',
+        'constraint',
+        'extra_index_url',
+        'find_links',
+        'force_reinstall',
+        'index_url',
+        'no_binary',
+        'no_build_isolation',
+        'no_cache_dir',
+        'no_deps',
+        'no_index',
+        'only_binary',
+        'pre',
+        'require_hashes',
+        'upgrade'
+    })
+
+    def __init__(self, executable):
+        """
+        Parameters
+        ----------
+        executable : str
+            Path to the `uv` executable.
+        """
+        self.executable = executable
+
+    @property
+    def python(self):
+        """The Python interpreter packages are installed for"""
+        interpreter = _find_interpreter(tuple(shlex.split(config._pip_executable)))
+        if interpreter is None or len(interpreter) > 2:
+            return sys.executable
+        # shebang may be "#!/usr/bin/env python3"
+        return interpreter[-1]
+
+    def install_cmd(self, args):
+        # escape comparison operators so they aren't parsed as redirects
+        args = args.replace("<", "'<'").replace(">", "'>'")
+        if config.wheelhouse or config.offline:
+            args = f'{wheelhouse_args()} {args}'
+        if config.project is not None:
+            args = f'--prefix "{config.project.project_dir}" {args}'
+        return f'"{self.executable}" pip install --python "{self.python}" {args}'
+
+    def installed_versions(self, install_stdout):
+        return uv_installed_pkgs_regex.findall(install_stdout)
+
+    def list_cmd(self, project):
+        return (
+            f'"{self.executable}" pip list --python "{self.python}" '
+            f'--prefix "{project.project_dir}" --format json'
+        )
+
+    def show_cmd(self, dist_name):
+        return f'"{self.executable}" pip show --python "{self.python}" {dist_name}'
+
+    def supports(self, onion):
+        return (
+            onion.installer == 'pip' and
+            not onion.is_editable and
+            self.supported_options.issuperset(onion.installer_kwargs)
+        )
+
+
+def attach_report(install_stdout, report_path):
+    """
+    Attach the report written by a `pip` install command to its output.
+
+    Parameters
+    ----------
+    install_stdout : str
+        The output of a command that has just run successfully.
+    report_path : pathlib.Path or None
+        The file to which the command wrote its report (see
+        `pip_report()`), or `None` if it doesn't write one.
+
+    Returns
+    -------
+    str or InstallerOutput
+        If the command wrote a report, an `InstallerOutput` with the
+        report. Otherwise, `install_stdout`, unchanged.
+    """
+    if report_path is None:
+        return install_stdout
+    try:
+        with report_path.open(encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return install_stdout
+    return InstallerOutput(install_stdout, report)
+
+
+def find_uv_executable():
+    """
+    Find a local `uv` executable.
+
+    Looks in the directory containing `davos.pip_executable` (e.g., a
+    virtual environment's `bin` directory), then the directory
+    containing the running Python interpreter, then on the `PATH`.
+
+    Returns
+    -------
+    str or None
+        The path to the `uv` executable, or `None` if one isn't found.
+    """
+    pip_exe = shlex.split(config._pip_executable)[0]
+    for search_dir in (Path(pip_exe).parent, Path(sys.executable).parent):
+        candidate = search_dir.joinpath('uv')
+        if candidate.is_file() and os.access(candidate, os.X_OK):
+            return str(candidate)
+    return shutil.which('uv')
+
+
+def get_backend(name=None):
+    """
+    Get an installer backend by name.
+
+    Parameters
+    ----------
+    name : {'pip', 'uv'}, optional
+        The backend's name. Defaults to the configured
+        `davos.installer_backend`.
+
+    Returns
+    -------
+    InstallerBackend
+        The installer backend.
+    """
+    if name is None:
+        name = config.installer_backend
+    if name == 'uv':
+        uv_executable = find_uv_executable()
+        # fall back to pip if uv was removed after it was selected
+        if uv_executable is not None:
+            return UvBackend(uv_executable)
+    return pip_backend
+
+
+@contextmanager
+def pip_report(command):
+    """
+    Give a `pip` install command its own report file while it runs.
+
+    Parameters
+    ----------
+    command : str
+        A shell command about to be run.
+
+    Yields
+    ------
+    command : str
+        If `command` is an install command formatted by `PipBackend`
+        that writes a report, `command` with its report path replaced
+        by that of a new, empty file created securely in the system's
+        temporary directory. Otherwise, `command`, unchanged.
+    report_path : pathlib.Path or None
+        The path to the new report file, or `None` if `command` doesn't
+        write a report. The file is removed when the context exits,
+        whether or not the command succeeded.
+    """
+    report_arg = f'--report "{_report_path()}"'
+    if report_arg not in command:
+        yield command, None
+        return
+    fd, report_path = tempfile.mkstemp(prefix='davos-pip-report-',
+                                       suffix='.json')
+    os.close(fd)
+    report_path = Path(report_path)
+    try:
+        yield (command.replace(report_arg, f'--report "{report_path}"'),
+               report_path)
+    finally:
+        try:
+            report_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def select_backend(onion):
+    """
+    Get the installer backend used to install a particular package.
+
+    Parameters
+    ----------
+    onion : davos.core.core.Onion
+        The `Onion` for the package to be installed.
+
+    Returns
+    -------
+    InstallerBackend
+        The configured backend, if it supports the Onion's install
+        arguments. Otherwise, the `pip` backend.
+    """
+    backend = get_backend()
+    if backend.supports(onion):
+        return backend
+    return pip_backend
+
+
+pip_backend = PipBackend()
@@ -0,0 +1,55 @@
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Any, ClassVar, Final, Literal
+from packaging.version import Version
+from davos.core.core import Onion
+from davos.core.project import Project
+
+__all__ = list[Literal['attach_report', 'find_uv_executable', 'get_backend', 'InstallerBackend', 'InstallerOutput',
+                       'pip_backend', 'pip_report', 'PipBackend', 'select_backend', 'UvBackend']]
+
+_BackendName = Literal['pip', 'uv']
+
+_MIN_REPORT_PIP_VERSION: Final[Version]
+_report_support: dict[str, bool]
+
+def _get_pip_version(pip_executable: str) -> Version | None: ...
+def _report_path() -> Path: ...
+
+class InstallerOutput(str):
+    report: dict[str, Any]
+    def __new__(cls, output: str, report: dict[str, Any]) -> InstallerOutput: ...
+
+class InstallerBackend:
+    name: ClassVar[_BackendName | None]
+    def install_cmd(self, args: str) -> str: ...
+    def installed_dists(self, install_stdout: str) -> list[str]: ...
+    def installed_versions(self, install_stdout: str) -> list[tuple[str, str]]: ...
+    def list_cmd(self, project: Project) -> str: ...
+    def show_cmd(self, dist_name: str) -> str: ...
+    def supports(self, _onion: Onion) -> bool: ...
+    @staticmethod
+    def parse_list(list_stdout: str) -> list[tuple[str, str]]: ...
+    @staticmethod
+    def parse_show_location(show_stdout: str) -> str | None: ...
+
+class PipBackend(InstallerBackend):
+    name: ClassVar[Literal['pip']]
+    @property
+    def supports_report(self) -> bool: ...
+
+class UvBackend(InstallerBackend):
+    name: ClassVar[Literal['uv']]
+    supported_options: ClassVar[frozenset[str]]
+    executable: str
+    def __init__(self, executable: str) -> None: ...
+    @property
+    def python(self) -> str: ...
+
+def attach_report(install_stdout: str, report_path: Path | None) -> str | InstallerOutput: ...
+def find_uv_executable() -> str | None: ...
+def get_backend(name: _BackendName | None = ...) -> InstallerBackend: ...
+def pip_report(command: str) -> AbstractContextManager[tuple[str, Path | None]]: ...
+def select_backend(onion: Onion) -> InstallerBackend: ...
+
+pip_backend: Final[PipBackend]
@@ -7,7 +7,13 @@ slightly modified to parse arguments supplied via Onion comments.
 """
 
 
-__all__ = ['EditableAction', 'OnionParser', 'pip_parser', 'SubtractAction']
+__all__ = [
+    'EditableAction',
+    'OnionParser',
+    'parse_pip_spec_only',
+    'pip_parser',
+    'SubtractAction'
+]
 
 
 import sys
@@ -241,6 +247,37 @@ class SubtractAction(Action):
         setattr(namespace, self.dest, curr_count - 1)
 
 
+def parse_pip_spec_only(args):
+    """
+    Quickly parse `pip` Onion comment arguments that contain no options.
+
+    The vast majority of Onion comments consist of a single requirement
+    specifier (e.g., `# pip: foo==1.2.3`) with no additional options.
+    For these, building an `argparse.Namespace` through `pip_parser`,
+    which has dozens of registered options, is unnecessarily expensive.
+    This function handles that case directly and signals (by returning
+    `None`) that all other cases should be handed off to `pip_parser`.
+
+    Parameters
+    ----------
+    args : list of str
+        Command line arguments for `pip install` specified in an Onion
+        comment, split into a list of strings.
+
+    Returns
+    -------
+    dict or None
+        If `args` consists of a single requirement specifier, the same
+        `{arg: value}` mapping `vars(pip_parser.parse_args(args))` would
+        produce. Otherwise, `None`.
+    """
+    if len(args) != 1 or args[0].startswith('-'):
+        return None
+    # key order must match the Namespace populated by pip_parser, since
+    # the dict's repr is inserted into the transformed cell
+    return {'editable': False, 'spec': args[0]}
+
+
 # does not include usage for `pip install [options] -r
 # <requirements file> [package-index-options] ...` since it's not
 # relevant to `davos` usage
@@ -2,7 +2,7 @@ from argparse import Action, ArgumentParser, Namespace
 from collections.abc import Sequence
 from typing import Final, Literal, NoReturn
 
-__all__ = list[Literal['EditableAction', 'OnionParser', 'pip_parser', 'SubtractAction']]
+__all__ = list[Literal['EditableAction', 'OnionParser', 'parse_pip_spec_only', 'pip_parser', 'SubtractAction']]
 
 class OnionParser(ArgumentParser):
     _args: str | None
@@ -21,5 +21,7 @@ class SubtractAction(Action):
     def __call__(self, parser: ArgumentParser, namespace: Namespace, values: None,
                  option_string: str | None = ...) -> None: ...
 
+def parse_pip_spec_only(args: Sequence[str]) -> dict[str, bool | str] | None: ...
+
 _pip_install_usage: list[str]
 pip_parser: Final[OnionParser]
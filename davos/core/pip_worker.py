@@ -0,0 +1,403 @@
+"""
+Persistent `pip` worker processes.
+
+Each `pip` command `davos` runs normally starts a new Python interpreter
+that has to import `pip` before it can do anything, which typically
+takes 0.5-1.5 seconds. When `davos.pip_worker` is enabled, `pip`
+commands are instead sent to a long-lived helper process that has
+already imported `pip` and the modules for its `install`, `list`, and
+`show` commands.
+
+The worker runs each command in a child process forked from itself.
+`pip` caches information about the environment (e.g., the set of
+installed distributions) that would go stale once a command installs
+something, so forking ensures every command starts from the same
+freshly imported state while skipping the import cost. A separate
+worker is started for each combination of `pip` executable and
+environment variables set by the command (e.g., `PYTHONUSERBASE` for
+commands that install into a `davos` project), since `pip` determines
+some install locations when it's imported.
+
+Output from each command is streamed back to the main process over a
+pipe and written to `sys.stdout` line-by-line, so it can be displayed
+live and/or captured just like the output of other shell commands (see
+`davos.core.core.run_shell_command`). Workers exit when the main
+process does, either via an `atexit` handler or, if the main process
+is killed, when their input pipe is closed.
+
+Commands that use shell features (pipes, redirects, variable expansion,
+etc.) or aren't run with the configured `pip` executable always run in
+a regular subprocess, as do all commands on platforms without
+`os.fork()`.
+"""
+
+
+__all__ = [
+    'get_pip_worker',
+    'PipWorker',
+    'run_in_pip_worker',
+    'shutdown_pip_workers'
+]
+
+
+import atexit
+import json
+import os
+import re
+import secrets
+import shlex
+import signal
+import sys
+from subprocess import CalledProcessError, PIPE, Popen, STDOUT, TimeoutExpired
+
+from davos import config
+
+
+# source code for the worker process. Kept compatible with older
+# versions of Python, since the pip executable may belong to a
+# different environment than the one running davos
+_WORKER_SOURCE = '''\
+import json
+import os
+import sys
+
+if sys.path and sys.path[0] == '':
+    # don't let modules in the working directory shadow pip's imports
+    del sys.path[0]
+
+# merge stderr into stdout, as with other shell commands davos runs
+os.dup2(1, 2)
+
+from pip._internal.cli.main import main
+from pip._internal.commands import create_command
+for command_name in ('install', 'list', 'show'):
+    create_command(command_name)
+
+marker = sys.argv[1]
+sys.stdout.write(marker + ' ready\\n')
+sys.stdout.flush()
+while True:
+    request = sys.stdin.readline()
+    if not request:
+        break
+    request = json.loads(request)
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.chdir(request['cwd'])
+            status = main(request['args'])
+        except SystemExit as e:
+            status = e.code
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status if isinstance(status, int) else 1)
+    _, wait_status = os.waitpid(pid, 0)
+    if os.WIFEXITED(wait_status):
+        returncode = os.WEXITSTATUS(wait_status)
+    else:
+        returncode = -os.WTERMSIG(wait_status)
+    sys.stdout.write(marker + ' ' + str(returncode) + '\\n')
+    sys.stdout.flush()
+'''
+
+# running workers, keyed by (interpreter command, environment variables)
+_workers = {}
+# interpreters that run pip executables, keyed by executable
+_interpreters = {}
+
+
+class PipWorker:
+    """
+    A long-lived process that runs `pip` commands.
+
+    The worker imports `pip` once when started and then runs each
+    command in a forked child process. See the module docstring for
+    details.
+    """
+
+    def __init__(self, interpreter, env=None):
+        """
+        Parameters
+        ----------
+        interpreter : list of str
+            The command used to run the Python interpreter `pip` is
+            installed for (e.g., `['/usr/bin/python3']`).
+        env : dict, optional
+            Additional environment variables to set for the worker.
+
+        Raises
+        ------
+        OSError
+            If the worker process fails to start (e.g., `pip` can't be
+            imported by `interpreter`).
+        """
+        self.interpreter = interpreter
+        self.env = {} if env is None else env
+        self._marker = f'__davos_pip_worker_{secrets.token_hex(8)}__'
+        worker_env = dict(os.environ, **self.env, PYTHONIOENCODING='utf-8')
+        self._process = Popen(    # pylint: disable=consider-using-with
+            [*interpreter, '-u', '-c', _WORKER_SOURCE, self._marker],
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=STDOUT,
+            env=worker_env,
+            encoding='utf-8',
+            errors='replace',
+            # run in a new process group so interrupting the main
+            # process doesn't interrupt the worker and so the worker
+            # can be killed along with any child process
+            start_new_session=True
+        )
+        startup_output = []
+        for line in self._process.stdout:
+            if line.startswith(self._marker):
+                break
+            startup_output.append(line)
+        else:
+            self.shutdown()
+            raise OSError(
+                f"failed to start pip worker with {' '.join(interpreter)!r}:"
+                f"\n{''.join(startup_output)}"
+            )
+
+    @property
+    def alive(self):
+        """True if the worker process is running; otherwise, False"""
+        return self._process.poll() is None
+
+    def run(self, args):
+        """
+        Run a `pip` command in the worker.
+
+        The command's output is written to `sys.stdout` as it's
+        produced.
+
+        Parameters
+        ----------
+        args : list of str
+            Arguments to the `pip` command (e.g., `['install',
+            'numpy']`).
+
+        Returns
+        -------
+        int
+            The command's exit status.
+        """
+        request = json.dumps({'args': args, 'cwd': os.getcwd()})
+        try:
+            self._process.stdin.write(f'{request}\n')
+            self._process.stdin.flush()
+            for line in self._process.stdout:
+                output, marker, status = line.partition(self._marker)
+                if output:
+                    sys.stdout.write(output)
+                if marker:
+                    return int(status)
+        except BaseException:
+            # e.g., KeyboardInterrupt while command is running. The
+            # worker can't be reused if its output wasn't read fully
+            self.shutdown(timeout=0)
+            raise
+        # worker exited unexpectedly
+        self.shutdown()
+        raise OSError("pip worker exited unexpectedly")
+
+    def shutdown(self, timeout=5):
+        """
+        Stop the worker process.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the worker to exit on its own before
+            killing it and any command it's running (default: `5`).
+        """
+        process = self._process
+        if process.poll() is None:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=timeout)
+            except TimeoutExpired:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                process.wait()
+        process.stdout.close()
+        if not process.stdin.closed:
+            process.stdin.close()
+
+
+def _find_interpreter(pip_exe_tokens):
+    """
+    Get the command for the Python interpreter that runs a `pip`
+    executable.
+
+    Parameters
+    ----------
+    pip_exe_tokens : tuple of str
+        The (shell-split) `pip` executable (e.g., `('/usr/bin/pip',)`
+        or `('/usr/bin/python3', '-m', 'pip')`).
+
+    Returns
+    -------
+    list of str or None
+        The interpreter command, or `None` if it couldn't be determined.
+    """
+    if len(pip_exe_tokens) > 2 and pip_exe_tokens[-2:] == ('-m', 'pip'):
+        return list(pip_exe_tokens[:-2])
+    if len(pip_exe_tokens) != 1:
+        return None
+    try:
+        with open(pip_exe_tokens[0], 'rb') as f:
+            header = f.read(1024).decode('utf-8', errors='replace')
+    except OSError:
+        return None
+    lines = header.splitlines()
+    if not lines or not lines[0].startswith('#!'):
+        return None
+    if lines[0].strip() == '#!/bin/sh' and len(lines) > 1:
+        # pip's launcher for interpreter paths too long for a shebang:
+        #   #!/bin/sh
+        #   '''exec' "/path/to/python" "$0" "$@"
+        match = re.match(r"'''exec' (.+) \"\$0\" \"\$@\"", lines[1])
+        if match is None:
+            return None
+        return shlex.split(match.group(1))
+    return shlex.split(lines[0][2:])
+
+
+def _split_pip_command(command):
+    """
+    Split a shell command into environment variables, the `pip`
+    executable, and `pip` arguments.
+
+    Parameters
+    ----------
+    command : str
+        The shell command.
+
+    Returns
+    -------
+    tuple or None
+        A tuple of `(env, pip_exe_tokens, args)`, or `None` if the
+        command doesn't run the configured `pip` executable or uses
+        shell features a worker can't replicate.
+    """
+    if any(char in command for char in '$`\n'):
+        # variable expansion, command substitution, multiple lines
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        # unbalanced quotes
+        return None
+    if any(
+            set(token) <= set('();<>|&') or token.startswith('~')
+            for token in tokens
+    ):
+        # command separators, pipes, redirects, tilde expansion, etc.
+        return None
+    env = {}
+    while tokens and re.match(r'[A-Za-z_]\w*=', tokens[0]):
+        name, _, value = tokens.pop(0).partition('=')
+        env[name] = value
+    pip_exe_tokens = tuple(shlex.split(config._pip_executable))
+    if tuple(tokens[:len(pip_exe_tokens)]) != pip_exe_tokens:
+        return None
+    return env, pip_exe_tokens, tokens[len(pip_exe_tokens):]
+
+
+def get_pip_worker(pip_exe_tokens, env):
+    """
+    Get a running worker for a `pip` executable, starting one if
+    needed.
+
+    Parameters
+    ----------
+    pip_exe_tokens : tuple of str
+        The (shell-split) `pip` executable.
+    env : dict
+        Environment variables set for the `pip` command.
+
+    Returns
+    -------
+    PipWorker or None
+        The worker, or `None` if one can't be started for the `pip`
+        executable.
+    """
+    try:
+        interpreter = _interpreters[pip_exe_tokens]
+    except KeyError:
+        interpreter = _find_interpreter(pip_exe_tokens)
+        _interpreters[pip_exe_tokens] = interpreter
+    if interpreter is None:
+        return None
+    worker_key = (tuple(interpreter), tuple(sorted(env.items())))
+    worker = _workers.get(worker_key)
+    if worker is not None and worker.alive:
+        return worker
+    try:
+        worker = PipWorker(interpreter, env)
+    except OSError:
+        # don't keep trying to start a worker for this interpreter
+        _interpreters[pip_exe_tokens] = None
+        return None
+    _workers[worker_key] = worker
+    return worker
+
+
+def run_in_pip_worker(command):
+    """
+    Run a shell command in a `pip` worker, if possible.
+
+    Parameters
+    ----------
+    command : str
+        The shell command to run.
+
+    Returns
+    -------
+    bool
+        `True` if the command was run in a worker. `False` if it wasn't
+        a `pip` command a worker can run, in which case it should be
+        run normally.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the command returns a non-zero exit status.
+    """
+    if not hasattr(os, 'fork'):
+        return False
+    split_command = _split_pip_command(command)
+    if split_command is None:
+        return False
+    env, pip_exe_tokens, args = split_command
+    worker = get_pip_worker(pip_exe_tokens, env)
+    if worker is None:
+        return False
+    returncode = worker.run(args)
+    if returncode != 0:
+        raise CalledProcessError(returncode=returncode, cmd=command)
+    return True
+
+
+@atexit.register
+def shutdown_pip_workers():
+    """Stop all running `pip` workers."""
+    while _workers:
+        _, worker = _workers.popitem()
+        worker.shutdown()
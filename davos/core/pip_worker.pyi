@@ -0,0 +1,25 @@
+from subprocess import Popen
+from typing import Final, Literal
+
+__all__ = list[Literal['get_pip_worker', 'PipWorker', 'run_in_pip_worker', 'shutdown_pip_workers']]
+
+_WORKER_SOURCE: Final[str]
+_interpreters: dict[tuple[str, ...], list[str] | None]
+_workers: dict[tuple[tuple[str, ...], tuple[tuple[str, str], ...]], PipWorker]
+
+class PipWorker:
+    _marker: str
+    _process: Popen[str]
+    env: dict[str, str]
+    interpreter: list[str]
+    def __init__(self, interpreter: list[str], env: dict[str, str] | None = ...) -> None: ...
+    @property
+    def alive(self) -> bool: ...
+    def run(self, args: list[str]) -> int: ...
+    def shutdown(self, timeout: float = ...) -> None: ...
+
+def _find_interpreter(pip_exe_tokens: tuple[str, ...]) -> list[str] | None: ...
+def _split_pip_command(command: str) -> tuple[dict[str, str], tuple[str, ...], list[str]] | None: ...
+def get_pip_worker(pip_exe_tokens: tuple[str, ...], env: dict[str, str]) -> PipWorker | None: ...
+def run_in_pip_worker(command: str) -> bool: ...
+def shutdown_pip_workers() -> None: ...
@@ -0,0 +1,397 @@
+"""
+Install plans resolved ahead of time and cached across sessions.
+
+Normally, `pip` resolves a smuggled package's dependencies while
+installing it, so nothing is known about what an install will do until
+it's done. When `davos.plan_installs` is enabled, `davos` first runs
+the install command with `--dry-run --report`, which resolves the full
+set of distributions the command would install without installing
+anything, and records the result as an `InstallPlan`. The package is
+then installed by pinning exactly that set with `--no-deps`, so `pip`
+doesn't need to resolve dependencies again. If `davos.confirm_install`
+is enabled, the confirmation prompt lists every distribution that will
+be installed before the user decides.
+
+Plans are cached (in `DAVOS_CONFIG_DIR`), keyed by the smuggled
+package's onion comment and a fingerprint of the environment it would
+be installed into: the Python interpreter, `pip` executable, active
+project, wheelhouse options, and the modification times of the
+directories on `sys.path` (see `davos.core.core.search_path_mtimes()`).
+Rerunning a `smuggle` statement, or running it in another session with
+the same environment, reuses the cached plan rather than resolving it
+again. Since new versions may be released in the meantime, plans expire
+after a day.
+
+Only packages whose onion comments pass no installer options other
+than a requirement specifier (see `Onion.is_batchable`) are planned,
+and only when using `pip>=22.2` (the first version that supports
+`--report`).
+"""
+
+
+__all__ = ['get_install_plan', 'InstallPlan', 'plan_cache', 'PlanCache']
+
+
+import hashlib
+import json
+import os
+import time
+from subprocess import CalledProcessError
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from davos.core.fileutils import write_atomic
+from davos.core.installers import pip_backend
+from davos.core.wheelhouse import wheelhouse_args
+
+
+# maximum age (in seconds) of a cached plan
+_MAX_PLAN_AGE = 24 * 60 * 60
+
+
+class InstallPlan:
+    """
+    The distributions an install command would install.
+
+    Attributes
+    ----------
+    dists : list of dict
+        One item per distribution, with the keys `'name'`, `'version'`,
+        `'requested'` (whether the distribution was requested directly,
+        rather than as a dependency) and `'size'` (the size of its
+        archive in bytes, or `None` if it's not a local file).
+    created : float
+        The time at which the plan was resolved, in seconds since the
+        epoch.
+    """
+
+    def __init__(self, dists, created=None):
+        """
+        Parameters
+        ----------
+        dists : list of dict
+            The distributions to be installed (see `InstallPlan.dists`).
+        created : float, optional
+            The time at which the plan was resolved. Defaults to the
+            current time.
+        """
+        self.dists = dists
+        self.created = time.time() if created is None else created
+
+    @classmethod
+    def from_report(cls, report):
+        """
+        Create a plan from the report written by `pip install --report`.
+
+        Parameters
+        ----------
+        report : dict
+            The parsed JSON report (see
+            https://pip.pypa.io/en/stable/reference/installation-report/).
+
+        Returns
+        -------
+        InstallPlan or None
+            The plan, or `None` if any distribution would be installed
+            from a direct URL (e.g., a VCS repository) and so can't be
+            pinned by version.
+        """
+        dists = []
+        for item in report.get('install', []):
+            if item.get('is_direct'):
+                return None
+            url = item.get('download_info', {}).get('url', '')
+            dists.append({
+                'name': item['metadata']['name'],
+                'version': item['metadata']['version'],
+                'requested': item.get('requested', False),
+                'size': _local_file_size(url)
+            })
+        return cls(dists)
+
+    @property
+    def download_size(self):
+        """
+        The total size in bytes of the distributions' local archives.
+
+        Archives downloaded from a package index aren't included, since
+        `pip`'s report doesn't record their size.
+        """
+        return sum(dist['size'] for dist in self.dists
+                   if dist['size'] is not None)
+
+    @property
+    def is_expired(self):
+        """Whether the plan is too old to reuse."""
+        return time.time() - self.created > _MAX_PLAN_AGE
+
+    def requirements(self):
+        """
+        Format requirement specifiers that pin each distribution.
+
+        Returns
+        -------
+        list of str
+            A `<name>==<version>` requirement specifier for each
+            distribution in the plan.
+        """
+        return [f"{dist['name']}=={dist['version']}" for dist in self.dists]
+
+    def summary(self):
+        """
+        Describe the plan for display.
+
+        Returns
+        -------
+        str
+            A multi-line description listing each distribution (and
+            its size, if known), plus the total download size.
+        """
+        lines = ["the following distributions will be installed:"]
+        n_remote = 0
+        for dist, requirement in zip(self.dists, self.requirements()):
+            if dist['size'] is None:
+                n_remote += 1
+                lines.append(f"\t{requirement}")
+            else:
+                size_kib = dist['size'] / 1024
+                lines.append(f"\t{requirement} ({size_kib:,.1f} KiB)")
+        total = f"total size: {self.download_size / 1024:,.1f} KiB"
+        if n_remote:
+            total += f" (plus {n_remote} to download from a package index)"
+        lines.append(total)
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """
+        Convert the plan to a JSON-serializable `dict`.
+
+        Returns
+        -------
+        dict
+            The plan's `dists` and `created` attributes.
+        """
+        return {'dists': self.dists, 'created': self.created}
+
+
+class PlanCache:
+    """
+    Persistent record of resolved install plans.
+
+    Plans are stored in a single file in `DAVOS_CONFIG_DIR`, keyed by
+    a hash of the smuggled package's onion comment and the current
+    environment's fingerprint. Any change to the environment that could
+    affect dependency resolution (e.g., installing or removing a
+    distribution) changes the fingerprint, so plans resolved before it
+    are no longer found.
+    """
+
+    def __init__(self):
+        # {key: plan_dict}, loaded from the cache file on first access
+        self._plans = None
+
+    @property
+    def cache_path(self):
+        """Path to the file where the cache is stored"""
+        # imported here to avoid a circular import
+        from davos.core.project import DAVOS_CONFIG_DIR
+        return DAVOS_CONFIG_DIR.joinpath('plan-cache.json')
+
+    @staticmethod
+    def _key(onion):
+        # imported here to avoid a circular import
+        from davos.core.core import environment_key, search_path_mtimes
+        fingerprint = json.dumps([
+            onion.import_name,
+            onion.cache_key,
+            environment_key(),
+            wheelhouse_args(),
+            search_path_mtimes()
+        ])
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def _load(self):
+        try:
+            with self.cache_path.open(encoding='utf-8') as f:
+                plans = json.load(f)
+        except (OSError, ValueError):
+            # cache file doesn't exist yet or is corrupted
+            plans = {}
+        if not isinstance(plans, dict):
+            plans = {}
+        self._plans = plans
+        return plans
+
+    def _write(self, plans):
+        cache_path = self.cache_path
+        try:
+            write_atomic(cache_path, json.dumps(plans))
+        except OSError:
+            # caching is an optimization; don't fail the smuggle
+            pass
+
+    def add(self, onion, plan):
+        """
+        Record the plan for installing a package.
+
+        Also records the key under which the plan is cached as
+        `onion.plan_key` (see `PlanCache.discard()`).
+
+        Parameters
+        ----------
+        onion : Onion
+            The `Onion` for the package's `smuggle` statement.
+        plan : InstallPlan
+            The plan resolved for the package.
+        """
+        # re-read the cache file so plans added by other sessions since
+        # it was loaded aren't overwritten
+        plans = self._load()
+        for key, plan_dict in list(plans.items()):
+            # drop expired plans so the file doesn't grow indefinitely
+            if time.time() - plan_dict.get('created', 0) > _MAX_PLAN_AGE:
+                del plans[key]
+        onion.plan_key = self._key(onion)
+        plans[onion.plan_key] = plan.to_dict()
+        self._write(plans)
+
+    def clear(self):
+        """Remove all plans from the cache."""
+        self._plans = {}
+        try:
+            self.cache_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def discard(self, onion):
+        """
+        Remove the plan for installing a package, if there is one.
+
+        Removes the plan under the key recorded when it was cached or
+        found (`onion.plan_key`), rather than the current environment's
+        key, which changes if a failed install modified the environment
+        before failing.
+
+        Parameters
+        ----------
+        onion : Onion
+            The `Onion` for the package's `smuggle` statement.
+        """
+        if onion.plan_key is None:
+            return
+        plans = self._load()
+        if plans.pop(onion.plan_key, None) is not None:
+            self._write(plans)
+
+    def get(self, onion):
+        """
+        Get the cached plan for installing a package.
+
+        Parameters
+        ----------
+        onion : Onion
+            The `Onion` for the package's `smuggle` statement.
+
+        Returns
+        -------
+        InstallPlan or None
+            The plan resolved for the package in the current
+            environment, or `None` if there is none or it has expired.
+            If a plan is found, the key under which it's cached is
+            recorded as `onion.plan_key`.
+        """
+        key = self._key(onion)
+        plans = self._plans
+        if plans is None or key not in plans:
+            # the plan may have been added by another session
+            plans = self._load()
+        plan_dict = plans.get(key)
+        try:
+            plan = InstallPlan(plan_dict['dists'], plan_dict['created'])
+        except (KeyError, TypeError):
+            return None
+        if plan.is_expired:
+            return None
+        onion.plan_key = key
+        return plan
+
+
+plan_cache = PlanCache()
+
+
+def _local_file_size(url):
+    """
+    Get the size of a file given by a `file://` URL.
+
+    Parameters
+    ----------
+    url : str
+        The URL.
+
+    Returns
+    -------
+    int or None
+        The file's size in bytes, or `None` if `url` doesn't refer to
+        an existing local file.
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.scheme != 'file':
+        return None
+    try:
+        return os.path.getsize(url2pathname(parsed_url.path))
+    except OSError:
+        return None
+
+
+def get_install_plan(onion, resolve=True):
+    """
+    Get the plan for installing a smuggled package.
+
+    Returns the cached plan for the package in the current environment
+    if there is one. Otherwise, resolves the plan by running the
+    package's install command with `--dry-run --report` and caches it.
+
+    Parameters
+    ----------
+    onion : Onion
+        The `Onion` for the package's `smuggle` statement.
+    resolve : bool, optional
+        Whether to resolve the plan if it isn't cached (default:
+        `True`). `asmuggle()` passes `False`, since the dry run would
+        block the running event loop.
+
+    Returns
+    -------
+    InstallPlan or None
+        The plan, or `None` if the package can't be planned: its onion
+        comment passes installer options, the `pip` executable doesn't
+        support `--report`, the dry run fails (in which case the error
+        is shown by the actual install), it would install nothing, it
+        would install from a direct URL, or it isn't cached and
+        `resolve` is `False`.
+    """
+    if not (
+            onion.is_batchable and
+            onion.backend is pip_backend and
+            pip_backend.supports_report
+    ):
+        return None
+    plan = plan_cache.get(onion)
+    if plan is not None or not resolve:
+        return plan
+    # imported here to avoid a circular import
+    from davos.core.core import run_shell_command
+    args = onion.args_str or onion.install_name
+    command = pip_backend.install_cmd(f'--dry-run --quiet {args}')
+    try:
+        stdout = run_shell_command(command, live_stdout=False)
+    except CalledProcessError:
+        return None
+    report = getattr(stdout, 'report', None)
+    if report is None:
+        return None
+    plan = InstallPlan.from_report(report)
+    if plan is None or not plan.dists:
+        return None
+    plan_cache.add(onion, plan)
+    return plan
@@ -0,0 +1,50 @@
+from pathlib import PosixPath
+from typing import Any, Final, Literal, TypedDict
+from davos.core.core import Onion
+
+__all__ = list[Literal['get_install_plan', 'InstallPlan', 'plan_cache', 'PlanCache']]
+
+_MAX_PLAN_AGE: Final[int]
+
+class _PlannedDist(TypedDict):
+    name: str
+    version: str
+    requested: bool
+    size: int | None
+
+class _PlanDict(TypedDict):
+    dists: list[_PlannedDist]
+    created: float
+
+class InstallPlan:
+    created: float
+    dists: list[_PlannedDist]
+    def __init__(self, dists: list[_PlannedDist], created: float | None = ...) -> None: ...
+    @classmethod
+    def from_report(cls, report: dict[str, Any]) -> InstallPlan | None: ...
+    @property
+    def download_size(self) -> int: ...
+    @property
+    def is_expired(self) -> bool: ...
+    def requirements(self) -> list[str]: ...
+    def summary(self) -> str: ...
+    def to_dict(self) -> _PlanDict: ...
+
+class PlanCache:
+    _plans: dict[str, _PlanDict] | None
+    def __init__(self) -> None: ...
+    @property
+    def cache_path(self) -> PosixPath: ...
+    @staticmethod
+    def _key(onion: Onion) -> str: ...
+    def _load(self) -> dict[str, _PlanDict]: ...
+    def _write(self, plans: dict[str, _PlanDict]) -> None: ...
+    def add(self, onion: Onion, plan: InstallPlan) -> None: ...
+    def clear(self) -> None: ...
+    def discard(self, onion: Onion) -> None: ...
+    def get(self, onion: Onion) -> InstallPlan | None: ...
+
+plan_cache: PlanCache
+
+def _local_file_size(url: str) -> int | None: ...
+def get_install_plan(onion: Onion, resolve: bool = ...) -> InstallPlan | None: ...
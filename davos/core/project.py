@@ -45,6 +45,7 @@ notebook's path, notebook-agnostic projects can be given arbitrary names
 
 import atexit
 import errno
+import hashlib
 import json
 import os
 import shutil
@@ -57,10 +58,15 @@ from urllib.parse import parse_qs, unquote, urlencode, urljoin, urlparse
 import ipykernel
 from IPython.display import clear_output
 from IPython.terminal.interactiveshell import TerminalInteractiveShell
+if sys.version_info < (3, 8):
+    import importlib_metadata as metadata
+else:
+    from importlib import metadata
 
 from davos import config
 from davos.core.core import prompt_input, run_shell_command
 from davos.core.exceptions import DavosProjectError
+from davos.core.installers import get_backend
 
 
 __all__ = [
@@ -76,6 +82,7 @@ __all__ = [
 
 DAVOS_CONFIG_DIR = Path.home().joinpath('.davos')
 DAVOS_PROJECT_DIR = DAVOS_CONFIG_DIR.joinpath('projects')
+LOCKFILE_NAME = 'requirements.lock'
 PATHSEP = os.sep               # '/' for Unix, '\' for Windows
 PATHSEP_REPLACEMENT = "___"    # safe replacement for os.sep in dir name
 SITE_PACKAGES_SUFFIX = PATHSEP.join((
@@ -132,6 +139,7 @@ class Project(metaclass=ProjectChecker):
         self.safe_name = _filepath_to_safename(name)
         self.project_dir = DAVOS_PROJECT_DIR.joinpath(self.safe_name)
         self.site_packages_dir = self.project_dir.joinpath(SITE_PACKAGES_SUFFIX)
+        self.lockfile = self.project_dir.joinpath(LOCKFILE_NAME)
         # eagerly create project dir since it's low-cost
         self.project_dir.mkdir(parents=False, exist_ok=True)
         # register atexit hook to remove project dir if empty
@@ -141,6 +149,14 @@ class Project(metaclass=ProjectChecker):
         # cache of installed packages as of self._site_packages_mtime
         # format: [(name, version), ...]
         self._installed_packages = []
+        # last modified time of self.lockfile when its packages were
+        # last installed
+        self._lockfile_mtime = -1
+        # records the hash of the lockfile whose packages were last
+        # installed, so they aren't reinstalled in later sessions
+        self._lockfile_stamp = self.project_dir.joinpath(
+            f'.{LOCKFILE_NAME}.installed'
+        )
 
     def __del__(self):
         """
@@ -199,29 +215,95 @@ class Project(metaclass=ProjectChecker):
             self._installed_packages = []
             return
         if site_pkgs_mtime != self._site_packages_mtime:
-            cmd = (
-                f'{config.pip_executable} list '
-                '--disable-pip-version-check '
-                f'--path {self.site_packages_dir} '
-                f'--format json'
-            )
-            pip_list_stdout = run_shell_command(cmd, live_stdout=False)
-            try:
-                pip_list_json = json.loads(pip_list_stdout)
-            except json.JSONDecodeError:
-                if pip_list_stdout == '':
-                    # no packages installed
-                    self._installed_packages = []
-                else:
-                    raise
-            else:
-                self._installed_packages = [tuple(pkg.values()) for pkg in pip_list_json]
+            backend = get_backend()
+            list_stdout = run_shell_command(backend.list_cmd(self),
+                                            live_stdout=False)
+            self._installed_packages = backend.parse_list(list_stdout)
             self._site_packages_mtime = site_pkgs_mtime
 
+    def _lockfile_hash(self):
+        """Return the SHA-256 hash of the lockfile's contents."""
+        return hashlib.sha256(self.lockfile.read_bytes()).hexdigest()
+
+    def _lockfile_installed(self):
+        """
+        Check whether the lockfile's packages have been installed.
+
+        Returns `True` if the lockfile's current contents were installed
+        (or written by `Project.lock()`) in this or a previous session.
+        Packages upgraded in the project since then aren't downgraded by
+        reinstalling it.
+        """
+        try:
+            stamp = self._lockfile_stamp.read_text(encoding='utf-8')
+            return stamp == self._lockfile_hash()
+        except OSError:
+            # no record of the lockfile being installed, or no lockfile
+            return False
+
+    def _record_lockfile_installed(self):
+        """Record that the lockfile's packages have been installed."""
+        try:
+            self._lockfile_stamp.write_text(self._lockfile_hash(),
+                                            encoding='utf-8')
+        except OSError:
+            # at worst, the lockfile is reinstalled in the next session
+            pass
+
     def freeze(self):
         """Return pip-freeze-like output for the Project."""
         return '\n'.join('=='.join(pkg) for pkg in self.installed_packages)
 
+    def lock(self):
+        """
+        Write a lockfile pinning all packages installed in the project.
+
+        Records the exact version (or, for packages installed from a VCS
+        repository, URL, or local path, the exact source) of every
+        distribution in the project's package directory, including
+        dependencies of smuggled packages, in a pip requirements file
+        (`self.lockfile`) inside the project directory. While a lockfile
+        exists, any packages missing from the project are installed from
+        it in a single `pip install --no-deps` command the first time a
+        `smuggle` statement needs to install something, so pip doesn't
+        have to resolve dependencies. This makes recreating a project
+        (e.g., on a new machine, by copying the lockfile into the new
+        project's directory) substantially faster.
+
+        Returns
+        -------
+        pathlib.Path
+            The path to the lockfile.
+
+        Raises
+        ------
+        DavosProjectError
+            If no packages are installed in the project.
+
+        Notes
+        -----
+        The lockfile does not include distribution hashes, since these
+        are hashes of the original wheel or source archive files, which
+        aren't kept after installation.
+        """
+        dists = metadata.distributions(path=[str(self.site_packages_dir)])
+        requirements = [
+            _dist_to_requirement(dist) for dist in
+            sorted(dists, key=lambda dist: dist.metadata['Name'].lower())
+        ]
+        if not requirements:
+            raise DavosProjectError(
+                f"No packages are installed in {self!r}, so there is nothing "
+                "to lock"
+            )
+        header = f'# lockfile for {self!r}, generated by `Project.lock()`'
+        self.lockfile.write_text('\n'.join((header, *requirements)) + '\n',
+                                 encoding='utf-8')
+        # the lockfile pins the packages already installed, so there's
+        # no need to install them from it
+        self._record_lockfile_installed()
+        return self.lockfile
+
     def remove(self, yes=False):
         """
         Delete the project and all installed packages.
@@ -327,6 +409,7 @@ class Project(metaclass=ProjectChecker):
         # classes' constructors change
         old_installed_pkgs = self._installed_packages
         old_site_pkgs_mtime = self._site_packages_mtime
+        old_lockfile_mtime = self._lockfile_mtime
         # can call type.__call__ directly to bypass metaclass's __call__
         # since we already know the Project's new type
         template_instance = type.__call__(new_project_type, new_project_name)
@@ -334,6 +417,7 @@ class Project(metaclass=ProjectChecker):
         self.__dict__ = template_instance.__dict__
         self._installed_packages = old_installed_pkgs
         self._site_packages_mtime = old_site_pkgs_mtime
+        self._lockfile_mtime = old_lockfile_mtime
         # explicitly delete the temporary new Project instance so its
         # __del__ method is called before this method returns and we
         # can ensure the project directory exists after reload
@@ -417,6 +501,41 @@ def _dir_is_empty(path):
     return True
 
 
+def _dist_to_requirement(dist):
+    """
+    Format a pip requirement that reinstalls an installed distribution.
+
+    Parameters
+    ----------
+    dist : importlib.metadata.Distribution
+        The installed distribution.
+
+    Returns
+    -------
+    str
+        A requirement specifier for the distribution's exact version or,
+        if it was installed from a VCS repository, URL, or local path
+        (see PEP 610), its exact source. Editable installs are formatted
+        as `-e <url>`.
+    """
+    name = dist.metadata['Name']
+    direct_url = dist.read_text('direct_url.json')
+    if direct_url is None:
+        # installed from a package index
+        return f'{name}=={dist.version}'
+    direct_url = json.loads(direct_url)
+    url = direct_url['url']
+    if 'vcs_info' in direct_url:
+        vcs_info = direct_url['vcs_info']
+        # pin to the exact commit that was installed
+        url = f"{vcs_info['vcs']}+{url}@{vcs_info['commit_id']}"
+    if 'subdirectory' in direct_url:
+        url = f"{url}#subdirectory={direct_url['subdirectory']}"
+    if direct_url.get('dir_info', {}).get('editable'):
+        return f'-e {url}'
+    return f'{name} @ {url}'
+
+
 def _filepath_to_safename(filepath):
     """
     Convert a filepath to a project name in "safe" format.
@@ -850,9 +969,12 @@ def use_default_project():
     `davos.project` to it. In IPython notebooks, this is a
     notebook-specific project named for the notebook's filepath. In an
     IPython shell, this is a project named "ipython-shell", which is
-    shared by all IPython shell instances.
+    shared by all IPython shell instances. In "plain" Python, this is a
+    project named "python-scripts", which is shared by all scripts.
     """
-    if isinstance(config._ipython_shell, TerminalInteractiveShell):
+    if config._ipython_shell is None:
+        proj_name = "python-scripts"
+    elif isinstance(config._ipython_shell, TerminalInteractiveShell):
         proj_name = "ipython-shell"
     else:
         proj_name = get_notebook_path()
@@ -1,3 +1,4 @@
+from importlib.metadata import Distribution
 from pathlib import PosixPath
 from types import NotImplementedType
 from typing import Any, Final, Literal, NoReturn, overload, TypeVar
@@ -7,6 +8,7 @@ __all__ = list[Literal['DAVOS_CONFIG_DIR', 'DAVOS_PROJECT_DIR', 'Project', 'get_
 
 DAVOS_CONFIG_DIR: Final[PosixPath]
 DAVOS_PROJECT_DIR: Final[PosixPath]
+LOCKFILE_NAME: Final[Literal['requirements.lock']]
 PATHSEP: Final[Literal['/', '\\']]
 PATHSEP_REPLACEMENT: Final[Literal['___']]
 SITE_PACKAGES_SUFFIX: Final[str]
@@ -19,7 +21,10 @@ class ProjectChecker(type):
 
 class Project(metaclass=ProjectChecker):
     _installed_packages: _InstalledPkgs
+    _lockfile_mtime: float
+    _lockfile_stamp: PosixPath
     _site_packages_mtime: float
+    lockfile: PosixPath
     name: str
     safe_name: str
     project_dir: PosixPath
@@ -38,7 +43,11 @@ class Project(metaclass=ProjectChecker):
     @property
     def installed_packages(self) -> _InstalledPkgs: ...
     def _refresh_installed_pkgs(self) -> None: ...
+    def _lockfile_hash(self) -> str: ...
+    def _lockfile_installed(self) -> bool: ...
+    def _record_lockfile_installed(self) -> None: ...
     def freeze(self) -> str: ...
+    def lock(self) -> PosixPath: ...
     def remove(self, yes: bool = ...) -> None: ...
     def rename(self, new_name: PosixPath | str) -> None: ...
 
@@ -49,6 +58,7 @@ class AbstractProject(Project):
 class ConcreteProject(Project): ...
 
 def _dir_is_empty(path: PosixPath) -> bool: ...
+def _dist_to_requirement(dist: Distribution) -> str: ...
 def _filepath_to_safename(filepath: str) -> str: ...
 def _get_project_name_type(project_name: PosixPath | str) -> tuple[str, AbstractProject | ConcreteProject]: ...
 def _safename_to_filepath(safename: str) -> str: ...
@@ -6,14 +6,31 @@ notebook cell input and/or output, pre-compiled as `re.Pattern` objects.
 `smuggle_statement_regex` is used to match lines of user code that
 contain `smuggle` statements (and, optionally, Onion comments) and split
 them into their component syntactic elements. `pip_installed_pkgs_regex`
-is used to extract names of just-installed/updated packages from the
-stdout generated by the `pip install` command. davos uses these names to
-check for and reload packages that were previously imported as a
-different version.
+is used to extract names and versions of just-installed/updated
+packages from the stdout generated by the `pip install` command (and
+`uv_installed_pkgs_regex` does the same for the `uv pip install`
+command). davos uses these to check for and reload packages that were
+previously imported as a different version, and to deposit wheels in
+the shared wheelhouse.
+
+Because `smuggle_statement_regex` relies on backtracking, certain
+(pathological) inputs can take time that grows polynomially or worse
+with their length. `smuggle_statement_scanner` is a drop-in replacement
+for it that combines simple, non-backtracking token patterns in a single
+forward pass, and so is guaranteed to run in linear time. It produces
+the same named groups as `smuggle_statement_regex`, and is what `davos`
+uses to parse `smuggle` statements.
 """
 
 
-__all__ = ['pip_installed_pkgs_regex', 'smuggle_statement_regex']
+__all__ = [
+    'pip_installed_pkgs_regex',
+    'smuggle_statement_regex',
+    'smuggle_statement_scanner',
+    'SmuggleStatementMatch',
+    'SmuggleStatementScanner',
+    'uv_installed_pkgs_regex'
+]
 
 
 import re
@@ -32,6 +49,9 @@ _smuggle_subexprs = {
 pip_installed_pkgs_regex = re.compile("^Successfully installed (.*)$",
                                       re.MULTILINE)
 
+# e.g., " + numpy==1.26.4" or " + foo==0.1.0 (from file:///path/to/foo)"
+uv_installed_pkgs_regex = re.compile(r"^ \+ ([^=\s]+)==(\S+)", re.MULTILINE)
+
 # pylint: disable=line-too-long, trailing-whitespace
 smuggle_statement_regex = re.compile((    # noqa: E131
     r'^\s*'                                                               # match only if statement is first non-whitespace chars
@@ -141,3 +161,318 @@ smuggle_statement_regex = re.compile((    # noqa: E131
 # OLON_SEP>(?= *; *(?:smuggle|from)))?(?(FROM_SEMICOLON_SEP)|(?(FROM_ONI
 # ON_1)|(?: *(?=\# *(?:pip|conda) *: *[^#\n ].+?(?= +\#| *\n| *$))(?P<FR
 # OM_ONION>\# *(?:pip|conda) *: *[^#\n ].+?(?= +\#| *\n| *$)))?))))
+
+
+class SmuggleStatementMatch:
+    """
+    The result of a successful `SmuggleStatementScanner.match()` call.
+
+    Provides the subset of the `re.Match` interface `davos` uses, with
+    the same named groups as a match from `smuggle_statement_regex`.
+    """
+
+    def __init__(self, string, end, groups):
+        """
+        Parameters
+        ----------
+        string : str
+            The string that was scanned.
+        end : int
+            The index in `string` of the end of the match.
+        groups : dict
+            Named groups' matched substrings (or `None`, for groups
+            that did not participate in the match).
+        """
+        self.string = string
+        self._end = end
+        self._groups = groups
+
+    def __getitem__(self, group):
+        return self.group(group)
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} object; "
+                f"span={self.span()!r}, match={self.group()!r}>")
+
+    def end(self):
+        """Return the index of the end of the match"""
+        return self._end
+
+    def group(self, group=0):
+        """Return the full match (default) or a named group's match"""
+        if group == 0:
+            return self.string[:self._end]
+        return self._groups[group]
+
+    def groupdict(self):
+        """Return a dict of all named groups' matched substrings"""
+        return dict(self._groups)
+
+    def span(self):
+        """Return a 2-tuple of the match's start and end indices"""
+        return 0, self._end
+
+    @staticmethod
+    def start():
+        """Return the index of the start of the match (always 0)"""
+        return 0
+
+
+class SmuggleStatementScanner:
+    """
+    Linear-time scanner for `smuggle` statements.
+
+    Matches the same syntax and produces the same named groups as
+    `smuggle_statement_regex`, but rather than matching a single large
+    pattern with nested quantifiers, lookaheads, and conditionals (which
+    may backtrack extensively on certain inputs), it consumes the input
+    token by token using simple patterns that cannot backtrack. Every
+    optional construct is attempted at most once at a given position,
+    so the time taken is linear in the length of the input.
+
+    See Also
+    --------
+    smuggle_statement_regex : The regular expression this replaces.
+    """
+
+    group_names = (
+        'FULL_CMD',
+        'SEMICOLON_SEP',
+        'ONION',
+        'OPEN_PARENS',
+        'FROM_ONION_1',
+        'CLOSE_PARENS_FIRSTLINE',
+        'FROM_SEMICOLON_SEP',
+        'FROM_ONION'
+    )
+
+    # none of these can backtrack: each is a single character class
+    # with a greedy quantifier (or a fixed prefix followed by one)
+    _name = re.compile(_name_re)
+    _spaces = re.compile(' *')
+    _whitespace = re.compile(r'\s*')
+    _not_space_or_newline = re.compile('[^ \n]*')
+
+    def match(self, string):
+        """
+        Match a `smuggle` statement at the beginning of `string`.
+
+        Parameters
+        ----------
+        string : str
+            A (logical) line of Python code.
+
+        Returns
+        -------
+        SmuggleStatementMatch or None
+            The match object, if `string` begins with a `smuggle`
+            statement (after any leading whitespace). Otherwise, `None`.
+        """
+        groups = dict.fromkeys(self.group_names)
+        start = self._whitespace.match(string).end()
+        if string.startswith('smuggle', start):
+            end = self._scan_smuggle(string, start + 7, groups)
+        elif string.startswith('from', start):
+            end = self._scan_from(string, start + 4, groups)
+        else:
+            return None
+        if end is None:
+            return None
+        groups['FULL_CMD'] = string[start:end]
+        return SmuggleStatementMatch(string, end, groups)
+
+    def _scan_alias(self, string, pos):
+        # `<spaces>as<spaces><name>`; returns end index or None
+        as_pos = self._spaces.match(string, pos).end()
+        if as_pos == pos or not string.startswith('as', as_pos):
+            return None
+        name_pos = self._spaces.match(string, as_pos + 2).end()
+        if name_pos == as_pos + 2:
+            return None
+        return self._scan_name(string, name_pos)
+
+    def _scan_from(self, string, pos, groups):
+        # `from <qualname> smuggle <names>` or `from <qualname> smuggle
+        # (<names>)`, plus optional semicolon or onion comment
+        pos = self._scan_qualname(string, self._spaces.match(string, pos).end())
+        if pos is None:
+            return None
+        smuggle_pos = self._spaces.match(string, pos).end()
+        if smuggle_pos == pos or not string.startswith('smuggle', smuggle_pos):
+            return None
+        pos = self._spaces.match(string, smuggle_pos + 7).end()
+        if pos == smuggle_pos + 7:
+            return None
+        if string.startswith('(', pos):
+            groups['OPEN_PARENS'] = '('
+            end = self._scan_parens(string, pos + 1, groups)
+        else:
+            end = self._scan_names(string, pos, self._scan_name)
+        if end is None:
+            return None
+        if self._scan_semicolon_sep(string, end):
+            groups['FROM_SEMICOLON_SEP'] = ''
+        elif groups['FROM_ONION_1'] is None:
+            onion_pos = self._spaces.match(string, end).end()
+            onion_end = self._scan_onion(string, onion_pos)
+            if onion_end is not None:
+                groups['FROM_ONION'] = string[onion_pos:onion_end]
+                end = onion_end
+        return end
+
+    def _scan_name(self, string, pos):
+        match = self._name.match(string, pos)
+        return None if match is None else match.end()
+
+    def _scan_names(self, string, pos, scan_name):
+        # one or more comma-separated names, each with an optional alias
+        end = scan_name(string, pos)
+        if end is None:
+            return None
+        end = self._scan_alias(string, end) or end
+        while True:
+            comma_pos = self._spaces.match(string, end).end()
+            if not string.startswith(',', comma_pos):
+                return end
+            name_end = scan_name(string,
+                                 self._spaces.match(string, comma_pos + 1).end())
+            if name_end is None:
+                return end
+            end = self._scan_alias(string, name_end) or name_end
+
+    def _scan_onion(self, string, pos):
+        # `#<spaces><installer><spaces>:<spaces><args>`, where <args>
+        # extends to the first position followed by `<spaces>#`, or by
+        # optional spaces and the end of the line
+        if not string.startswith('#', pos):
+            return None
+        pos = self._spaces.match(string, pos + 1).end()
+        if string.startswith('pip', pos):
+            pos += 3
+        elif string.startswith('conda', pos):
+            pos += 5
+        else:
+            return None
+        pos = self._spaces.match(string, pos).end()
+        if not string.startswith(':', pos):
+            return None
+        pos = self._spaces.match(string, pos + 1).end()
+        # args must be at least 2 characters, the first of which isn't
+        # "#" (or a space, given the preceding match)
+        if len(string) < pos + 2 or '#' in string[pos] or '\n' in string[pos:pos + 2]:
+            return None
+        end = pos + 2
+        str_len = len(string)
+        while True:
+            end = self._not_space_or_newline.match(string, end).end()
+            if end == str_len or string[end] == '\n':
+                return end
+            # string[end] is a space. Every position in this run of
+            # spaces is followed by the same next non-space character,
+            # so check it once rather than at each position
+            run_end = self._spaces.match(string, end).end()
+            if run_end == str_len or string[run_end] in '#\n':
+                return end
+            end = run_end
+
+    def _scan_parens(self, string, pos, groups):
+        # parenthesized (possibly multiline) names, starting just after
+        # the opening parenthesis
+        pos = self._spaces.match(string, pos).end()
+        if self._name.match(string, pos) is not None:
+            pos = self._scan_names(string, pos, self._scan_name)
+            # names on the first line may be followed by spaces and a
+            # trailing comma
+            pos = self._spaces.match(string, pos).end()
+            if string.startswith(',', pos):
+                pos = self._spaces.match(string, pos + 1).end()
+        # the first line must end with an onion comment, another
+        # comment, a newline, or the closing parenthesis
+        if string.startswith('#', pos):
+            onion_end = self._scan_onion(string, pos)
+            if onion_end is not None:
+                groups['FROM_ONION_1'] = string[pos:onion_end]
+                pos = self._spaces.match(string, onion_end).end()
+            if string.startswith('#', pos):
+                pos = self._find_eol(string, pos)
+        elif string.startswith(')', pos):
+            groups['CLOSE_PARENS_FIRSTLINE'] = ')'
+            return pos + 1
+        elif pos != len(string) and string[pos] != '\n':
+            return None
+        # each subsequent line holds names (followed by anything up to
+        # a closing parenthesis or the end of the line), a comment, or
+        # nothing
+        while True:
+            line_start = self._whitespace.match(string, pos).end()
+            if self._name.match(string, line_start) is not None:
+                pos = self._find_eol(string, line_start, ')')
+            elif string.startswith('#', line_start):
+                pos = self._find_eol(string, line_start)
+            else:
+                break
+        if not string.startswith(')', line_start):
+            return None
+        # whitespace between the last line's content and the closing
+        # parenthesis may span lines, but any indentation before the
+        # parenthesis must consist of spaces only
+        whitespace = string[pos:line_start]
+        if whitespace and not whitespace.rstrip(' ').endswith('\n'):
+            return None
+        return line_start + 1
+
+    def _scan_qualname(self, string, pos):
+        # dot-separated names, with optional spaces around the dots
+        end = self._scan_name(string, pos)
+        if end is None:
+            return None
+        while True:
+            dot_pos = self._spaces.match(string, end).end()
+            if not string.startswith('.', dot_pos):
+                return end
+            name_end = self._scan_name(string,
+                                       self._spaces.match(string, dot_pos + 1).end())
+            if name_end is None:
+                return end
+            end = name_end
+
+    def _scan_semicolon_sep(self, string, pos):
+        # whether `pos` is followed by another semicolon-separated
+        # `smuggle` statement
+        pos = self._spaces.match(string, pos).end()
+        if not string.startswith(';', pos):
+            return False
+        pos = self._spaces.match(string, pos + 1).end()
+        return string.startswith(('smuggle', 'from'), pos)
+
+    def _scan_smuggle(self, string, pos, groups):
+        # `smuggle <qualnames>`, plus optional semicolon or onion comment
+        names_pos = self._spaces.match(string, pos).end()
+        if names_pos == pos:
+            return None
+        end = self._scan_names(string, names_pos, self._scan_qualname)
+        if end is None:
+            return None
+        if self._scan_semicolon_sep(string, end):
+            groups['SEMICOLON_SEP'] = ''
+            return end
+        onion_pos = self._spaces.match(string, end).end()
+        onion_end = self._scan_onion(string, onion_pos)
+        if onion_end is not None:
+            groups['ONION'] = string[onion_pos:onion_end]
+            end = onion_end
+        return end
+
+    @staticmethod
+    def _find_eol(string, pos, stop_chars=''):
+        # index of the next newline (or any of `stop_chars`) at or after
+        # `pos`, or the end of the string if there isn't one
+        end = len(string)
+        for char in ('\n', *stop_chars):
+            char_pos = string.find(char, pos, end)
+            if char_pos != -1:
+                end = char_pos
+        return end
+
+
+smuggle_statement_scanner = SmuggleStatementScanner()
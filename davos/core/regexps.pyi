@@ -1,7 +1,12 @@
+from collections.abc import Callable
 from re import Pattern
-from typing import Final, final, Literal, TypedDict
+from typing import ClassVar, Final, final, Literal, TypedDict
 
-__all__ = list[Literal['pip_installed_pkgs_regex', 'smuggle_statement_regex']]
+__all__ = list[Literal['pip_installed_pkgs_regex', 'smuggle_statement_regex', 'smuggle_statement_scanner',
+                      'SmuggleStatementMatch', 'SmuggleStatementScanner', 'uv_installed_pkgs_regex']]
+
+_GroupName = Literal['FULL_CMD', 'SEMICOLON_SEP', 'ONION', 'OPEN_PARENS', 'FROM_ONION_1', 'CLOSE_PARENS_FIRSTLINE',
+                     'FROM_SEMICOLON_SEP', 'FROM_ONION']
 
 _name_re: Final[Literal[r'[a-zA-Z_]\w*']]
 
@@ -15,4 +20,39 @@ class _smuggle_subexprs(TypedDict):
     qualname_re: Literal[r'[a-zA-Z_]\w*(?: *\. *[a-zA-Z_]\w*)*']
 
 pip_installed_pkgs_regex: Final[Pattern[str]]
+uv_installed_pkgs_regex: Final[Pattern[str]]
 smuggle_statement_regex: Final[Pattern[str]]
+
+class SmuggleStatementMatch:
+    string: str
+    _end: int
+    _groups: dict[_GroupName, str | None]
+    def __init__(self, string: str, end: int, groups: dict[_GroupName, str | None]) -> None: ...
+    def __getitem__(self, group: Literal[0] | _GroupName) -> str | None: ...
+    def end(self) -> int: ...
+    def group(self, group: Literal[0] | _GroupName = ...) -> str | None: ...
+    def groupdict(self) -> dict[_GroupName, str | None]: ...
+    def span(self) -> tuple[int, int]: ...
+    @staticmethod
+    def start() -> Literal[0]: ...
+
+class SmuggleStatementScanner:
+    group_names: ClassVar[tuple[_GroupName, ...]]
+    _name: ClassVar[Pattern[str]]
+    _not_space_or_newline: ClassVar[Pattern[str]]
+    _spaces: ClassVar[Pattern[str]]
+    _whitespace: ClassVar[Pattern[str]]
+    def match(self, string: str) -> SmuggleStatementMatch | None: ...
+    def _scan_alias(self, string: str, pos: int) -> int | None: ...
+    def _scan_from(self, string: str, pos: int, groups: dict[_GroupName, str | None]) -> int | None: ...
+    def _scan_name(self, string: str, pos: int) -> int | None: ...
+    def _scan_names(self, string: str, pos: int, scan_name: Callable[[str, int], int | None]) -> int | None: ...
+    def _scan_onion(self, string: str, pos: int) -> int | None: ...
+    def _scan_parens(self, string: str, pos: int, groups: dict[_GroupName, str | None]) -> int | None: ...
+    def _scan_qualname(self, string: str, pos: int) -> int | None: ...
+    def _scan_semicolon_sep(self, string: str, pos: int) -> bool: ...
+    def _scan_smuggle(self, string: str, pos: int, groups: dict[_GroupName, str | None]) -> int | None: ...
+    @staticmethod
+    def _find_eol(string: str, pos: int, stop_chars: str = ...) -> int: ...
+
+smuggle_statement_scanner: Final[SmuggleStatementScanner]
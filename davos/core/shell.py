@@ -0,0 +1,173 @@
+"""
+A high-throughput runner for shell commands whose output is displayed.
+
+Installer commands (especially verbose ones, or those that install
+large dependency trees) can generate megabytes of output, all of which
+`davos` displays and/or captures. Reading that output one line (or, for
+the `pexpect`-based runner `IPython` uses, a few bytes) at a time
+adds substantial overhead. Instead, `stream_command()` reads from the
+command's stdout and stderr pipes in large chunks as soon as either has
+data available, using the `selectors` module to wait on both at once.
+Since neither pipe is ever left unread while the runner waits on the
+other, the command can't deadlock by filling one of them.
+
+The decoded output of both streams is written to `sys.stdout` (as
+`IPython` does), where `davos.core.core.run_shell_command()` captures
+and/or displays it. When `davos.max_output_size` is set, output is
+captured by an `OutputTail`, which keeps only the end of it in memory
+and writes the rest to a log file.
+"""
+
+
+__all__ = ['OutputTail', 'stream_command']
+
+
+import codecs
+import io
+import locale
+import os
+import selectors
+import signal
+import sys
+from collections import deque
+from subprocess import PIPE, Popen
+
+
+# maximum number of bytes read from a pipe at once
+_CHUNK_SIZE = 64 * 1024
+
+
+class OutputTail(io.TextIOBase):
+    """
+    Text stream that keeps only the last part of the data written to it.
+
+    Used in place of a `StringIO` to capture a command's output when
+    the output may be very large. Data is held in memory only until
+    enough newer data has been written to replace it, and is
+    (optionally) also written in full to another stream, such as a log
+    file.
+    """
+
+    def __init__(self, max_size, log_file=None):
+        """
+        Parameters
+        ----------
+        max_size : int
+            The maximum number of characters to keep.
+        log_file : io.TextIOBase, optional
+            A stream to which all data written to the `OutputTail` is
+            also written.
+        """
+        super().__init__()
+        self.max_size = max_size
+        self.log_file = log_file
+        # total number of characters written
+        self.size = 0
+        self._chunks = deque()
+        self._chunks_size = 0
+
+    @property
+    def truncated(self):
+        """Whether any data written to the stream has been dropped."""
+        return self.size > self.max_size
+
+    def getvalue(self):
+        """
+        Get the data kept by the stream.
+
+        Returns
+        -------
+        str
+            Up to the last `max_size` characters written to the stream.
+            If earlier data was dropped, the value starts at the
+            beginning of a line.
+        """
+        value = ''.join(self._chunks)
+        if self.truncated:
+            start = len(value) - self.max_size
+            if value[start - 1] != '\n':
+                # drop the partial first line
+                start = value.find('\n', start) + 1 or start
+            value = value[start:]
+        return value
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if self.log_file is not None:
+            self.log_file.write(s)
+        self._chunks.append(s)
+        self._chunks_size += len(s)
+        self.size += len(s)
+        # drop chunks that no longer contain any of the last max_size
+        # characters (or the one before them, so getvalue() can tell
+        # whether they start a new line)
+        while self._chunks_size - len(self._chunks[0]) > self.max_size:
+            self._chunks_size -= len(self._chunks.popleft())
+        return len(s)
+
+
+def stream_command(command, write=None):
+    """
+    Run a shell command, writing its output as it's generated.
+
+    Parameters
+    ----------
+    command : str
+        The command to execute. Runs in a shell, so it may set
+        environment variables, quote arguments, etc.
+    write : callable, optional
+        Function called with each chunk of decoded output from the
+        command's stdout and stderr, in the order it's received. If
+        `None` (default), output is written to `sys.stdout` (looked up
+        when the command is run, so redirecting `sys.stdout` affects
+        where it's written).
+
+    Returns
+    -------
+    int
+        The command's exit status.
+
+    Notes
+    -----
+    Output is decoded incrementally, so multibyte characters split
+    across chunks are decoded correctly. Undecodable bytes are replaced
+    rather than raising an error. Unlike reading the pipes in text mode,
+    line endings aren't translated, so progress bars that use carriage
+    returns display as they would in a terminal.
+    """
+    if write is None:
+        write = sys.stdout.write
+    encoding = locale.getpreferredencoding()
+    process = Popen(command,    # pylint: disable=consider-using-with
+                    shell=True,
+                    stdout=PIPE,
+                    stderr=PIPE)
+    decoders = {
+        pipe.fileno(): codecs.getincrementaldecoder(encoding)(errors='replace')
+        for pipe in (process.stdout, process.stderr)
+    }
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ)
+            selector.register(process.stderr, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    chunk = os.read(key.fd, _CHUNK_SIZE)
+                    if chunk:
+                        output = decoders[key.fd].decode(chunk)
+                    else:
+                        # EOF -- flush any incomplete character
+                        selector.unregister(key.fileobj)
+                        output = decoders[key.fd].decode(b'', final=True)
+                    if output:
+                        write(output)
+        return process.wait()
+    except KeyboardInterrupt:
+        # forward CTRL + C to process before raising
+        process.send_signal(signal.SIGINT)
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
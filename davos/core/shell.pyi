@@ -0,0 +1,23 @@
+import io
+from collections import deque
+from collections.abc import Callable
+from typing import Final, Literal, TextIO
+
+__all__ = list[Literal['OutputTail', 'stream_command']]
+
+_CHUNK_SIZE: Final[int]
+
+class OutputTail(io.TextIOBase):
+    _chunks: deque[str]
+    _chunks_size: int
+    log_file: TextIO | None
+    max_size: int
+    size: int
+    def __init__(self, max_size: int, log_file: TextIO | None = ...) -> None: ...
+    @property
+    def truncated(self) -> bool: ...
+    def getvalue(self) -> str: ...
+    def writable(self) -> bool: ...
+    def write(self, s: str) -> int: ...
+
+def stream_command(command: str, write: Callable[[str], object] | None = ...) -> int: ...
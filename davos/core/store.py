@@ -0,0 +1,437 @@
+"""
+A content-addressed store of installed distributions shared by projects.
+
+Each `davos` project has its own `site-packages` directory, so by
+default, every project that uses a package holds a full copy of it.
+When `davos.package_store` is enabled, the files of each distribution
+installed into a project are moved into a store under
+`DAVOS_CONFIG_DIR` after installation, and replaced in the project with
+hardlinks to the stored files. Projects that install identical
+distributions then share a single copy on disk.
+
+Each stored distribution is kept in a directory named for a hash of its
+files' relative paths and contents (taken from the distribution's
+`RECORD` file, where available), so distributions are stored once no
+matter how many projects install them, and different builds of the
+same version (e.g., for different platforms) never collide. An index
+maps each distribution name and version to the hash of its stored
+files, separately for each Python implementation/version and platform.
+
+Distributions pinned in a project's lockfile (see
+`davos.core.project.Project.lock`) that are already in the store are
+installed by linking their stored files into the project's
+`site-packages` directory, without running the installer at all.
+
+Hardlinks can't span filesystems, so if the store and a project are on
+different devices, files are copied instead (and the project doesn't
+share disk space with the store). Only files inside `site-packages` are
+stored: console scripts and other data files installed elsewhere in the
+project directory are left as-is, and aren't created when a
+distribution is linked from the store. Distributions installed from a
+VCS repository, URL, or local path are never stored.
+"""
+
+
+__all__ = [
+    'get_store_dir',
+    'ingest_dists',
+    'installed_version',
+    'link_dists'
+]
+
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+from pathlib import Path
+
+from packaging.utils import canonicalize_name, canonicalize_version
+
+from davos.core.fileutils import write_atomic
+
+
+# files that differ between installations of the same distribution, and
+# so are excluded from its hash
+_INSTALL_SPECIFIC_FILES = frozenset({'INSTALLER', 'RECORD', 'REQUESTED'})
+
+
+def _dist_digest(site_packages_dir, records):
+    """
+    Compute the content hash used to identify a distribution's files.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory the distribution is installed in.
+    records : list of tuple of str
+        (relative path, hash) pairs for each of the distribution's
+        files, as returned by `_read_record()`.
+
+    Returns
+    -------
+    str
+        The hexadecimal SHA-256 hash of the files' paths and contents.
+    """
+    digest = hashlib.sha256()
+    for relpath, file_hash in sorted(records):
+        relpath_obj = Path(relpath)
+        if (
+                relpath_obj.name in _INSTALL_SPECIFIC_FILES or
+                # bytecode compiled during installation embeds the
+                # source files' modification times
+                relpath_obj.suffix == '.pyc'
+        ):
+            continue
+        if not file_hash:
+            # RECORD doesn't include hashes for some files (e.g., those
+            # generated during installation), so hash them directly
+            with open(site_packages_dir.joinpath(relpath), 'rb') as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+        digest.update(f'{relpath}\0{file_hash}\n'.encode())
+    return digest.hexdigest()
+
+
+def _find_dist_info(site_packages_dir, name):
+    """
+    Find an installed distribution's metadata directory.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory to search.
+    name : str
+        The distribution's name.
+
+    Returns
+    -------
+    pathlib.Path or None
+        The distribution's `.dist-info` directory, or `None` if it isn't
+        installed in `site_packages_dir`.
+    """
+    name = canonicalize_name(name)
+    try:
+        candidates = list(site_packages_dir.glob('*.dist-info'))
+    except OSError:
+        return None
+    for dist_info in candidates:
+        if canonicalize_name(dist_info.stem.partition('-')[0]) == name:
+            return dist_info
+    return None
+
+
+def _link_or_copy(src, dst):
+    """
+    Hardlink a file to a new path, or copy it if that's not possible.
+
+    Parameters
+    ----------
+    src : pathlib.Path
+        The existing file.
+    dst : pathlib.Path
+        The path to create. Its parent directories are created if
+        necessary.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        # e.g., src and dst are on different filesystems
+        shutil.copy2(src, dst)
+
+
+def _load_index():
+    """
+    Load the store's index of stored distributions.
+
+    Returns
+    -------
+    dict
+        The index, mapping `"<name>==<version>"` keys to the hashes of
+        stored distributions, for the current Python implementation,
+        version, and platform.
+    """
+    try:
+        with get_store_dir().joinpath('index.json').open(encoding='utf-8') as f:
+            return json.load(f).get(_platform_tag(), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _platform_tag():
+    """
+    Get the key for the index of distributions compatible with the
+    current interpreter.
+
+    Returns
+    -------
+    str
+        The interpreter's implementation/version and platform (e.g.,
+        `"cpython-311-linux-x86_64"`).
+    """
+    return f'{sys.implementation.cache_tag}-{sysconfig.get_platform()}'
+
+
+def _read_record(dist_info):
+    """
+    Read the files installed by a distribution from its `RECORD` file.
+
+    Parameters
+    ----------
+    dist_info : pathlib.Path
+        The distribution's `.dist-info` directory.
+
+    Returns
+    -------
+    list of tuple of str
+        (relative path, hash) pairs for each of the distribution's files
+        inside the `site-packages` directory that exist on disk. The
+        hash may be an empty string.
+    """
+    site_packages_dir = dist_info.parent
+    records = []
+    with dist_info.joinpath('RECORD').open(newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            relpath = Path(row[0])
+            if relpath.is_absolute() or '..' in relpath.parts:
+                # installed outside site-packages (e.g., scripts)
+                continue
+            if site_packages_dir.joinpath(relpath).is_file():
+                file_hash = row[1] if len(row) > 1 else ''
+                records.append((relpath.as_posix(), file_hash))
+    return records
+
+
+def _relink_to_store(site_packages_dir, entry_dir, records):
+    """
+    Replace a distribution's installed files with links to stored ones.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory the distribution is installed in.
+    entry_dir : pathlib.Path
+        The store directory holding an identical distribution.
+    records : list of tuple of str
+        The distribution's files, as returned by `_read_record()`.
+    """
+    # link to temporary paths first so installed files are replaced
+    # atomically
+    tmp_dir = Path(tempfile.mkdtemp(dir=site_packages_dir,
+                                    prefix='.davos-store-'))
+    try:
+        for i, (relpath, _) in enumerate(records):
+            stored_file = entry_dir.joinpath(relpath)
+            installed_file = site_packages_dir.joinpath(relpath)
+            if (
+                    not stored_file.is_file() or
+                    os.path.samefile(stored_file, installed_file)
+            ):
+                continue
+            tmp_file = tmp_dir.joinpath(str(i))
+            os.link(stored_file, tmp_file)
+            os.replace(tmp_file, installed_file)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _save_index(index):
+    """
+    Save the store's index of stored distributions.
+
+    Parameters
+    ----------
+    index : dict
+        The index for the current interpreter (see `_load_index()`).
+    """
+    index_path = get_store_dir().joinpath('index.json')
+    try:
+        with index_path.open(encoding='utf-8') as f:
+            full_index = json.load(f)
+    except (OSError, ValueError):
+        full_index = {}
+    full_index[_platform_tag()] = index
+    try:
+        write_atomic(index_path, json.dumps(full_index))
+    except OSError:
+        pass
+
+
+def _store_dist(site_packages_dir, entry_dir, records):
+    """
+    Hardlink (or copy) a distribution's files into a new store entry.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory the distribution is installed in.
+    entry_dir : pathlib.Path
+        The store directory to create for the distribution.
+    records : list of tuple of str
+        The distribution's files, as returned by `_read_record()`.
+    """
+    entry_dir.parent.mkdir(parents=True, exist_ok=True)
+    # populate a temporary directory first so other processes never
+    # see a partially stored distribution
+    tmp_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent,
+                                    prefix=f'.{entry_dir.name}-'))
+    try:
+        for relpath, _ in records:
+            _link_or_copy(site_packages_dir.joinpath(relpath),
+                          tmp_dir.joinpath(relpath))
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # stored concurrently by another process
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_store_dir():
+    """
+    Get the path to the package store directory.
+
+    Returns
+    -------
+    pathlib.Path
+        The store directory (`DAVOS_CONFIG_DIR/store`). May not exist
+        yet.
+    """
+    # imported here to avoid a circular import
+    from davos.core.project import DAVOS_CONFIG_DIR
+    return DAVOS_CONFIG_DIR.joinpath('store')
+
+
+def ingest_dists(site_packages_dir, dists):
+    """
+    Add installed distributions to the store and hardlink them back.
+
+    For each distribution, if an identical one is already stored, its
+    files in `site_packages_dir` are replaced with hardlinks to the
+    stored files. Otherwise, its files are hardlinked into a new
+    directory in the store.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory the distributions are installed in.
+    dists : list of tuple of str
+        (name, version) pairs for the installed distributions.
+
+    Notes
+    -----
+    The store is an optimization, so distributions that can't be stored
+    (e.g., because their `RECORD` file is missing, or due to file system
+    errors) are skipped rather than raising an error.
+    """
+    store_dir = get_store_dir()
+    index = _load_index()
+    updated = False
+    for name, version in dists:
+        dist_info = _find_dist_info(site_packages_dir, name)
+        if dist_info is None or dist_info.joinpath('direct_url.json').exists():
+            # not installed, or not installed from a package index
+            continue
+        try:
+            records = _read_record(dist_info)
+            digest = _dist_digest(site_packages_dir, records)
+            entry_dir = store_dir.joinpath(digest)
+            if entry_dir.is_dir():
+                _relink_to_store(site_packages_dir, entry_dir, records)
+            else:
+                _store_dist(site_packages_dir, entry_dir, records)
+        except OSError:
+            continue
+        key = f'{canonicalize_name(name)}=={canonicalize_version(version)}'
+        if index.get(key) != digest:
+            index[key] = digest
+            updated = True
+    if updated:
+        _save_index(index)
+
+
+def installed_version(site_packages_dir, name):
+    """
+    Get the version of a distribution installed in a directory.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory to search.
+    name : str
+        The distribution's name.
+
+    Returns
+    -------
+    str or None
+        The installed version, or `None` if the distribution isn't
+        installed in `site_packages_dir`.
+    """
+    dist_info = _find_dist_info(site_packages_dir, name)
+    if dist_info is None:
+        return None
+    return dist_info.stem.partition('-')[2]
+
+
+def link_dists(site_packages_dir, dists):
+    """
+    Install distributions by linking their files from the store.
+
+    Parameters
+    ----------
+    site_packages_dir : pathlib.Path
+        The directory to install the distributions into.
+    dists : list of tuple of str
+        (name, version) pairs for the distributions to install.
+
+    Returns
+    -------
+    list of tuple of str
+        The (name, version) pairs for the distributions that were
+        installed. Distributions that aren't in the store, and those
+        for which any version is already installed in
+        `site_packages_dir`, are skipped.
+    """
+    index = _load_index()
+    store_dir = get_store_dir()
+    linked = []
+    for name, version in dists:
+        key = f'{canonicalize_name(name)}=={canonicalize_version(version)}'
+        digest = index.get(key)
+        if digest is None or _find_dist_info(site_packages_dir, name) is not None:
+            continue
+        entry_dir = store_dir.joinpath(digest)
+        if not entry_dir.is_dir():
+            continue
+        created = []
+        try:
+            for dirpath, _, filenames in os.walk(entry_dir):
+                for filename in filenames:
+                    stored_file = Path(dirpath, filename)
+                    dest = site_packages_dir.joinpath(
+                        stored_file.relative_to(entry_dir)
+                    )
+                    if not dest.exists():
+                        # don't overwrite files shared with other
+                        # distributions (e.g., namespace packages)
+                        _link_or_copy(stored_file, dest)
+                        created.append(dest)
+        except OSError:
+            # remove the partially linked distribution so the installer
+            # installs it normally
+            for dest in created:
+                try:
+                    dest.unlink()
+                except OSError:
+                    pass
+            continue
+        linked.append((name, version))
+    return linked
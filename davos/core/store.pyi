@@ -0,0 +1,20 @@
+from pathlib import Path
+from typing import Final, Literal
+
+__all__ = list[Literal['get_store_dir', 'ingest_dists', 'installed_version', 'link_dists']]
+
+_INSTALL_SPECIFIC_FILES: Final[frozenset[str]]
+
+def _dist_digest(site_packages_dir: Path, records: list[tuple[str, str]]) -> str: ...
+def _find_dist_info(site_packages_dir: Path, name: str) -> Path | None: ...
+def _link_or_copy(src: Path, dst: Path) -> None: ...
+def _load_index() -> dict[str, str]: ...
+def _platform_tag() -> str: ...
+def _read_record(dist_info: Path) -> list[tuple[str, str]]: ...
+def _relink_to_store(site_packages_dir: Path, entry_dir: Path, records: list[tuple[str, str]]) -> None: ...
+def _save_index(index: dict[str, str]) -> None: ...
+def _store_dist(site_packages_dir: Path, entry_dir: Path, records: list[tuple[str, str]]) -> None: ...
+def get_store_dir() -> Path: ...
+def ingest_dists(site_packages_dir: Path, dists: list[tuple[str, str]]) -> None: ...
+def installed_version(site_packages_dir: Path, name: str) -> str | None: ...
+def link_dists(site_packages_dir: Path, dists: list[tuple[str, str]]) -> list[tuple[str, str]]: ...
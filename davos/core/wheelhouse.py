@@ -0,0 +1,126 @@
+"""
+A local wheelhouse shared by all `davos` projects.
+
+Each `davos` project is a separate install location, so by default,
+smuggling the same package in several notebooks downloads (and, for
+packages distributed only as source, builds) it separately for each
+one. When `davos.wheelhouse` is enabled, a wheel for every distribution
+`davos` installs is deposited in a single directory under
+`DAVOS_CONFIG_DIR` after each installation, and every install command
+is passed `--find-links <wheelhouse>`, so the installer can reuse those
+wheels rather than downloading or building them again.
+
+When `davos.offline` is enabled, install commands are also passed
+`--no-index`, so packages are installed *only* from the wheelhouse and
+the network is never accessed. Packages (or versions) that were never
+previously installed with the wheelhouse enabled can't be installed in
+offline mode.
+
+Wheels are deposited by running `pip wheel --no-deps` for the exact
+versions just installed, which normally reuses the files `pip` has
+already downloaded or built from its own cache. Depositing is
+best-effort: distributions for which no wheel can be produced (e.g.,
+those installed from local paths) are simply skipped.
+"""
+
+
+__all__ = [
+    'get_wheelhouse_dir',
+    'missing_wheels',
+    'wheel_cmd',
+    'wheelhouse_args'
+]
+
+
+from packaging.utils import canonicalize_name, canonicalize_version
+
+from davos import config
+
+
+def get_wheelhouse_dir():
+    """
+    Get the path to the shared wheelhouse directory.
+
+    Returns
+    -------
+    pathlib.Path
+        The wheelhouse directory (`DAVOS_CONFIG_DIR/wheelhouse`). May
+        not exist yet.
+    """
+    # imported here to avoid a circular import
+    from davos.core.project import DAVOS_CONFIG_DIR
+    return DAVOS_CONFIG_DIR.joinpath('wheelhouse')
+
+
+def missing_wheels(dists):
+    """
+    Filter installed distributions to those not in the wheelhouse.
+
+    Parameters
+    ----------
+    dists : list of tuple of str
+        (name, version) pairs for installed distributions.
+
+    Returns
+    -------
+    list of tuple of str
+        The (name, version) pairs for which the wheelhouse doesn't
+        contain a wheel.
+    """
+    wheelhouse_dir = get_wheelhouse_dir()
+    available = set()
+    if wheelhouse_dir.is_dir():
+        for wheel_path in wheelhouse_dir.glob('*.whl'):
+            # {name}-{version}(-{build tag})?-{python}-{abi}-{platform}.whl
+            name, _, rest = wheel_path.stem.partition('-')
+            version = rest.partition('-')[0]
+            available.add((canonicalize_name(name),
+                           canonicalize_version(version)))
+    return [
+        (name, version) for name, version in dists
+        if (canonicalize_name(name), canonicalize_version(version)) not in available
+    ]
+
+
+def wheel_cmd(dists):
+    """
+    Format the command that deposits wheels in the wheelhouse.
+
+    Parameters
+    ----------
+    dists : list of tuple of str
+        (name, version) pairs for the distributions whose wheels should
+        be deposited.
+
+    Returns
+    -------
+    str
+        A `pip wheel` command that builds or downloads a wheel for the
+        exact version of each distribution (without its dependencies)
+        into the wheelhouse.
+    """
+    requirements = ' '.join(f'"{name}=={version}"' for name, version in dists)
+    return (
+        f'{config._pip_executable} wheel --no-deps '
+        '--disable-pip-version-check '
+        f'--wheel-dir "{get_wheelhouse_dir()}" {wheelhouse_args()} '
+        f'{requirements}'
+    )
+
+
+def wheelhouse_args():
+    """
+    Format the installer options that make it use the wheelhouse.
+
+    Returns
+    -------
+    str
+        `--find-links <wheelhouse>` if `davos.wheelhouse` is enabled,
+        or `--no-index --find-links <wheelhouse>` if `davos.offline` is
+        enabled. Otherwise, an empty string.
+    """
+    if config.offline:
+        return f'--no-index --find-links "{get_wheelhouse_dir()}"'
+    if config.wheelhouse:
+        return f'--find-links "{get_wheelhouse_dir()}"'
+    return ''
@@ -0,0 +1,9 @@
+from pathlib import Path
+from typing import Literal
+
+__all__ = list[Literal['get_wheelhouse_dir', 'missing_wheels', 'wheel_cmd', 'wheelhouse_args']]
+
+def get_wheelhouse_dir() -> Path: ...
+def missing_wheels(dists: list[tuple[str, str]]) -> list[tuple[str, str]]: ...
+def wheel_cmd(dists: list[tuple[str, str]]) -> str: ...
+def wheelhouse_args() -> str: ...
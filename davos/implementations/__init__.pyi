@@ -16,7 +16,7 @@ FullParserFunc = LineParserFunc | IPyPost7FullParserFunc
 _activate_helper: Callable[[SmuggleFunc, FullParserFunc], None]
 _check_conda_avail_helper: Callable[[], str | None]
 _deactivate_helper: Callable[[SmuggleFunc, FullParserFunc], None]
-_run_shell_command_helper: Callable[[str], None]
+_run_shell_command_helper: Callable[[str], int]
 _set_custom_showsyntaxerror: Callable[[], None]
 auto_restart_rerun: Callable[[list[str]], NoReturn]
 full_parser: FullParserFunc
@@ -17,6 +17,7 @@ from IPython.utils.process import system as _run_shell_cmd
 
 from davos import config
 from davos.core.exceptions import DavosParserError
+from davos.core.shell import stream_command
 
 
 def _check_conda_avail_helper():
@@ -104,11 +105,20 @@ def _run_shell_command_helper(command):
 
     See Also
     --------
-    IPython.utils.process.system : `IPython` shell command runner.
+    davos.core.shell.stream_command : Runs the command.
+
+    Notes
+    -----
+    `IPython`'s own shell command runner
+    (`IPython.utils.process.system`) reads output through `pexpect`
+    in very small chunks, which is slow for commands that generate a
+    lot of output (e.g., verbose installs), so `davos` uses its own.
+    Like `IPython`'s runner, this writes stderr to stdout.
     """
-    retcode = _run_shell_cmd(command)
+    retcode = stream_command(command)
     if retcode != 0:
         raise CalledProcessError(returncode=retcode, cmd=command)
+    return retcode
 
 
 def _set_custom_showsyntaxerror():
@@ -155,7 +155,15 @@ def generate_parser_func(line_parser):
        additional overhead compared to the `IPython<7.0.0` `davos`
        parser, the difference is functionally de minimis, and in fact
        outweighed by the new parser's ability to skip parsing cells that
-       don't contain `smuggle` statements altogether.
+       don't contain `smuggle` statements altogether. Similarly, lines
+       following the last potential `smuggle` statement in a cell are
+       never tokenized or parsed (only searched for the substring
+       "`smuggle `"), and logical lines before it that can't contain a
+       `smuggle` statement are tokenized (to track where logical lines
+       begin) but not parsed. Every line up to the last potential
+       `smuggle` statement is still tokenized, so the time taken to
+       transform a cell grows with the position of its last `smuggle`
+       statement.
     3. Before it is returned, the full `davos` parser function is
        assigned an attribute "`has_side_effects`", which is set to
        `True`. In `IPython>=7.17`, this will prevent the parser from
@@ -168,14 +176,26 @@ def generate_parser_func(line_parser):
     pyline_assembler = assemble_python_lines()
 
     def full_parser(lines):
-        if 'smuggle ' not in ''.join(lines):
+        # discard packages queued for batched installation (see
+        # `davos.batch_install`) from any previous cell that was parsed
+        # but never executed
+        config._batch_queue.clear()
+        # find the last physical line that could be (part of) a smuggle
+        # statement. Lines after the logical line that contains it are
+        # returned as-is, without being tokenized or parsed
+        for last_candidate_ix in range(len(lines) - 1, -1, -1):
+            if 'smuggle ' in lines[last_candidate_ix]:
+                break
+        else:
             # if cell contains no potential smuggle statements, don't
             # bother parsing line-by-line
             return lines
 
         parsed_lines = []
         curr_buff = []
+        n_lines_parsed = 0
         for raw_line in lines:
+            n_lines_parsed += 1
             # don't include trailing '\n'
             python_line = pyline_assembler.push(raw_line[:-1])
             if python_line is None:
@@ -183,26 +203,41 @@ def generate_parser_func(line_parser):
                 curr_buff.append(raw_line)
                 continue
 
-            # pass single-line parser full logical lines -- may be
-            # single physical line or fully accumulated multiline
-            # statement
-            parsed_line = line_parser(python_line)
-            if curr_buff:
-                # logical line consists of multiple physical lines
-                if parsed_line == python_line:
-                    # multiline statement is not a smuggle statement;
-                    # don't combine physical lines in output
-                    parsed_lines.extend(curr_buff)
-                    # last line isn't in curr_buff; add it separately
-                    parsed_lines.append(raw_line)
-                else:
-                    # logical line is a multiline smuggle statement
-                    parsed_lines.append(f'{parsed_line}\n')
-                # reset partially accumulated lines
+            if 'smuggle ' not in python_line:
+                # Lines preceding the last potential smuggle statement
+                # must still be passed through pyline_assembler so that
+                # lines inside multiline strings, brackets, etc. aren't
+                # mistaken for the start of a logical line, but they
+                # don't need to be parsed
+                parsed_lines.extend(curr_buff)
+                parsed_lines.append(raw_line)
                 curr_buff.clear()
             else:
-                # logical line consists of a single physical line
-                parsed_lines.append(f'{parsed_line}\n')
+                # pass single-line parser full logical lines -- may be
+                # single physical line or fully accumulated multiline
+                # statement
+                parsed_line = line_parser(python_line)
+                if curr_buff:
+                    # logical line consists of multiple physical lines
+                    if parsed_line == python_line:
+                        # multiline statement is not a smuggle
+                        # statement; don't combine physical lines in
+                        # output
+                        parsed_lines.extend(curr_buff)
+                        # last line isn't in curr_buff; add it separately
+                        parsed_lines.append(raw_line)
+                    else:
+                        # logical line is a multiline smuggle statement
+                        parsed_lines.append(f'{parsed_line}\n')
+                    # reset partially accumulated lines
+                    curr_buff.clear()
+                else:
+                    # logical line consists of a single physical line
+                    parsed_lines.append(f'{parsed_line}\n')
+
+            if n_lines_parsed > last_candidate_ix:
+                # remaining lines can't contain smuggle statements
+                break
 
         # .reset() clears pyline_assembler's .buf & .tokenizer for next
         # cell. Returns ''.join(pyline_assembler.buf) if .buf list is
@@ -213,7 +248,12 @@ def generate_parser_func(line_parser):
             # Include remaining physical lines to let IPython/Python
             # deal with raising the SyntaxError from the proper location
             parsed_lines.extend(curr_buff)
-        return parsed_lines
+        # replace the parsed lines in place. (If a multiline smuggle
+        # statement was joined into one line, the list's references to
+        # the remaining lines are shifted, but the lines themselves
+        # aren't copied)
+        lines[:n_lines_parsed] = parsed_lines
+        return lines
 
     # prevents transformer from being run multiple times when IPython
     # parses partial line to determine whether input is complete
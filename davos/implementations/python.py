@@ -1,34 +1,260 @@
 """
 Helper function implementations specific to "plain" Python environments.
 
-NOTE: `davos` does not currently support "plain" (i.e., non-interactive)
-Python environments (scripts, the IDLE, etc.), but aims to do so in a
-future version.
+In "plain" (i.e., non-interactive) Python environments (scripts, batch
+jobs, etc.), `davos` works via an import hook: once `davos` has been
+imported, the `smuggle` statements in any Python module imported
+afterward are transformed by the `davos` parser before the module's
+code is compiled. A script that itself contains `smuggle` statements
+can be run with `python -m davos <script.py> [args ...]`.
+
+Transformed modules' compiled bytecode is cached on disk (in
+`DAVOS_CONFIG_DIR/pycache`) so that subsequent imports of an unchanged
+module don't require parsing it again. Cache entries are keyed by the
+module's path and the `davos` version, and (like standard `.pyc` files)
+record the modification time and size of the source file they were
+compiled from, so an unchanged module is loaded without reading its
+source.
+
+NOTE: button-based user input prompts and automatically re-running
+code after restarting the interpreter are not available in plain Python
+environments.
 """
 
 __all__ = [
     'auto_restart_rerun',
     'generate_parser_func',
-    'prompt_restart_rerun_buttons'
+    'prompt_restart_rerun_buttons',
+    'SmuggleFinder',
+    'SmuggleLoader'
 ]
 
 
-import locale
-import shlex
-import signal
+import hashlib
+import importlib
+import marshal
 import sys
+import tokenize
 from contextlib import redirect_stdout
+from importlib.abc import MetaPathFinder
+from importlib.machinery import SourceFileLoader
+from importlib.util import cache_from_source, decode_source, MAGIC_NUMBER
 from io import StringIO
-from subprocess import CalledProcessError, PIPE, Popen
+from subprocess import CalledProcessError
+
+from davos import __version__, config
+from davos.core.fileutils import write_atomic
+from davos.core.finder import find_module_spec
+from davos.core.shell import stream_command
+
+
+class SmuggleLoader(SourceFileLoader):
+    """
+    Loader for Python modules that may contain `smuggle` statements.
+
+    Subclass of the standard source file loader that runs the `davos`
+    parser over a module's source code before compiling it, and injects
+    the `smuggle()` function into the module's namespace before
+    executing it. Modules whose source doesn't contain a `smuggle`
+    statement are compiled and cached as usual. For those that do, the
+    transformed code is cached in a separate directory so the standard
+    `__pycache__` directory never contains code that can only be run
+    with `davos`.
+    """
+
+    def __init__(self, fullname, path, smuggle_func, parser_func):
+        """
+        Parameters
+        ----------
+        fullname : str
+            The module's fully qualified name.
+        path : str
+            The path to the module's source file.
+        smuggle_func : callable
+            Function injected into the module namespace under the name
+            "`smuggle`" (typically, `davos.core.core.smuggle`).
+        parser_func : callable
+            Function that transforms the module's source code (the
+            return value of `generate_parser_func()`).
+        """
+        super().__init__(fullname, path)
+        self.smuggle_func = smuggle_func
+        self.parser_func = parser_func
+        # whether the module's code contains smuggle() calls
+        self._transformed = False
+
+    @property
+    def _cache_path(self):
+        """
+        The path to the cached, transformed code for the module.
+
+        The filename contains a hash of the module's path and the
+        `davos` version, plus the interpreter's cache tag (e.g.,
+        "`cpython-311`").
+        """
+        # imported here to avoid a circular import
+        from davos.core.project import DAVOS_CONFIG_DIR
+        # path is included since it's embedded in the compiled code
+        path_hash = hashlib.sha256(self.path.encode())
+        path_hash.update(__version__.encode())
+        filename = f'{path_hash.hexdigest()}.{sys.implementation.cache_tag}.pyc'
+        return DAVOS_CONFIG_DIR.joinpath('pycache', filename)
+
+    def _cache_header(self, source_path):
+        """
+        Format the header of a bytecode file for a module's source file.
+
+        Parameters
+        ----------
+        source_path : str
+            The path to the module's source file.
+
+        Returns
+        -------
+        bytes or None
+            The header a (timestamp-based) bytecode file compiled from
+            the source file in its current state would start with: the
+            interpreter's magic number, flags, and the source file's
+            modification time and size (see PEP 552). `None` if the
+            source file can't be accessed.
+        """
+        try:
+            source_stats = self.path_stats(source_path)
+        except OSError:
+            return None
+        mtime = int(source_stats['mtime']) & 0xFFFFFFFF
+        size = source_stats['size'] & 0xFFFFFFFF
+        return (MAGIC_NUMBER + bytes(4) + mtime.to_bytes(4, 'little') +
+                size.to_bytes(4, 'little'))
+
+    def exec_module(self, module):
+        code = self.get_code(module.__name__)
+        if self._transformed:
+            module.smuggle = self.smuggle_func
+        exec(code, module.__dict__)    # pylint: disable=exec-used
+
+    def get_code(self, fullname):
+        source_path = self.get_filename(fullname)
+        header = self._cache_header(source_path)
+        if header is None:
+            return super().get_code(fullname)
+        # check for up-to-date cached bytecode before reading the
+        # source, so unchanged modules are loaded without reading it
+        try:
+            with open(cache_from_source(source_path), 'rb') as f:
+                pyc_header = f.read(len(header))
+        except (NotImplementedError, OSError):
+            pyc_header = None
+        if pyc_header == header:
+            # standard bytecode is written only for modules whose
+            # source doesn't need to be transformed
+            return super().get_code(fullname)
+
+        cache_path = self._cache_path
+        try:
+            cached_data = cache_path.read_bytes()
+        except OSError:
+            pass
+        else:
+            if cached_data[:len(header)] == header:
+                self._transformed = True
+                return marshal.loads(cached_data[len(header):])
+
+        source_bytes = self.get_data(source_path)
+        if b'smuggle ' not in source_bytes:
+            # use standard bytecode caching
+            return super().get_code(fullname)
+
+        source = decode_source(source_bytes)
+        transformed_source = self.parser_func(source)
+        if transformed_source == source:
+            # "smuggle " appears only in comments, strings, etc.
+            return super().get_code(fullname)
+
+        code = compile(transformed_source, source_path, 'exec',
+                       dont_inherit=True)
+        self._transformed = True
+        if not sys.dont_write_bytecode:
+            try:
+                write_atomic(cache_path, header + marshal.dumps(code))
+            except OSError:
+                # caching is an optimization; don't fail the import
+                pass
+        return code
+
+
+class SmuggleFinder(MetaPathFinder):
+    """
+    Meta path finder that loads modules with `SmuggleLoader`.
+
+    Inserted at the front of `sys.meta_path` when `davos` is activated.
+    Locates modules using the standard path-based finder (or, for
+    top-level modules installed in the active project, the
+    `davos.core.finder.ProjectFinder`), then replaces the loader for
+    any module loaded from a Python source file with a `SmuggleLoader`.
+    Standard library modules are ignored.
+    """
+
+    def __init__(self, smuggle_func, parser_func):
+        """
+        Parameters
+        ----------
+        smuggle_func : callable
+            Function injected into the namespace of modules containing
+            `smuggle` statements (typically,
+            `davos.core.core.smuggle`).
+        parser_func : callable
+            Function that transforms a module's source code (the return
+            value of `generate_parser_func()`).
+        """
+        self.smuggle_func = smuggle_func
+        self.parser_func = parser_func
+
+    def find_spec(self, fullname, path, target=None):
+        """
+        Find the spec for a module, to be loaded with `SmuggleLoader`.
+
+        Called by the import system when a module is imported.
+
+        Parameters
+        ----------
+        fullname : str
+            The module's fully qualified name.
+        path : list of str or None
+            The parent package's `__path__` for submodules, or `None`
+            for top-level modules.
+        target : types.ModuleType, optional
+            The module object being reloaded, if any.
+
+        Returns
+        -------
+        importlib.machinery.ModuleSpec or None
+            The module's spec, whose loader is a `SmuggleLoader` if the
+            module is loaded from a Python source file. `None` for
+            standard library modules and modules that can't be found.
+        """
+        if fullname.partition('.')[0] in config._stdlib_modules:
+            return None
+        # packages in the active project take priority over those in
+        # the main environment
+        spec = find_module_spec(fullname, path, target)
+        # don't replace custom loaders even if they subclass
+        # SourceFileLoader
+        if spec is not None and spec.loader.__class__ is SourceFileLoader:
+            spec.loader = SmuggleLoader(fullname, spec.origin,
+                                        self.smuggle_func, self.parser_func)
+        return spec
 
 
-# noinspection PyUnusedLocal
 def _activate_helper(smuggle_func, parser_func):
     """
     Pure Python implementation of `_activate_helper`.
 
-    Raises `NotImplementedError` whenever called, as `davos` does not
-    yet support non-interactive Python environments.
+    Helper function called when setting `davos.active = True` (or
+    `davos.config.active = True`). Inserts a `SmuggleFinder` at the
+    front of `sys.meta_path` if one isn't there already, so that
+    `smuggle` statements in subsequently imported modules are
+    transformed.
 
     Parameters
     ----------
@@ -38,15 +264,12 @@ def _activate_helper(smuggle_func, parser_func):
     parser_func : callable
         Function called to parse the Python module as plain text and
         replace `smuggle` statements with the `smuggle()` function.
-
-    Raises
-    -------
-    NotImplementedError
-        In all cases.
     """
-    raise NotImplementedError(
-        "davos does not yet support non-interactive Python environments"
-    )
+    for finder in sys.meta_path:
+        if isinstance(finder, SmuggleFinder):
+            return
+    sys.meta_path.insert(0, SmuggleFinder(smuggle_func, parser_func))
+    importlib.invalidate_caches()
 
 
 def _check_conda_avail_helper():
@@ -85,27 +308,25 @@ def _check_conda_avail_helper():
     return conda_list_output.getvalue()
 
 
-# noinspection PyUnusedLocal
-def _deactivate_helper(smuggle_func, parser_func):
+def _deactivate_helper(_smuggle_func, _parser_func):
     """
-    Pure Python implementation of `_activate_helper`.
+    Pure Python implementation of `_deactivate_helper`.
 
-    Raises `NotImplementedError` whenever called, as `davos` does not
-    yet support non-interactive Python environments.
+    Helper function called when setting `davos.active = False` (or
+    `davos.config.active = False`). Removes the `SmuggleFinder` from
+    `sys.meta_path`. Modules that were already imported are unaffected.
 
     Parameters
     ----------
-    smuggle_func : callable
-    parser_func : callable
-
-    Raises
-    -------
-    NotImplementedError
-        In all cases.
+    _smuggle_func : callable
+        Unused (accepted for consistency with the `IPython`
+        implementations).
+    _parser_func : callable
+        Unused (accepted for consistency with the `IPython`
+        implementations).
     """
-    raise NotImplementedError(
-        "davos does not yet support non-interactive Python environments"
-    )
+    sys.meta_path[:] = [finder for finder in sys.meta_path
+                        if not isinstance(finder, SmuggleFinder)]
 
 
 def _run_shell_command_helper(command):
@@ -133,26 +354,22 @@ def _run_shell_command_helper(command):
     ------
     subprocess.CalledProcessError :
         If the command returned a non-zero exit status.
+
+    See Also
+    --------
+    davos.core.shell.stream_command : Runs the command.
+
+    Notes
+    -----
+    The command is run in a shell (as it would be by `IPython`) so that
+    commands may set environment variables, quote arguments, etc. As in
+    `IPython`, stderr is written to stdout.
     """
-    cmd = shlex.split(command)
-    process = Popen(cmd,    # pylint: disable=consider-using-with
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    encoding=locale.getpreferredencoding())
-    try:
-        while True:
-            retcode = process.poll()
-            if retcode is None:
-                output = process.stdout.readline()
-                if output:
-                    sys.stdout.write(output)
-            elif retcode != 0:
-                # processed returned with non-zero exit status
-                raise CalledProcessError(returncode=retcode, cmd=cmd)
-    except KeyboardInterrupt:
-        # forward CTRL + C to process before raising
-        process.send_signal(signal.SIGINT)
-        raise
+    retcode = stream_command(command)
+    if retcode != 0:
+        # processed returned with non-zero exit status
+        raise CalledProcessError(returncode=retcode, cmd=command)
+    return retcode
 
 
 # noinspection PyUnusedLocal
@@ -160,8 +377,9 @@ def auto_restart_rerun(pkgs):
     """
     Pure Python implementation of `auto_restart_rerun`.
 
-    Raises `NotImplementedError` whenever called, as `davos` does not
-    yet support non-interactive Python environments.
+    Raises `NotImplementedError` whenever called, as restarting the
+    interpreter and rerunning code is only possible in Jupyter
+    notebooks, not in plain Python scripts or modules.
 
     Parameters
     ----------
@@ -175,18 +393,19 @@ def auto_restart_rerun(pkgs):
         In all cases.
     """
     raise NotImplementedError(
-        "automatic rerunning not available in non-interactive Python (this "
-        "function should not be reachable through normal use)."
+        "automatic restarting and rerunning is only available in Jupyter "
+        "notebooks (this function should not be reachable through normal "
+        "use)."
     )
 
 
-# noinspection PyUnusedLocal
 def generate_parser_func(line_parser):
     """
     Pure Python implementation of `generate_parser_func`.
 
-    Raises `NotImplementedError` whenever called, as `davos` does not
-    yet support non-interactive Python environments.
+    Given a function that parses a single line of code, returns the full
+    `davos` parser used by `SmuggleLoader` to transform a module's
+    source code.
 
     Parameters
     ----------
@@ -194,14 +413,64 @@ def generate_parser_func(line_parser):
         Function that parses a single line of user code (typically,
         `davos.core.core.parse_line`).
 
-    Raises
+    Returns
     -------
-    NotImplementedError
-        In all cases.
+    callable
+        The `davos` parser for Python modules. Given a module's source
+        code (as a single `str`), returns the source with all `smuggle`
+        statements transformed.
+
+    Notes
+    -----
+    Like the `IPython>=7.0` parser, the returned function passes
+    "*logical*" lines to `line_parser`, assembling them from physical
+    lines with the standard library's `tokenize` module. When a
+    multiline `smuggle` statement is transformed, the resulting single
+    line is followed by blank lines in place of the remaining physical
+    lines, so line numbers in tracebacks still match the original
+    source. If the source can't be tokenized (i.e., it contains a
+    syntax error), it's returned unchanged so that the error is raised
+    from the proper location when the module is compiled.
     """
-    raise NotImplementedError(
-        "davos does not yet support non-interactive Python environments"
-    )
+    def full_parser(source):
+        if 'smuggle ' not in source:
+            return source
+
+        lines = source.splitlines(keepends=True)
+        # (start, end) indices of each logical line's physical lines
+        logical_line_spans = []
+        start_row = None
+        try:
+            for token in tokenize.generate_tokens(StringIO(source).readline):
+                if token.type == tokenize.NEWLINE:
+                    logical_line_spans.append((start_row, token.end[0]))
+                    start_row = None
+                elif start_row is None and token.type not in (
+                        tokenize.COMMENT,
+                        tokenize.DEDENT,
+                        tokenize.ENDMARKER,
+                        tokenize.INDENT,
+                        tokenize.NL
+                ):
+                    # tokenize rows are 1-indexed
+                    start_row = token.start[0] - 1
+        except (SyntaxError, tokenize.TokenError):
+            return source
+
+        for start, end in logical_line_spans:
+            python_line = ''.join(lines[start:end])
+            if 'smuggle ' not in python_line:
+                continue
+            line_ending = python_line[len(python_line.rstrip('\r\n')):]
+            python_line = python_line[:len(python_line) - len(line_ending)]
+            parsed_line = line_parser(python_line)
+            if parsed_line != python_line:
+                # pad with blank lines to preserve line numbers
+                lines[start:end] = ([parsed_line + line_ending] +
+                                    ['\n'] * (end - start - 1))
+        return ''.join(lines)
+
+    return full_parser
 
 
 # noinspection PyUnusedLocal
@@ -209,8 +478,10 @@ def prompt_restart_rerun_buttons(pkgs):
     """
     Pure Python implementation of `prompt_restart_rerun_buttons`.
 
-    Raises `NotImplementedError` whenever called, as button-based input
-    prompts are not available outside notebook environments.
+    Raises `NotImplementedError` whenever called, as the buttons it
+    would display (to restart the interpreter and rerun code) are only
+    available in Jupyter notebooks, not in plain Python scripts or
+    modules.
 
     Parameters
     ----------
@@ -224,6 +495,7 @@ def prompt_restart_rerun_buttons(pkgs):
         In all cases.
     """
     raise NotImplementedError(
-        "button-based user input prompts are not available in non-interactive "
-        "Python (this function should not be reachable through normal use)."
+        "button-based user input prompts are only available in Jupyter "
+        "notebooks (this function should not be reachable through normal "
+        "use)."
     )
@@ -1,13 +1,36 @@
-from typing import Literal, NoReturn
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec, SourceFileLoader
+from pathlib import PosixPath
+from types import CodeType, ModuleType
+from typing import Literal, NoReturn, Sequence
 from davos.core.core import SmuggleFunc
 from davos.implementations import LineParserFunc
 
-__all__ = list[Literal['auto_restart_rerun', 'generate_parser_func', 'prompt_restart_rerun_buttons']]
+__all__ = list[Literal['auto_restart_rerun', 'generate_parser_func', 'prompt_restart_rerun_buttons', 'SmuggleFinder',
+                       'SmuggleLoader']]
 
-def _activate_helper(smuggle_func: SmuggleFunc, parser_func: LineParserFunc) -> NoReturn: ...
+class SmuggleLoader(SourceFileLoader):
+    _transformed: bool
+    parser_func: LineParserFunc
+    smuggle_func: SmuggleFunc
+    def __init__(self, fullname: str, path: str, smuggle_func: SmuggleFunc, parser_func: LineParserFunc) -> None: ...
+    @property
+    def _cache_path(self) -> PosixPath: ...
+    def _cache_header(self, source_path: str) -> bytes | None: ...
+    def exec_module(self, module: ModuleType) -> None: ...
+    def get_code(self, fullname: str) -> CodeType: ...
+
+class SmuggleFinder(MetaPathFinder):
+    parser_func: LineParserFunc
+    smuggle_func: SmuggleFunc
+    def __init__(self, smuggle_func: SmuggleFunc, parser_func: LineParserFunc) -> None: ...
+    def find_spec(self, fullname: str, path: Sequence[str] | None,
+                  target: ModuleType | None = ...) -> ModuleSpec | None: ...
+
+def _activate_helper(smuggle_func: SmuggleFunc, parser_func: LineParserFunc) -> None: ...
 def _check_conda_avail_helper() -> str | None: ...
-def _deactivate_helper(smuggle_func: SmuggleFunc, parser_func: LineParserFunc) -> NoReturn: ...
-def _run_shell_command_helper(command: str) -> None: ...
+def _deactivate_helper(_smuggle_func: SmuggleFunc, _parser_func: LineParserFunc) -> None: ...
+def _run_shell_command_helper(command: str) -> int: ...
 def auto_restart_rerun(pkgs: list[str]) -> NoReturn: ...
-def generate_parser_func(line_parser: LineParserFunc) -> NoReturn: ...
+def generate_parser_func(line_parser: LineParserFunc) -> LineParserFunc: ...
 def prompt_restart_rerun_buttons(pkgs: list[str]) -> NoReturn: ...